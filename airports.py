@@ -1,163 +1,34 @@
+"""
+Airport database and nearest-airport lookups.
+
+Airports come from an OurAirports-style CSV (data/airports.csv by default,
+override with AIRPORTS_CSV; columns ident, type, name, latitude_deg,
+longitude_deg, iata_code). The CSV is compiled once into a binary file next
+to it (airports.bin) holding parallel coordinate arrays, a prebuilt k-d tree
+and the string table; at startup that file is memory-mapped, not parsed, and
+the spatial index reads straight from the mapping. The binary is rebuilt
+automatically when the CSV changes.
+
+  python airports.py [csv] [out.bin]    # compile explicitly
+"""
+
+import csv
+import heapq
 import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+DEFAULT_CSV     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+EXCLUDED_TYPES  = {"closed", "heliport", "balloonport"}
 
-# Static dataset: (icao, display_code, name, lat, lon)
-# Display code = IATA when available, otherwise 3-4 char abbreviation.
-# Covers Argentina (commercial + private strips), Uruguay, Paraguay, Bolivia, Brazil, Chile.
-AIRPORTS = [
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Buenos Aires metropolitan area
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAEZ", "EZE", "Ezeiza Ministro Pistarini",           -34.8222, -58.5358),
-    ("SABE", "AEP", "Aeroparque Jorge Newbery",             -34.5592, -58.4156),
-    ("SADF", "SFD", "San Fernando",                         -34.4532, -58.5896),  # principal hub aviación privada BA
-    ("SADP", "EPA", "El Palomar",                           -34.6099, -58.6126),
-    ("SAAF", "MOR", "Morón",                                -34.6764, -58.6428),
-    ("SAAZ", "ZAT", "Zárate",                               -34.0983, -59.0017),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Buenos Aires province
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAAI", "AZL", "Azul",                                 -36.8427, -59.8856),
-    ("SAAJ", "JNI", "Junín",                                -34.5459, -60.9306),
-    ("SAAK", "SUZ", "Coronel Suárez",                       -37.4475, -61.8897),
-    ("SAAT", "TDL", "Tandil Héroes de Malvinas",            -37.2373, -59.2279),
-    ("SAAO", "OVR", "Olavarría",                            -36.8897, -60.2168),
-    ("SAAS", "GPO", "General Pico",                         -35.6963, -63.7580),
-    ("SATK", "TRA", "Tres Arroyos",                         -38.3869, -60.2297),
-    ("SAVS", "STE", "Santa Teresita",                       -36.5425, -56.7219),
-    ("SAVY", "PEH", "Pehuajó",                              -35.8453, -61.8576),
-    ("SAZV", "VLG", "Villa Gesell",                         -37.2354, -56.9563),
-    ("SAZM", "MDQ", "Mar del Plata Piazzolla",              -37.9342, -57.5733),
-    ("SAZB", "BHI", "Bahía Blanca Cmdte Espora",            -38.7250, -62.1693),
-    ("SAZR", "RSA", "Santa Rosa",                           -36.5883, -64.2758),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Entre Ríos / Litoral
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAAP", "PRA", "Paraná Gen Urquiza",                   -31.7948, -60.4804),
-    ("SAAC", "COC", "Concordia Comodoro Pierrestegui",      -31.2969, -57.9966),
-    ("SAAG", "GCH", "Gualeguaychú",                        -33.0106, -58.6117),
-    ("SACD", "COL", "Colón",                                -32.0000, -58.1500),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Corrientes / Misiones / Chaco / Formosa (NEA)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SARC", "CNQ", "Corrientes Piragine Niveyro",          -27.4455, -58.7619),
-    ("SARM", "MCS", "Mercedes",                             -29.2213, -58.0875),
-    ("SANR", "RES", "Resistencia",                          -27.4500, -59.0561),
-    ("SANH", "PSA", "Pres. Roque Sáenz Peña",               -26.7531, -60.4908),
-    ("SASF", "FMA", "Formosa El Pucú",                      -26.2127, -58.2281),
-    ("SARI", "IGR", "Cataratas del Iguazú",                 -25.7373, -54.4734),
-    ("SAVV", "VGS", "Gobernador Virasoro",                  -28.0353, -56.0514),
-    ("SAAV", "SFN", "Sauce Viejo Santa Fe",                 -31.7117, -60.8117),
-    ("SAAR", "ROS", "Rosario Islas Malvinas",               -32.9036, -60.7850),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Córdoba
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SACO", "COR", "Córdoba Ambrosio Taravella",           -31.3236, -64.2082),
-    ("SAOD", "RCU", "Río Cuarto Las Higueras",              -33.0851, -64.2613),
-    ("SACV", "VME", "Villa María",                          -32.4197, -63.1997),
-    ("SACE", "CRS", "Villa del Rosario",                    -31.5561, -63.5308),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Cuyo (Mendoza, San Juan, San Luis)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAMR", "MDZ", "Mendoza El Plumerillo",                -32.8317, -68.7929),
-    ("SAME", "LGS", "Malargüe Comodoro Ricardo Salinas",    -35.4936, -69.5740),
-    ("SANU", "UAQ", "San Juan Domingo Sarmiento",           -31.5715, -68.4182),
-    ("SALO", "LUQ", "San Luis",                             -33.2732, -66.3564),
-    ("SAOU", "VDR", "Villa Dolores",                        -31.9452, -65.1463),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — NOA (Tucumán, Salta, Jujuy, La Rioja, Catamarca, S del Estero)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SANT", "TUC", "Tucumán Benjamín Matienzo",            -26.8409, -65.1049),
-    ("SASA", "SLA", "Salta Martín M. de Güemes",            -24.8560, -65.4862),
-    ("SASJ", "JUJ", "Jujuy Gob. Horacio Guzmán",           -24.3928, -65.0978),
-    ("SANL", "IRJ", "La Rioja Cap. V. Almandos Almonacid",  -29.3816, -66.7958),
-    ("SANC", "CTC", "Catamarca Coronel Gustavo Vargas",     -28.5956, -65.7514),
-    ("SANE", "SDE", "Santiago del Estero",                  -27.7656, -64.3100),
-    ("SARF", "ORA", "Orán",                                 -23.1528, -64.3292),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Neuquén / Río Negro (norpatagonia, esquí, estancias)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAZN", "NQN", "Neuquén Presidente Perón",             -38.9490, -68.1557),
-    ("SAHZ", "APZ", "Zapala",                               -38.9756, -70.1136),
-    ("SAHC", "HOS", "Chos Malal",                           -37.4442, -70.2694),
-    ("SAVB", "BRC", "Bariloche Teniente Candelaria",        -41.1512, -71.1578),
-    ("SAPM", "CPC", "Chapelco San Martín de los Andes",    -40.0752, -71.1372),
-    ("SAVT", "VDM", "Viedma Gov Castello",                  -40.8692, -63.0004),
-    ("SAAG", "GNR", "General Roca",                         -39.0006, -67.6205),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # ARGENTINA — Patagonia (Chubut, Santa Cruz, Tierra del Fuego)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SAZG", "PMY", "Puerto Madryn El Tehuelche",           -42.7592, -65.1027),
-    ("SAWE", "REL", "Trelew Almirante Zar",                 -43.2105, -65.2703),
-    ("SAWY", "EQS", "Esquel Brigadier A. Ruiz Novaro",      -42.9076, -71.1501),
-    ("SAZP", "CRD", "Comodoro Rivadavia Zubarán",          -45.7854, -67.4655),
-    ("SAWP", "PSC", "Puerto Santa Cruz",                    -50.0167, -68.5822),
-    ("SAWG", "RGL", "Río Gallegos Piloto Fernández",        -51.6089, -69.3126),
-    ("SAWR", "RGA", "Río Grande Hermes Quijada",            -53.7877, -67.7494),
-    ("SAWH", "USH", "Malvinas Argentinas Ushuaia",          -54.8433, -68.2958),
-    ("SAWC", "PMQ", "Perito Moreno",                        -46.5378, -70.9786),
-    ("SAWU", "GGS", "Gobernador Gregores",                  -48.7831, -70.1500),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # URUGUAY — clave para jets privados desde Buenos Aires
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SUMU", "MVD", "Montevideo Carrasco",                  -34.8384, -56.0308),
-    ("SULS", "PDP", "Punta del Este Laguna del Sauce",      -34.8551, -55.0943),  # el más importante privados
-    ("SUMO", "CYR", "Colonia del Sacramento",               -34.4564, -57.7736),
-    ("SUDU", "DZO", "Durazno Santa Bernardina",             -33.3597, -56.4992),
-    ("SUAG", "ATI", "Artigas",                              -30.4008, -56.5079),
-    ("SUCA", "PDU", "Paysandú Tydeo Larre Borges",          -32.3633, -58.0619),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # PARAGUAY
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SGAS", "ASU", "Asunción Silvio Pettirossi",           -25.2399, -57.5191),
-    ("SGCU", "AGT", "Ciudad del Este Guaraní",              -25.4545, -54.8460),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # BOLIVIA
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SLVR", "VVI", "Santa Cruz Viru Viru",                 -17.6448, -63.1354),
-    ("SLET", "SRZ", "Santa Cruz El Trompillo",              -17.8116, -63.1715),  # business aviation
-    ("SLLP", "LPB", "La Paz El Alto",                       -16.5103, -68.1894),
-    ("SLCB", "CBB", "Cochabamba Jorge Wilstermann",         -17.4211, -66.1771),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # BRASIL — São Paulo / Rio (destinos frecuentes jets privados argentinos)
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SBSP", "CGH", "São Paulo Congonhas",                  -23.6277, -46.6546),  # hub biz aviation
-    ("SBGR", "GRU", "São Paulo Guarulhos",                  -23.4319, -46.4678),
-    ("SBJD", "JDI", "Jundiaí Rolim Adolfo Amaro",          -23.1808, -46.9440),  # privados SP
-    ("SBKP", "VCP", "Campinas Viracopos",                   -23.0074, -47.1345),
-    ("SBRJ", "SDU", "Rio de Janeiro Santos Dumont",         -22.9105, -43.1631),  # centro RJ
-    ("SBGL", "GIG", "Rio de Janeiro Galeão",                -22.8099, -43.2506),
-    ("SBCT", "CWB", "Curitiba Afonso Pena",                 -25.5285, -49.1758),
-    ("SBFL", "FLN", "Florianópolis Hercílio Luz",           -27.6700, -48.5525),
-    ("SBPA", "POA", "Porto Alegre Salgado Filho",           -29.9944, -51.1714),
-    ("SBPE", "PET", "Pelotas",                              -31.7183, -52.3272),
-
-    # ══════════════════════════════════════════════════════════════════════════
-    # CHILE
-    # ══════════════════════════════════════════════════════════════════════════
-    ("SCEL", "SCL", "Santiago Arturo Merino Benítez",      -33.3930, -70.7858),
-    ("SCTE", "PMC", "Puerto Montt El Tepual",               -41.4389, -73.0944),
-    ("SCSE", "LSC", "La Serena La Florida",                 -29.9162, -71.1995),
-    ("SCCI", "PUQ", "Punta Arenas Carlos Ibáñez",          -53.0037, -70.8542),
-    ("SCVD", "ZAL", "Valdivia Pichoy",                      -39.6500, -73.0861),
-    ("SCPQ", "PMY_C", "Concepción Carriel Sur",             -36.7722, -73.0631),
-    ("SCAS", "ANF", "Antofagasta Cerro Moreno",             -23.4444, -70.4450),
-    ("SCIP", "IQQ", "Iquique Diego Aracena",                -20.5352, -70.1813),
-    ("SCCY", "CJC", "Calama El Loa",                        -22.4982, -68.9036),
-
-]
+_MAGIC  = b"APTDB01\0"
+_HEADER = struct.Struct("<8sIIqq")     # magic, count, blob bytes, csv mtime_ns, csv size
+_HEADER_SIZE = 64
 
 
 def haversine(lat1, lon1, lat2, lon2):
@@ -169,14 +40,338 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * 2 * math.asin(math.sqrt(a))
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
+def _unit_vector(lat, lon):
+    phi, lam = math.radians(lat), math.radians(lon)
+    return math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi)
+
+
+def _chord2(radius_km):
+    """Squared unit-sphere chord length matching a great-circle distance."""
+    if radius_km is None or radius_km >= math.pi * EARTH_RADIUS_KM:
+        return 4.0
+    return (2 * math.sin(radius_km / (2 * EARTH_RADIUS_KM))) ** 2
+
+
+class AirportIndex:
+    """Static k-d tree over airport positions as 3D unit vectors.
+
+    Chord length between unit vectors grows monotonically with great-circle
+    distance, so plain Euclidean pruning is exact and there is no special
+    case for the antimeridian or the poles. The tree is implicit: points are
+    stored in tree order in flat arrays and the node for [lo, hi) is its
+    midpoint, split on axis[mid]. Queries cost O(log n) for small k.
+    The arrays can be array.array or memoryviews over the compiled file."""
+
+    def __init__(self, x, y, z, axis, order):
+        self.x, self.y, self.z = x, y, z
+        self.axis  = axis
+        self.order = order   # tree slot -> airport index
+
+    @classmethod
+    def build(cls, coords):
+        n = len(coords)
+        vecs = [_unit_vector(lat, lon) + (i,) for i, (lat, lon) in enumerate(coords)]
+        axis = array("b", bytes(n))
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 0:
+                continue
+            part = vecs[lo:hi]
+            ax = max(range(3), key=lambda a: max(v[a] for v in part) - min(v[a] for v in part))
+            part.sort(key=lambda v: v[ax])
+            vecs[lo:hi] = part
+            mid = (lo + hi) // 2
+            axis[mid] = ax
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+        return cls(
+            array("d", (v[0] for v in vecs)),
+            array("d", (v[1] for v in vecs)),
+            array("d", (v[2] for v in vecs)),
+            axis,
+            array("i", (v[3] for v in vecs)),
+        )
+
+    def k_nearest(self, lat, lon, k=1, radius_km=None):
+        """Up to k (index, chord2) pairs within radius_km, nearest first (ties by index)."""
+        qx, qy, qz = _unit_vector(lat, lon)
+        q = (qx, qy, qz)
+        limit = _chord2(radius_km)
+        xs, ys, zs, axis, order = self.x, self.y, self.z, self.axis, self.order
+        best = []   # max-heap of (-chord2, -index)
+        stack = [(0, len(xs))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            d2 = (xs[mid] - qx) ** 2 + (ys[mid] - qy) ** 2 + (zs[mid] - qz) ** 2
+            bound = -best[0][0] if len(best) == k else limit
+            if d2 <= bound:
+                item = (-d2, -order[mid])
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+                bound = -best[0][0] if len(best) == k else limit
+            ax = axis[mid]
+            diff = q[ax] - (xs, ys, zs)[ax][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            if diff * diff <= bound:
+                stack.append(far)
+            stack.append(near)
+        return sorted(((-i, -d2) for d2, i in best), key=lambda t: (t[1], t[0]))
+
+    def within(self, lat, lon, radius_km):
+        """All (index, chord2) pairs within radius_km, nearest first."""
+        return self.k_nearest(lat, lon, len(self.x), radius_km)
+
+
+# ── Compiled file ──────────────────────────────────────────────────────────────
+
+def _read_csv(path):
+    """(icao, display_code, name, lat, lon) rows from an OurAirports-style CSV.
+    Display code = IATA when available, otherwise the ident."""
+    rows = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for r in csv.DictReader(f):
+            if (r.get("type") or "") in EXCLUDED_TYPES:
+                continue
+            try:
+                lat, lon = float(r["latitude_deg"]), float(r["longitude_deg"])
+            except (TypeError, ValueError):
+                continue
+            ident = r["ident"].strip()
+            rows.append((ident, (r.get("iata_code") or "").strip() or ident, r["name"].strip(), lat, lon))
+    return rows
+
+
+def _sections(n, blob_len):
+    """Byte offset of each section, 8-byte aligned, in file order."""
+    layout, pos = {}, _HEADER_SIZE
+    for name, size in (("lat", 8 * n), ("lon", 8 * n), ("x", 8 * n), ("y", 8 * n), ("z", 8 * n),
+                       ("order", 4 * n), ("offsets", 4 * (n + 1)), ("axis", n), ("blob", blob_len)):
+        layout[name] = (pos, size)
+        pos += (size + 7) & ~7
+    return layout, pos
+
+
+def compile_airports(csv_path=DEFAULT_CSV, out_path=None):
+    """Compile csv_path into the binary format and return the output path."""
+    out_path = out_path or os.path.splitext(csv_path)[0] + ".bin"
+    rows  = _read_csv(csv_path)
+    index = AirportIndex.build([(r[3], r[4]) for r in rows])
+
+    blob, offsets = bytearray(), array("I", [0])
+    for icao, iata, name, _, _ in rows:
+        blob += "\x1f".join((icao, iata, name)).encode("utf-8")
+        offsets.append(len(blob))
+
+    st = os.stat(csv_path)
+    layout, total = _sections(len(rows), len(blob))
+    data = {
+        "lat": array("d", (r[3] for r in rows)), "lon": array("d", (r[4] for r in rows)),
+        "x": index.x, "y": index.y, "z": index.z, "order": index.order,
+        "offsets": offsets, "axis": index.axis, "blob": blob,
+    }
+    buf = bytearray(total)
+    buf[:_HEADER.size] = _HEADER.pack(_MAGIC, len(rows), len(blob), st.st_mtime_ns, st.st_size)
+    for name, (pos, size) in layout.items():
+        buf[pos:pos + size] = bytes(data[name])
+
+    # Write next to the target and rename, so readers never map a partial file.
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+class AirportTable:
+    """Read-only sequence of (icao, display_code, name, lat, lon) over a compiled file.
+    Holds the spatial index and NumPy-friendly coordinate buffers (lat, lon, x, y, z)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, blob_len, self.src_mtime_ns, self.src_size = _HEADER.unpack_from(self._mm)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a compiled airport file")
+        view = memoryview(self._mm)
+        layout, _ = _sections(n, blob_len)
+        sec = {name: view[pos:pos + size] for name, (pos, size) in layout.items()}
+        self.lat, self.lon = sec["lat"].cast("d"), sec["lon"].cast("d")
+        self.x, self.y, self.z = sec["x"].cast("d"), sec["y"].cast("d"), sec["z"].cast("d")
+        self._offsets = sec["offsets"].cast("I")
+        self._blob    = sec["blob"]
+        self.index    = AirportIndex(self.x, self.y, self.z, sec["axis"].cast("b"), sec["order"].cast("i"))
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        icao, iata, name = bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8").split("\x1f")
+        return icao, iata, name, self.lat[i], self.lon[i]
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n))
+
+
+def load_airports(csv_path=None):
+    """Map the compiled airport file for csv_path, (re)compiling it if missing or stale."""
+    csv_path = csv_path or os.getenv("AIRPORTS_CSV") or DEFAULT_CSV
+    bin_path = os.path.splitext(csv_path)[0] + ".bin"
+    st = os.stat(csv_path)
+    try:
+        table = AirportTable(bin_path)
+        if (table.src_mtime_ns, table.src_size) == (st.st_mtime_ns, st.st_size):
+            return table
+    except (OSError, ValueError):
+        pass
+    return AirportTable(compile_airports(csv_path, bin_path))
+
+
+_table = None
+
+
+def _get_table():
+    global _table
+    if _table is None:
+        _table = load_airports()
+    return _table
+
+
+def __getattr__(name):
+    # AIRPORTS is mapped on first access rather than at import time.
+    if name == "AIRPORTS":
+        return _get_table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _airport_dict(i, lat, lon):
+    icao, iata, name, alat, alon = _get_table()[i]
+    return {"icao": icao, "iata": iata, "name": name,
+            "distance_km": round(haversine(lat, lon, alat, alon), 1)}
+
+
 def nearest_airport(lat, lon, radius_km=50):
     """Return nearest airport dict within radius_km, or None.
     Default radius raised to 50 km to cover private strips further from the threshold."""
-    best_dist = radius_km + 1
-    best = None
-    for icao, iata, name, alat, alon in AIRPORTS:
-        d = haversine(lat, lon, alat, alon)
-        if d < best_dist:
-            best_dist = d
-            best = {"icao": icao, "iata": iata, "name": name, "distance_km": round(d, 1)}
-    return best
+    hits = _get_table().index.k_nearest(lat, lon, 1, radius_km)
+    return _airport_dict(hits[0][0], lat, lon) if hits else None
+
+
+def nearest_airports(lat, lon, k=5, radius_km=None):
+    """Up to k nearest airport dicts (optionally within radius_km), nearest first."""
+    return [_airport_dict(i, lat, lon) for i, _ in _get_table().index.k_nearest(lat, lon, k, radius_km)]
+
+
+def airports_within(lat, lon, radius_km):
+    """All airport dicts within radius_km, nearest first."""
+    return [_airport_dict(i, lat, lon) for i, _ in _get_table().index.within(lat, lon, radius_km)]
+
+
+def _cell_grid(table, radius_km):
+    """Airports bucketed into a 3D grid of cubes with side = chord(radius_km):
+    every airport within the radius of a point lies in that point's cell or
+    one of its 26 neighbours. Cached per radius on the table."""
+    grids = table.__dict__.setdefault("_grids", {})
+    if radius_km not in grids:
+        cell = math.sqrt(_chord2(radius_km))
+        span = int(math.ceil(1.0 / cell)) + 2
+        xyz  = np.stack([np.frombuffer(a, dtype=np.float64) for a in (table.x, table.y, table.z)], axis=1)
+        keys = _cell_keys(np.floor(xyz / cell).astype(np.int64), span)
+        perm = np.argsort(keys, kind="stable")
+        grids[radius_km] = (cell, span, keys[perm], perm, xyz,
+                            np.frombuffer(table.index.order, dtype=np.int32).astype(np.int64))
+    return grids[radius_km]
+
+
+def _cell_keys(cells, span):
+    size = 2 * span + 1
+    return ((cells[:, 0] + span) * size + (cells[:, 1] + span)) * size + (cells[:, 2] + span)
+
+
+_NEIGHBOURS = np.array([(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)], dtype=np.int64)
+
+
+def resolve_batch(lats, lons, radius_km=50, chunk=65536):
+    """Vectorized nearest_airport for arrays of coordinates.
+
+    Returns (index, distance_km): index into AIRPORTS (-1 where nothing lies
+    within radius_km) and the great-circle distance (NaN where unresolved).
+    Ties go to the lower index, like nearest_airport."""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    idx  = np.full(lats.shape, -1, dtype=np.int64)
+    dist = np.full(lats.shape, np.nan)
+    table = _get_table()
+    if len(table) == 0:
+        return idx, dist
+    cell, span, keys, perm, xyz, order = _cell_grid(table, radius_km)
+    limit = _chord2(radius_km)
+
+    for start in range(0, len(lats), chunk):
+        phi = np.radians(lats[start:start + chunk])
+        lam = np.radians(lons[start:start + chunk])
+        q   = np.stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)], axis=1)
+        qcell = np.floor(q / cell).astype(np.int64)
+
+        # Candidate (query, slot) pairs from the 27 surrounding cells.
+        nkeys = _cell_keys((qcell[:, None, :] + _NEIGHBOURS[None, :, :]).reshape(-1, 3), span)
+        lo = np.searchsorted(keys, nkeys, side="left")
+        n  = np.searchsorted(keys, nkeys, side="right") - lo
+        qi = np.repeat(np.arange(len(nkeys)) // len(_NEIGHBOURS), n)
+        within_cell = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        slot = perm[np.repeat(lo, n) + within_cell]
+
+        d2   = ((xyz[slot] - q[qi]) ** 2).sum(axis=1)
+        keep = d2 <= limit
+        qi, d2, apt = qi[keep], d2[keep], order[slot[keep]]
+
+        # Best candidate per query: sort by (query, chord2, airport index), take the first.
+        sel = np.lexsort((apt, d2, qi))
+        first = sel[np.unique(qi[sel], return_index=True)[1]]
+        rows = start + qi[first]
+        idx[rows]  = apt[first]
+        dist[rows] = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(d2[first]) / 2))
+    return idx, dist
+
+
+def airport_by_code(code):
+    """(icao, display_code, name, lat, lon) for an ICAO ident or a display
+    (IATA) code, or None. Idents win when a code is both."""
+    table = _get_table()
+    by_code = table.__dict__.get("_by_code")
+    if by_code is None:
+        by_code = {}
+        rows = list(table)
+        for i, a in enumerate(rows):
+            by_code.setdefault(a[0], i)
+        for i, a in enumerate(rows):
+            by_code.setdefault(a[1], i)
+        table._by_code = by_code
+    i = by_code.get(code)
+    return table[i] if i is not None else None
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else (os.getenv("AIRPORTS_CSV") or DEFAULT_CSV)
+    out_path = sys.argv[2] if len(sys.argv) > 2 else None
+    out_path = compile_airports(csv_path, out_path)
+    print(f"Compiled {len(AirportTable(out_path))} airports from {csv_path} into {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,36 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 
+# Results are cached per calendar-month segment of the requested range.
+# Segments that end before today never change and stay cached; the segment
+# holding today is dropped by invalidate() when an event is written, and
+# expires after OPEN_SEGMENT_TTL anyway to pick up writes from other processes.
+# Operator/watchlist membership is edited outside the app, so past segments
+# filtered by it are refreshed every MEMBERSHIP_TTL instead of kept forever.
+# Imports that rewrite past days (rollup.rebuild) bump rollup_version, and
+# cache_sync.CacheSync calls invalidate_all() when it sees it change.
+OPEN_SEGMENT_TTL    = 60
+MEMBERSHIP_TTL      = 600
+MAX_CACHED_SEGMENTS = 4096
+
+_segment_cache = OrderedDict()   # (scope, seg_start, seg_end) -> (value, expires_at or None)
+_cache_lock    = threading.Lock()
+# Bumped by every invalidation, so a fetch that started before one isn't cached.
+_generation    = 0
+
 
 def _defaults(start_date, end_date):
     now = datetime.now(tz=timezone.utc)
     return start_date or now - timedelta(days=365), end_date or now
 
 
+def _days(start_date, end_date):
+    # The rollup is per UTC day, so ranges resolve to whole days.
+    return start_date.astimezone(timezone.utc).date(), end_date.astimezone(timezone.utc).date()
+
+
 def _filters(start_date, end_date, operator_name, watchlist_id, aircraft_id):
     f = {"start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
     if operator_name: f["operator_name"] = operator_name
@@ -14,97 +39,238 @@ def _filters(start_date, end_date, operator_name, watchlist_id, aircraft_id):
     return f
 
 
-def get_monthly_analytics(conn, start_date=None, end_date=None,
-                          operator_name=None, watchlist_id=None, aircraft_id=None):
-    start_date, end_date = _defaults(start_date, end_date)
-    filters_applied      = _filters(start_date, end_date, operator_name, watchlist_id, aircraft_id)
+def _scope(operator_name, watchlist_id, aircraft_id):
+    """Normalized non-date filters, used as part of the cache key."""
+    return (
+        (operator_name or "").strip() or None,
+        int(watchlist_id) if watchlist_id else None,
+        (aircraft_id or "").strip().lower() or None,
+    )
+
+
+def _segments(start_day, end_day):
+    """Split [start_day, end_day] into per-calendar-month (start, end) pieces."""
+    segs = []
+    cur  = start_day
+    while cur <= end_day:
+        next_month = (cur.replace(day=1) + timedelta(days=32)).replace(day=1)
+        seg_end    = min(end_day, next_month - timedelta(days=1))
+        segs.append((cur, seg_end))
+        cur = next_month
+    return segs
+
+
+def _cache_get(key, now):
+    with _cache_lock:
+        hit = _segment_cache.get(key)
+        if hit is None:
+            return None
+        value, expires_at = hit
+        if expires_at is not None and now > expires_at:
+            del _segment_cache[key]
+            return None
+        _segment_cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key, value, today, now, generation):
+    with _cache_lock:
+        if generation != _generation:
+            return
+        operator_name, watchlist_id, _aircraft_id = key[0]
+        if key[2] >= today:
+            expires_at = now + OPEN_SEGMENT_TTL
+        elif operator_name or watchlist_id:
+            expires_at = now + MEMBERSHIP_TTL
+        else:
+            expires_at = None
+        _segment_cache[key] = (value, expires_at)
+        _segment_cache.move_to_end(key)
+        while len(_segment_cache) > MAX_CACHED_SEGMENTS:
+            _segment_cache.popitem(last=False)
 
-    extra       = " AND e.aircraft_id = (SELECT id FROM aircraft WHERE icao24 = %s)" if aircraft_id else ""
-    base_params = [start_date, end_date] + ([aircraft_id] if aircraft_id else [])
 
+def invalidate(ts=None):
+    """Drop cached segments containing the day of ts (default: now). Called after an event is written."""
+    global _generation
+    day = (ts or datetime.now(tz=timezone.utc)).astimezone(timezone.utc).date()
+    with _cache_lock:
+        _generation += 1
+        for key in [k for k in _segment_cache if k[1] <= day <= k[2]]:
+            del _segment_cache[key]
+
+
+def invalidate_all():
+    """Drop every cached segment. Called when the rollup was rebuilt."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _segment_cache.clear()
+
+
+def _cached_segments(conn, start_date, end_date, scope):
+    """Per-segment values for [start_date, end_date], fetching only the missing
+    segments (in one query over their span) from the database."""
+    today = datetime.now(tz=timezone.utc).date()
+    now   = time.monotonic()
+    segs  = _segments(*_days(start_date, end_date))
+    generation = _generation
+
+    values  = {s: _cache_get((scope,) + s, now) for s in segs}
+    missing = [s for s in segs if values[s] is None]
+    if missing:
+        span_start, span_end = missing[0][0], missing[-1][1]
+        fetched = _fetch_segments(conn, span_start, span_end, scope)
+        for s in segs:
+            if span_start <= s[0] and s[1] <= span_end:
+                values[s] = fetched.get(s[0].replace(day=1)) or _empty_segment()
+                _cache_put((scope,) + s, values[s], today, now, generation)
+    return [(s, values[s]) for s in segs]
+
+
+def _scope_joins(alias, scope):
+    """Joins restricting rollup rows (aliased `alias`) to the scope's aircraft.
+    Each join hits an index: aircraft PK/icao24, operators.name, watchlist_aircraft PK."""
+    operator_name, watchlist_id, aircraft_id = scope
+    joins, params = [], []
+    if operator_name or aircraft_id:
+        joins.append(f"JOIN aircraft a ON a.id = {alias}.aircraft_id")
+        if aircraft_id:
+            joins[-1] += " AND a.icao24 = %s"
+            params.append(aircraft_id)
+    if operator_name:
+        joins.append("JOIN operators o ON o.id = a.operator_id AND o.name = %s")
+        params.append(operator_name)
+    if watchlist_id:
+        joins.append(f"JOIN watchlist_aircraft w ON w.aircraft_id = {alias}.aircraft_id AND w.watchlist_id = %s")
+        params.append(watchlist_id)
+    return "\n            ".join(joins), params
+
+
+def _fetch_segments(conn, start_day, end_day, scope):
+    """Flight counts, active aircraft and destination counts per month, in one round-trip."""
+    r_joins, r_params = _scope_joins("r", scope)
+    d_joins, d_params = _scope_joins("d", scope)
     with conn.cursor() as cur:
         cur.execute(f"""
             SELECT
-                TO_CHAR(DATE_TRUNC('month', e.ts), 'YYYY-MM') AS month,
-                COUNT(*) FILTER (WHERE e.type = 'TAKEOFF') AS takeoffs,
-                COUNT(*) FILTER (WHERE e.type = 'LANDING') AS landings
-            FROM events e
-            WHERE e.ts >= %s AND e.ts <= %s
-              AND e.type IN ('TAKEOFF', 'LANDING')
-              {extra}
+                DATE_TRUNC('month', r.day)::date AS month,
+                NULL::text      AS airport,
+                NULL::text      AS name,
+                SUM(r.takeoffs) AS takeoffs,
+                SUM(r.landings) AS landings,
+                ARRAY_AGG(DISTINCT r.aircraft_id) FILTER (WHERE r.takeoffs > 0) AS active
+            FROM event_daily_rollup r
+            {r_joins}
+            WHERE r.day >= %s AND r.day <= %s
             GROUP BY 1
-            ORDER BY 1
-        """, base_params)
-        monthly_rows = cur.fetchall()
+            UNION ALL
+            SELECT
+                DATE_TRUNC('month', d.day)::date AS month,
+                d.airport,
+                MAX(d.name),
+                NULL,
+                SUM(d.landings),
+                NULL
+            FROM event_daily_destinations d
+            {d_joins}
+            WHERE d.day >= %s AND d.day <= %s
+            GROUP BY 1, 2
+        """, r_params + [start_day, end_day] + d_params + [start_day, end_day])
+        out = {}
+        for r in cur.fetchall():
+            seg = out.setdefault(r["month"], _empty_segment())
+            if r["airport"] is None:
+                seg["takeoffs"] = int(r["takeoffs"])
+                seg["landings"] = int(r["landings"])
+                seg["active"]   = frozenset(r["active"] or ())
+            else:
+                seg["destinations"][r["airport"]] = (r["name"], int(r["landings"]))
+        return out
 
-        cur.execute(f"""
-            SELECT COUNT(DISTINCT e.aircraft_id) AS active_aircraft
-            FROM events e
-            WHERE e.ts >= %s AND e.ts <= %s
-              AND e.type = 'TAKEOFF'
-              {extra}
-        """, base_params)
-        active_row = cur.fetchone()
-
-    monthly_series = [
+
+def _empty_segment():
+    return {"takeoffs": 0, "landings": 0, "active": frozenset(), "destinations": {}}
+
+
+def _monthly_series(segments):
+    return [
         {
-            "month":    r["month"],
-            "flights":  int(r["takeoffs"]),
-            "takeoffs": int(r["takeoffs"]),
-            "landings": int(r["landings"]),
+            "month":    seg_start.strftime("%Y-%m"),
+            "flights":  v["takeoffs"],
+            "takeoffs": v["takeoffs"],
+            "landings": v["landings"],
         }
-        for r in monthly_rows
+        for (seg_start, _), v in segments
+        if v["takeoffs"] or v["landings"]
     ]
 
-    total_takeoffs = sum(r["takeoffs"] for r in monthly_series)
-    total_landings = sum(r["landings"] for r in monthly_series)
 
+def _kpis(segments, monthly_series):
+    total_takeoffs  = sum(r["takeoffs"] for r in monthly_series)
+    total_landings  = sum(r["landings"] for r in monthly_series)
+    active_aircraft = frozenset().union(*(v["active"] for _, v in segments))
     return {
-        "filters_applied": filters_applied,
-        "kpis": {
-            "total_flights":   total_takeoffs,
-            "takeoffs":        total_takeoffs,
-            "landings":        total_landings,
-            "active_aircraft": int(active_row["active_aircraft"] or 0),
-        },
-        "monthly_series": monthly_series,
+        "total_flights":   total_takeoffs,
+        "takeoffs":        total_takeoffs,
+        "landings":        total_landings,
+        "active_aircraft": len(active_aircraft),
     }
 
 
-def get_top_destinations(conn, start_date=None, end_date=None,
-                         operator_name=None, watchlist_id=None, aircraft_id=None):
+def _top_destinations(segments, limit=20):
+    totals = {}
+    for _, v in segments:
+        for airport, (name, count) in v["destinations"].items():
+            prev_name, prev_count = totals.get(airport, (None, 0))
+            totals[airport] = (prev_name or name, prev_count + count)
+
+    top = sorted(totals.items(), key=lambda kv: (-kv[1][1], kv[0]))[:limit]
+    return [
+        {
+            "airport": airport,
+            "name":    name or airport,
+            "count":   count,
+        }
+        for airport, (name, count) in top
+    ]
+
+
+def _prepare(conn, start_date, end_date, operator_name, watchlist_id, aircraft_id):
     start_date, end_date = _defaults(start_date, end_date)
     filters_applied      = _filters(start_date, end_date, operator_name, watchlist_id, aircraft_id)
+    scope                = _scope(operator_name, watchlist_id, aircraft_id)
+    return filters_applied, _cached_segments(conn, start_date, end_date, scope)
 
-    extra       = " AND e.aircraft_id = (SELECT id FROM aircraft WHERE icao24 = %s)" if aircraft_id else ""
-    base_params = [start_date, end_date] + ([aircraft_id] if aircraft_id else [])
 
-    with conn.cursor() as cur:
-        cur.execute(f"""
-            SELECT
-                e.meta->>'destination_airport' AS airport,
-                e.meta->>'destination_name'    AS name,
-                COUNT(*)                        AS count
-            FROM events e
-            WHERE e.ts >= %s AND e.ts <= %s
-              AND e.type = 'LANDING'
-              AND e.meta->>'destination_airport' IS NOT NULL
-              AND e.meta->>'destination_airport' <> 'UNKNOWN'
-              {extra}
-            GROUP BY 1, 2
-            ORDER BY 3 DESC
-            LIMIT 20
-        """, base_params)
-        rows = cur.fetchall()
+def get_monthly_analytics(conn, start_date=None, end_date=None,
+                          operator_name=None, watchlist_id=None, aircraft_id=None):
+    filters_applied, segments = _prepare(conn, start_date, end_date, operator_name, watchlist_id, aircraft_id)
+    monthly_series = _monthly_series(segments)
+    return {
+        "filters_applied": filters_applied,
+        "kpis":            _kpis(segments, monthly_series),
+        "monthly_series":  monthly_series,
+    }
+
+
+def get_top_destinations(conn, start_date=None, end_date=None,
+                         operator_name=None, watchlist_id=None, aircraft_id=None):
+    filters_applied, segments = _prepare(conn, start_date, end_date, operator_name, watchlist_id, aircraft_id)
+    return {
+        "filters_applied":  filters_applied,
+        "top_destinations": _top_destinations(segments),
+    }
+
 
+def get_analytics_bundle(conn, start_date=None, end_date=None,
+                         operator_name=None, watchlist_id=None, aircraft_id=None):
+    """KPIs, monthly series and top destinations from a single segment pass."""
+    filters_applied, segments = _prepare(conn, start_date, end_date, operator_name, watchlist_id, aircraft_id)
+    monthly_series = _monthly_series(segments)
     return {
         "filters_applied":  filters_applied,
-        "top_destinations": [
-            {
-                "airport": r["airport"],
-                "name":    r["name"] or r["airport"],
-                "count":   int(r["count"]),
-            }
-            for r in rows
-        ],
+        "kpis":             _kpis(segments, monthly_series),
+        "monthly_series":   monthly_series,
+        "top_destinations": _top_destinations(segments),
     }
@@ -0,0 +1,168 @@
+"""
+Backfills origin/destination airports on TAKEOFF/LANDING events.
+
+Events written by import_history.py and parse_telegram.py have no
+origin_airport / destination_airport, so they never reach the destinations
+rollup. This walks the events table in id order, in batches, and for every
+event that is missing the field (or has it as UNKNOWN) works out a location:
+
+  1. meta.airport, the ICAO code OpenSky reports for historic flights, if
+     it is in the airports table
+  2. meta.lat / meta.lon
+  3. the recorded position closest to the event (LANDING: last one within
+     2 h before, like the live monitor; TAKEOFF: nearest within 30 min)
+
+All coordinates of a batch are resolved in one vectorized pass
+(airports.resolve_batch), written back with one UPDATE, and the rollup is
+rebuilt for the days that changed; web processes see the rebuild through
+rollup_version and drop their cached analytics. With --all, an event whose
+airport can no longer be resolved keeps the one it has rather than being set
+to UNKNOWN.
+
+Usage:
+  python backfill_airports.py [--batch-size 5000] [--all] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor, execute_values
+
+from airports import AIRPORTS, airport_by_code, resolve_batch
+from rollup import rebuild, utc_day
+
+RADIUS_KM = 50
+
+_FIELDS = {
+    "TAKEOFF": ("origin_airport", "origin_name"),
+    "LANDING": ("destination_airport", "destination_name"),
+}
+
+_SELECT = """
+    SELECT e.id, e.ts, e.type, e.meta, p.lat AS pos_lat, p.lon AS pos_lon
+    FROM events e
+    LEFT JOIN LATERAL (
+        SELECT lat, lon FROM positions
+        WHERE aircraft_id = e.aircraft_id AND lat IS NOT NULL
+          AND (jsonb_typeof(e.meta->'lat') IS DISTINCT FROM 'number'
+               OR jsonb_typeof(e.meta->'lon') IS DISTINCT FROM 'number')
+          AND CASE WHEN e.type = 'LANDING'
+                   THEN ts BETWEEN e.ts - INTERVAL '2 hours' AND e.ts
+                   ELSE ts BETWEEN e.ts - INTERVAL '30 minutes' AND e.ts + INTERVAL '30 minutes'
+              END
+        ORDER BY ABS(EXTRACT(EPOCH FROM ts - e.ts))
+        LIMIT 1
+    ) p ON TRUE
+    WHERE e.id > %(after)s
+      AND e.type IN ('TAKEOFF', 'LANDING')
+      {missing}
+    ORDER BY e.id
+    LIMIT %(limit)s
+"""
+
+_MISSING = """AND COALESCE(e.meta->>(CASE WHEN e.type = 'TAKEOFF' THEN 'origin_airport'
+                                      ELSE 'destination_airport' END), 'UNKNOWN') = 'UNKNOWN'"""
+
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _patches(rows):
+    """meta patches {id: {...}} for a batch; coordinates are resolved together.
+    An event that already has a known airport gets no UNKNOWN patch."""
+    patches, coords = {}, []
+    for r in rows:
+        meta = r["meta"] or {}
+        code_field, name_field = _FIELDS[r["type"]]
+        apt = airport_by_code(meta.get("airport")) if meta.get("airport") else None
+        if apt:
+            patches[r["id"]] = {code_field: apt[1], name_field: apt[2]}
+            continue
+        lat, lon = _number(meta.get("lat")), _number(meta.get("lon"))
+        if lat is None or lon is None:
+            lat, lon = r["pos_lat"], r["pos_lon"]
+        if lat is None or lon is None:
+            patches[r["id"]] = {code_field: "UNKNOWN"}
+        else:
+            coords.append((r["id"], r["type"], lat, lon))
+
+    if coords:
+        idx, _ = resolve_batch([c[2] for c in coords], [c[3] for c in coords], RADIUS_KM)
+        for (event_id, event_type, _, _), i in zip(coords, idx.tolist()):
+            code_field, name_field = _FIELDS[event_type]
+            if i < 0:
+                patches[event_id] = {code_field: "UNKNOWN"}
+            else:
+                apt = AIRPORTS[i]
+                patches[event_id] = {code_field: apt[1], name_field: apt[2]}
+
+    for r in rows:
+        code_field, _ = _FIELDS[r["type"]]
+        if patches[r["id"]].get(code_field) == "UNKNOWN" and (r["meta"] or {}).get(code_field, "UNKNOWN") != "UNKNOWN":
+            del patches[r["id"]]
+    return patches
+
+
+def backfill(conn, batch_size=5000, everything=False, dry_run=False):
+    """Resolve airports for every matching event. Returns (updated, resolved, first_day, last_day)."""
+    sql = _SELECT.format(missing="" if everything else _MISSING)
+    after, updated, resolved, days = 0, 0, 0, []
+    while True:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql, {"after": after, "limit": batch_size})
+            rows = cur.fetchall()
+        if not rows:
+            break
+        after = rows[-1]["id"]
+
+        patches = _patches(rows)
+        resolved += sum(1 for p in patches.values() if "UNKNOWN" not in p.values())
+        updated  += len(patches)
+        batch_days = [utc_day(r["ts"]) for r in rows]
+        days += [min(batch_days), max(batch_days)]
+        if not dry_run:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    UPDATE events e SET meta = COALESCE(e.meta, '{}'::jsonb) || v.patch::jsonb
+                    FROM (VALUES %s) AS v(id, patch)
+                    WHERE e.id = v.id
+                """, [(event_id, json.dumps(p)) for event_id, p in patches.items()])
+            conn.commit()
+        print(f"  … id {after}: {updated} events, {resolved} resolved")
+
+    first_day = min(days) if days else None
+    last_day  = max(days) if days else None
+    if days and not dry_run:
+        rebuild(conn, first_day, last_day)
+        conn.commit()
+    return updated, resolved, first_day, last_day
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--all",     action="store_true", help="re-resolve events that already have an airport")
+    parser.add_argument("--dry-run", action="store_true", help="resolve but don't write anything")
+    args = parser.parse_args()
+
+    load_dotenv()
+    t0 = time.perf_counter()
+    with psycopg2.connect(os.getenv("DATABASE_URL")) as conn:
+        updated, resolved, first_day, last_day = backfill(conn, args.batch_size, args.all, args.dry_run)
+    elapsed = time.perf_counter() - t0
+    print(f"\n{'Would update' if args.dry_run else 'Updated'} {updated} events "
+          f"({resolved} resolved, {updated - resolved} UNKNOWN) in {elapsed:.1f}s")
+    if first_day and not args.dry_run:
+        print(f"Rollup rebuilt for {first_day} → {last_day}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+How the query layer scales with fleet size.
+
+  python bench/db_scale.py [--scales 5,50,500,5000] [--years 2] [--position-every 25]
+                           [--repeat 3] [--database-url URL] [--allow-remote]
+
+Grows a synthetic fleet (bench/synth_fleet.py) in a local Postgres to each
+scale in turn, ANALYZEs, and times every query function the API serves from:
+db.py, the analytics bundle (full year, by operator, by watchlist), the
+forecast and the flight replay. The in-process caches of analytics, forecast
+and replay are cleared before every call, so the times are cold-cache ones.
+Wall time, best of --repeat, in milliseconds; a table per run with one
+column per scale. Scales count synthetic aircraft, on top of whatever the
+database already holds; a scale already loaded is not loaded again.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from localdb import add_arguments, use_local_database
+import synth_fleet
+
+
+def cases(end, sample_icao24, sample_id, watchlist_id):
+    """[(name, fn(conn))] for every timed call."""
+    import analytics
+    import db
+    import forecast
+    import replay
+
+    def analytics_bundle(**filters):
+        def run(conn):
+            analytics.invalidate_all()
+            return analytics.get_analytics_bundle(conn, **filters)
+        return run
+
+    def forecast_horizon(conn):
+        forecast._takeoffs.loaded_at = None
+        return forecast.get_forecast_horizon(conn, 24, per_aircraft=True)
+
+    def flight_replay(conn):
+        replay._replays.clear()
+        return replay.get_flight_replay(conn, sample_icao24)
+
+    return [
+        ("get_snapshot",                  db.get_snapshot),
+        ("get_snapshot_at (-1 day)",      lambda conn: db.get_snapshot_at(conn, end - timedelta(days=1))),
+        ("get_latest_positions",          db.get_latest_positions),
+        ("get_flight_board",              db.get_flight_board),
+        ("get_flight_board (1 aircraft)", lambda conn: db.get_flight_board(conn, icao24=sample_icao24)),
+        ("get_replay_range (1 h, fleet)", lambda conn: db.get_replay_range(conn, end - timedelta(hours=1), end, 60)),
+        ("get_replay_range (24 h, 1 ac)", lambda conn: db.get_replay_range(conn, end - timedelta(hours=24), end, 60,
+                                                                           sample_icao24)),
+        ("has_recent_event",              lambda conn: db.has_recent_event(conn, sample_id, "TAKEOFF")),
+        ("analytics bundle (365 d)",      analytics_bundle()),
+        ("analytics bundle (operator)",   analytics_bundle(operator_name="Synthetic operator 0001")),
+        ("analytics bundle (watchlist)",  analytics_bundle(watchlist_id=watchlist_id)),
+        ("forecast 24 h per aircraft",    forecast_horizon),
+        ("flight replay (1 aircraft)",    flight_replay),
+    ]
+
+
+def _sizes(conn):
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE aircraft, positions, events, event_daily_rollup, event_daily_destinations")
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM aircraft) AS aircraft,
+                   (SELECT reltuples::bigint FROM pg_class WHERE relname = 'positions') AS positions,
+                   (SELECT reltuples::bigint FROM pg_class WHERE relname = 'events') AS events
+        """)
+        sizes = cur.fetchone()
+    conn.commit()
+    return sizes
+
+
+def _time(conn, fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            fn(conn)
+        except Exception as e:
+            conn.rollback()
+            return f"error: {e}".splitlines()[0]
+        dt = time.perf_counter() - t0
+        conn.rollback()
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="5,50,500,5000",
+                        type=lambda s: sorted(int(x) for x in s.split(",")))
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--position-every", type=int, default=25)
+    parser.add_argument("--flights-per-day", type=float, default=0.6)
+    parser.add_argument("--repeat", type=int, default=3)
+    add_arguments(parser)
+    args = parser.parse_args()
+    use_local_database(args, "the benchmark loads a synthetic fleet")
+
+    from db import get_db
+
+    end   = datetime.now(timezone.utc)
+    start = end - timedelta(days=365.25 * args.years)
+    conn  = get_db()
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) AS n FROM aircraft WHERE tail_number LIKE 'SY-%'")
+        loaded = cur.fetchone()["n"]
+    conn.commit()
+
+    results, sizes = {}, {}
+    for scale in args.scales:
+        if scale > loaded:
+            print(f"Growing the synthetic fleet {loaded} → {scale} aircraft ({args.years} years)...")
+            synth_fleet.load(conn, loaded, scale - loaded, start, end, args.position_every,
+                             args.flights_per_day, progress=lambda msg: None)
+            loaded = scale
+        sizes[scale] = _sizes(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM aircraft WHERE icao24 = %s", (synth_fleet.icao24(0),))
+            sample_id = cur.fetchone()["id"]
+            cur.execute("SELECT id FROM watchlists WHERE name = %s", (synth_fleet.WATCHLIST,))
+            watchlist_id = cur.fetchone()["id"]
+        conn.commit()
+        print(f"  {scale} synthetic aircraft: {sizes[scale]['aircraft']} aircraft, "
+              f"~{sizes[scale]['positions']:,} positions, ~{sizes[scale]['events']:,} events")
+        for name, fn in cases(end, synth_fleet.icao24(0), sample_id, watchlist_id):
+            results.setdefault(name, {})[scale] = _time(conn, fn, args.repeat)
+    conn.close()
+
+    width = max(len(name) for name in results)
+    print(f"\n{'ms, best of ' + str(args.repeat):<{width}} " + " ".join(f"{s:>10}" for s in args.scales))
+    for name, by_scale in results.items():
+        cells = []
+        for s in args.scales:
+            v = by_scale[s]
+            cells.append(f"{v * 1000:>10.1f}" if isinstance(v, float) else f"{'error':>10}")
+        print(f"{name:<{width}} " + " ".join(cells))
+    for name, by_scale in results.items():
+        for s, v in by_scale.items():
+            if isinstance(v, str):
+                print(f"{name} @ {s}: {v}")
+
+
+if __name__ == "__main__":
+    main()
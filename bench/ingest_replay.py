@@ -0,0 +1,188 @@
+"""
+Replay recorded OpenSky / ADSB.one responses through check_flights.
+
+  python bench/ingest_replay.py RECORDING... [--speed 0] [--limit N]
+                                [--database-url URL] [--allow-remote] [--verbose]
+
+RECORDING is a file or directory written by recorder.py (INGEST_RECORD_DIR).
+Each recorded OpenSky response starts a cycle; the ADSB.one responses after it
+answer that cycle's fallback lookups. Cycles run on a virtual clock set to the
+recorded times, so the grace periods, dedup windows and row timestamps behave
+as they did in production. --speed N sleeps the recorded gaps divided by N;
+the default 0 runs cycles back to back. Telegram is replaced by a stub that
+keeps the messages.
+
+Positions and events are written to DATABASE_URL (or --database-url), which
+must be a local Postgres with the schema and migrations applied. Use a scratch
+database: a second replay of the same recording is deduplicated against the
+first. Reports cycles per second, cycle latency, rows written and the events
+and notifications the replay produced.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import recorder
+from localdb import add_arguments, use_local_database
+
+
+class VirtualClock:
+    """ingest.clock for replays: recorded time, advanced by the replayer and by sleeps."""
+
+    def __init__(self, speed=0):
+        self.speed = speed
+        self.t     = None
+
+    def time(self):
+        return self.t
+
+    def sleep(self, seconds):
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self.t += seconds
+
+    def advance_to(self, t):
+        if self.t is not None and self.speed and t > self.t:
+            time.sleep((t - self.t) / self.speed)
+        self.t = t if self.t is None else max(self.t, t)
+
+    def row_ts(self):
+        return datetime.fromtimestamp(self.t, timezone.utc)
+
+
+def cycles(entries, opensky_url):
+    """(t, {url: deque of (status, body)}) per recorded cycle."""
+    t, responses = None, None
+    for e in entries:
+        if e["url"] == opensky_url:
+            if responses is not None:
+                yield t, responses
+            t, responses = e["t"], defaultdict(deque)
+        elif responses is None:
+            continue   # ADSB.one lookups of a cycle that started before the recording
+        responses[e["url"]].append((e["status"], e["body"]))
+    if responses is not None:
+        yield t, responses
+
+
+class Replay:
+    """Serves one cycle's recorded responses to ingest.fetch and keeps the notifications."""
+
+    def __init__(self):
+        self.responses     = {}
+        self.served        = Counter()
+        self.missing       = 0
+        self.notifications = []
+
+    def fetch(self, url, timeout):
+        queue = self.responses.get(url)
+        if not queue:
+            self.missing += 1   # ingest asked for something production didn't
+            return 404, ""
+        self.served["OpenSky" if "opensky" in url else "ADSB.one"] += 1
+        return queue.popleft()
+
+    def notify(self, msg):
+        self.notifications.append(msg)
+
+
+def _counts(conn, since):
+    """Positions and events by type from unix time `since` on."""
+    since = datetime.fromtimestamp(since, timezone.utc)
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) AS n FROM positions WHERE ts >= %s", (since,))
+        positions = cur.fetchone()["n"]
+        cur.execute("SELECT type, count(*) AS n FROM events WHERE ts >= %s GROUP BY type", (since,))
+        events = Counter({r["type"]: r["n"] for r in cur.fetchall()})
+    conn.commit()
+    return positions, events
+
+
+def _ensure_aircraft(conn, planes):
+    with conn.cursor() as cur:
+        for icao24, tail in planes.items():
+            cur.execute("""
+                INSERT INTO aircraft (icao24, tail_number)
+                SELECT %s, %s WHERE NOT EXISTS (SELECT 1 FROM aircraft WHERE icao24 = %s)
+            """, (icao24, tail, icao24))
+    conn.commit()
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--speed", type=float, default=0, help="N x recorded time; 0 = as fast as possible")
+    parser.add_argument("--limit", type=int, help="replay at most this many cycles")
+    add_arguments(parser)
+    parser.add_argument("--verbose", action="store_true", help="show ingest's own output")
+    args = parser.parse_args()
+
+    use_local_database(args, "replays write positions and events")
+
+    import ingest
+    from db import get_db
+
+    clock, replay = VirtualClock(args.speed), Replay()
+    ingest.clock           = clock
+    ingest.fetch           = replay.fetch
+    ingest.notify_telegram = replay.notify
+
+    conn = get_db()
+    _ensure_aircraft(conn, ingest.PLANES)
+
+    latencies, first, last = [], None, None
+    out = sys.stdout if args.verbose else io.StringIO()
+    started = time.perf_counter()
+    for n, (t, responses) in enumerate(cycles(recorder.read(args.recordings), ingest.OPENSKY_URL)):
+        if args.limit is not None and n >= args.limit:
+            break
+        if first is None:
+            first = t
+            before = _counts(conn, first)
+        clock.advance_to(t)
+        replay.responses = responses
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(out):
+            ingest.check_flights()
+        latencies.append(time.perf_counter() - t0)
+        if not args.verbose:
+            out.seek(0)
+            out.truncate()
+        last = clock.t
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        sys.exit("No OpenSky responses in the recordings")
+    after = _counts(conn, first)
+    conn.close()
+
+    span = last - first
+    latencies.sort()
+    print(f"Replayed {len(latencies)} cycles ({datetime.fromtimestamp(first, timezone.utc):%Y-%m-%d %H:%M} → "
+          f"{datetime.fromtimestamp(last, timezone.utc):%Y-%m-%d %H:%M} UTC, {span / 3600:.1f} h) "
+          f"in {elapsed:.1f} s: {len(latencies) / elapsed:.1f} cycles/s, "
+          f"{span / elapsed if elapsed else 0:.0f}x recorded time")
+    print(f"cycle ms     p50 {_percentile(latencies, 50) * 1000:.1f}  p95 {_percentile(latencies, 95) * 1000:.1f}  "
+          f"max {latencies[-1] * 1000:.1f}")
+    print(f"responses    {replay.served['OpenSky']} OpenSky, {replay.served['ADSB.one']} ADSB.one, "
+          f"{replay.missing} requested but not recorded")
+    events = after[1] - before[1]
+    print(f"db writes    {after[0] - before[0]} positions, {sum(events.values())} events")
+    print("events       " + (", ".join(f"{k} {v}" for k, v in sorted(events.items())) or "none"))
+    print(f"telegram     {len(replay.notifications)} messages")
+
+
+if __name__ == "__main__":
+    main()
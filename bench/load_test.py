@@ -0,0 +1,305 @@
+"""
+HTTP load on the dashboard endpoints, polled the way the frontend polls them.
+
+  python bench/load_test.py [--url http://localhost:5000] [--clients 50] [--duration 120]
+                            [--connections 64] [--replays-per-min 0.1] [--analytics-per-min 0.2]
+                            [--flights-per-min 0.1] [--json results.json] [--allow-remote]
+
+Simulates --clients open dashboards (frontend/app/page.tsx). Each one, when it
+opens (spread over the first --ramp seconds), fetches the snapshot, the 24 h
+forecast and the analytics bundle for the last year; then polls the snapshot
+every 5 s and the forecast every 60 s. On top of that, at random (Poisson,
+rates per client per minute):
+
+  replay     the last flight of an aircraft (/replay/flight) or the last 2 h
+             of the fleet (/replay/range); the snapshot polling pauses for
+             --replay-watch seconds, as it does in replay mode
+  analytics  the bundle again, filtered by an aircraft half of the time
+  flights    the flight board tab (/api/flight-board?limit=40)
+
+Requests are issued on schedule whether or not earlier ones have finished,
+like setInterval, by a pool of --connections keep-alive connections; latency
+is measured from the scheduled time, so a server (or pool) that falls behind
+shows up in the percentiles instead of slowing the load down. Bodies are
+requested compressed, as a browser does, and read whole.
+
+Start the app on a local Postgres first, e.g. with bench/synth_fleet.py data:
+
+  gunicorn app:app -w 4                       # sync workers
+  gunicorn app:app -w 2 --threads 8           # threaded workers
+
+Reports, per route, requests, errors, requests per second and p50/p95/p99/max
+latency. Only the standard library is needed.
+"""
+
+import argparse
+import heapq
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode, urlsplit
+
+from localdb import LOCAL_HOSTS
+
+SNAPSHOT_EVERY = 5    # seconds, page.tsx
+FORECAST_EVERY = 60
+REPLAY_RANGE_H = 2    # page.tsx's default replay window
+FLEET = ["e0659a", "e030cf", "e06546", "e0b341", "e0b058"]   # page.tsx PLANES
+
+
+def _day(dt):
+    return dt.strftime("%Y-%m-%d")
+
+
+def _analytics_path(aircraft=None):
+    today = datetime.now(timezone.utc)
+    params = {"start_date": _day(today - timedelta(days=365)), "end_date": _day(today)}
+    if aircraft:
+        params["aircraft_id"] = aircraft
+    return "/analytics/bundle?" + urlencode(params)
+
+
+def _replay_path(fleet):
+    if random.random() < 0.5:
+        return "/replay/flight?" + urlencode({"icao24": random.choice(fleet)})
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    return "/replay/range?" + urlencode({
+        "start": (end - timedelta(hours=REPLAY_RANGE_H)).isoformat(),
+        "end": end.isoformat(),
+        "step_seconds": 300,
+    })
+
+
+class Results:
+    """Latencies and errors per route, from any thread."""
+
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors    = defaultdict(lambda: defaultdict(int))
+        self.bytes     = defaultdict(int)
+
+    def add(self, route, latency, status, size):
+        with self.lock:
+            self.latencies[route].append(latency)
+            self.bytes[route] += size
+            if status != 200:
+                self.errors[route][status] += 1
+
+
+class Connections:
+    """One keep-alive HTTP connection per pool thread."""
+
+    def __init__(self, url, timeout):
+        parts        = urlsplit(url)
+        self.cls     = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc  = parts.netloc
+        self.prefix  = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.local   = threading.local()
+
+    def get(self, path):
+        """(status, body bytes); status is the exception name if the request failed."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self.cls(self.netloc, timeout=self.timeout)
+        try:
+            conn.request("GET", self.prefix + path, headers={
+                "Accept": "application/json",
+                "Accept-Encoding": "br, gzip",
+            })
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.will_close:
+                conn.close()
+                self.local.conn = None
+            return resp.status, body
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            self.local.conn = None
+            return type(e).__name__, b""
+
+
+def wait_ready(connections, timeout):
+    """Block until /ready answers 200 (the app's warm-up has run), or exit."""
+    deadline = time.monotonic() + timeout
+    while True:
+        status, body = connections.get("/ready")
+        if status == 200:
+            return
+        if time.monotonic() > deadline:
+            sys.exit(f"/ready still answers {status} after {timeout} s: {body[:200]!r}")
+        time.sleep(1)
+
+
+class Dashboards:
+    """Schedules every simulated client's requests on one timeline (monotonic seconds)."""
+
+    def __init__(self, args, start):
+        self.args     = args
+        self.fleet    = args.aircraft
+        self.heap     = []
+        self.seq      = 0
+        self.replay_until = {}
+        for client in range(args.clients):
+            opened = start + random.uniform(0, args.ramp)
+            for kind in ("snapshot", "forecast", "analytics"):
+                self.push(opened, client, kind)
+            for kind, per_min in (("replay", args.replays_per_min),
+                                  ("analytics_filter", args.analytics_per_min),
+                                  ("flights", args.flights_per_min)):
+                self.push_random(opened, client, kind, per_min)
+
+    def push(self, t, client, kind):
+        heapq.heappush(self.heap, (t, self.seq, client, kind))
+        self.seq += 1
+
+    def push_random(self, t, client, kind, per_min):
+        if per_min > 0:
+            self.push(t + random.expovariate(per_min / 60), client, kind)
+
+    def next(self):
+        return heapq.heappop(self.heap) if self.heap else None
+
+    def request(self, t, client, kind):
+        """(route, path) to send for this event, or None; schedules the client's next one."""
+        args = self.args
+        if kind == "snapshot":
+            paused = self.replay_until.get(client, 0)
+            if t < paused:
+                self.push(paused, client, kind)   # back from replay mode: fetch at once, then poll
+                return None
+            self.push(t + SNAPSHOT_EVERY, client, kind)
+            return "/dashboard/snapshot", "/dashboard/snapshot"
+        if kind == "forecast":
+            self.push(t + FORECAST_EVERY, client, kind)
+            return "/forecast/24h", "/forecast/24h"
+        if kind == "analytics":
+            return "/analytics/bundle", _analytics_path()
+        if kind == "analytics_filter":
+            self.push_random(t, client, kind, args.analytics_per_min)
+            return "/analytics/bundle", _analytics_path(random.choice(self.fleet) if random.random() < 0.5 else None)
+        if kind == "flights":
+            self.push_random(t, client, kind, args.flights_per_min)
+            return "/api/flight-board", "/api/flight-board?limit=40"
+        if kind == "replay":
+            self.push_random(t + args.replay_watch, client, kind, args.replays_per_min)
+            self.replay_until[client] = t + args.replay_watch
+            path = _replay_path(self.fleet)
+            return path.split("?")[0], path
+        raise ValueError(kind)
+
+
+def run(args, connections):
+    """Drive the load for args.duration seconds; returns (Results, elapsed)."""
+    results    = Results()
+    start      = time.monotonic()
+    end        = start + args.duration
+    dashboards = Dashboards(args, start)
+    late       = 0
+
+    def send(route, path, scheduled):
+        status, body = connections.get(path)
+        results.add(route, time.monotonic() - scheduled, status, len(body))
+
+    with ThreadPoolExecutor(max_workers=args.connections) as pool:
+        while True:
+            event = dashboards.next()
+            if event is None or event[0] >= end:
+                break
+            t, _, client, kind = event
+            delay = t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.1:
+                late += 1
+            req = dashboards.request(t, client, kind)
+            if req:
+                pool.submit(send, *req, t)
+        print(f"Load sent for {args.duration} s; waiting for outstanding requests...", file=sys.stderr)
+    if late:
+        print(f"warning: {late} requests dispatched >100 ms late; the load generator is saturated",
+              file=sys.stderr)
+    return results, time.monotonic() - start
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def summary(results, duration):
+    rows = {}
+    for route, latencies in sorted(results.latencies.items()):
+        latencies = sorted(latencies)
+        rows[route] = {
+            "requests": len(latencies),
+            "errors":   dict(results.errors[route]),
+            "rps":      len(latencies) / duration,
+            "p50_ms":   _percentile(latencies, 50) * 1000,
+            "p95_ms":   _percentile(latencies, 95) * 1000,
+            "p99_ms":   _percentile(latencies, 99) * 1000,
+            "max_ms":   latencies[-1] * 1000,
+            "avg_kb":   results.bytes[route] / len(latencies) / 1024,
+        }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000", help="the Flask app")
+    parser.add_argument("--clients", type=int, default=50, help="open dashboards")
+    parser.add_argument("--duration", type=float, default=120, help="seconds of load")
+    parser.add_argument("--ramp", type=float, default=SNAPSHOT_EVERY, help="seconds over which the clients open")
+    parser.add_argument("--connections", type=int, default=64, help="concurrent HTTP connections")
+    parser.add_argument("--replays-per-min", type=float, default=0.1)
+    parser.add_argument("--replay-watch", type=float, default=60, help="seconds a client stays in replay mode")
+    parser.add_argument("--analytics-per-min", type=float, default=0.2)
+    parser.add_argument("--flights-per-min", type=float, default=0.1)
+    parser.add_argument("--aircraft", type=lambda s: s.split(","), default=FLEET,
+                        help="icao24s to replay and filter by (comma-separated)")
+    parser.add_argument("--timeout", type=float, default=30, help="per request, seconds")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a non-local --url")
+    args = parser.parse_args()
+
+    host = urlsplit(args.url).hostname or ""
+    if host not in LOCAL_HOSTS and not args.allow_remote:
+        sys.exit(f"--url points at {host}; load tests go against a local app (or --allow-remote)")
+    random.seed(args.seed)
+
+    connections = Connections(args.url, args.timeout)
+    wait_ready(connections, args.timeout)
+    print(f"{args.clients} dashboards against {args.url} for {args.duration:g} s, "
+          f"{args.connections} connections", file=sys.stderr)
+    results, elapsed = run(args, connections)
+    rows = summary(results, elapsed)
+
+    width = max([len(route) for route in rows] + [5])
+    print(f"{'route':<{width}} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'avg KB':>8}")
+    for route, r in rows.items():
+        print(f"{route:<{width}} {r['requests']:>9} {sum(r['errors'].values()):>7} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} "
+              f"{r['avg_kb']:>8.1f}")
+    total = sum(r["requests"] for r in rows.values())
+    print(f"{'total':<{width}} {total:>9} {sum(sum(r['errors'].values()) for r in rows.values()):>7} "
+          f"{total / elapsed:>8.1f}")
+    for route, r in rows.items():
+        for status, n in sorted(r["errors"].items(), key=str):
+            print(f"{route}: {n} x {status}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"url": args.url, "clients": args.clients, "duration": elapsed,
+                       "connections": args.connections, "routes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
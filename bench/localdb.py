@@ -0,0 +1,27 @@
+"""
+Database connection for the bench scripts that write: DATABASE_URL (from the
+environment or .env) or --database-url, refused unless it is a local server.
+"""
+
+import os
+import sys
+
+LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+
+
+def add_arguments(parser):
+    parser.add_argument("--database-url")
+    parser.add_argument("--allow-remote", action="store_true", help="allow a non-local DATABASE_URL")
+
+
+def use_local_database(args, purpose):
+    """Point DATABASE_URL at the chosen database, exiting if it isn't local and --allow-remote wasn't given."""
+    from dotenv import load_dotenv
+    import psycopg2.extensions
+
+    load_dotenv()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    host = psycopg2.extensions.parse_dsn(os.getenv("DATABASE_URL") or "").get("host", "")
+    if not (host in LOCAL_HOSTS or host.startswith("/") or args.allow_remote):
+        sys.exit(f"DATABASE_URL points at {host}; {purpose}, use a local database (or --allow-remote)")
@@ -0,0 +1,278 @@
+"""
+A local stand-in for the OpenSky token and flights APIs, and a checked
+import_history run against it.
+
+  python bench/opensky_stub.py [--start 2001-01-01] [--days 6]
+                               [--database-url URL] [--allow-remote]
+  python bench/opensky_stub.py --serve 8765
+
+The stub answers POST /token with a fresh access token and GET /flights with
+a deterministic 0–2 flights per aircraft and day (404 when there are none, as
+OpenSky does). It also misbehaves on purpose: a token stops being accepted
+after a few uses (401), and every few flight requests is refused with a 429
+and X-Rate-Limit-Retry-After-Seconds.
+
+Without --serve the script imports the range into a local database in two
+runs sharing a fresh checkpoint. The first is interrupted (KeyboardInterrupt)
+partway through; the second resumes. Then it checks that every chunk is
+checkpointed, that no checkpointed chunk was fetched twice, that the events
+and the rollup hold exactly the stub's flights, and that the 401 and 429 paths
+were taken. Exits 1 if a check fails. The range must hold no events yet, so
+use a scratch database or a --start nobody has imported.
+
+With --serve it only runs the stub, for manual runs:
+
+  python import_history.py --api-url http://localhost:8765/flights --token-url http://localhost:8765/token
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from localdb import add_arguments, use_local_database
+
+TOKEN_USES       = 7    # flight requests a token is good for
+RATE_LIMIT_EVERY = 11   # every Nth flight request gets a 429
+RETRY_AFTER      = 1    # seconds, in the 429's header
+AIRPORTS         = ["SAEZ", "SABE", "SACO", "SAME", "SAZS", "SUMU"]
+
+
+def stub_flights(icao24, begin):
+    """The flights the stub reports for icao24 on the day starting at unix time `begin`."""
+    seed = zlib.crc32(f"{icao24}/{begin}".encode())
+    flights = []
+    for i in range(seed % 3):
+        first_seen = begin + 3600 * (6 + 6 * i) + seed % 1800
+        flights.append({
+            "icao24": icao24,
+            "callsign": f"STB{seed % 1000:03d} ",
+            "firstSeen": first_seen,
+            "lastSeen": first_seen + 3600 + seed % 3600,
+            "estDepartureAirport": AIRPORTS[(seed + i) % len(AIRPORTS)],
+            "estArrivalAirport": AIRPORTS[(seed + i + 1) % len(AIRPORTS)],
+        })
+    return flights
+
+
+class Stub(ThreadingHTTPServer):
+    """The server plus what it saw: tokens issued, responses by status, fetches per chunk."""
+
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, Handler)
+        self.lock     = threading.Lock()
+        self.tokens   = {}          # token -> uses left
+        self.issued   = 0
+        self.requests = 0
+        self.statuses = Counter()
+        self.fetched  = Counter()   # (icao24, begin) answered with 200/404
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None, headers=()):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if urlsplit(self.path).path != "/token":
+            return self.reply(404)
+        stub = self.server
+        with stub.lock:
+            stub.issued += 1
+            token = f"token-{stub.issued}"
+            stub.tokens[token] = TOKEN_USES
+        self.reply(200, {"access_token": token, "token_type": "Bearer", "expires_in": 1800})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path != "/flights":
+            return self.reply(404)
+        query  = parse_qs(url.query)
+        icao24 = query["icao24"][0]
+        begin  = int(query["begin"][0])
+        token  = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        stub   = self.server
+        with stub.lock:
+            stub.requests += 1
+            if stub.tokens.get(token, 0) <= 0:
+                status = 401
+            elif stub.requests % RATE_LIMIT_EVERY == 0:
+                status = 429
+            else:
+                stub.tokens[token] -= 1
+                flights = stub_flights(icao24, begin)
+                status  = 200 if flights else 404
+                stub.fetched[(icao24, begin)] += 1
+            stub.statuses[status] += 1
+        if status == 200:
+            self.reply(200, flights)
+        elif status == 429:
+            self.reply(429, headers=[("X-Rate-Limit-Retry-After-Seconds", str(RETRY_AFTER))])
+        else:
+            self.reply(status)
+
+
+def serve(port):
+    stub = Stub(("127.0.0.1", port))
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    return stub
+
+
+def _begin(day):
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+class InterruptingLoader:
+    """A BulkLoader that raises KeyboardInterrupt after `after` events, like a Ctrl-C mid-import."""
+
+    def __init__(self, loader, after):
+        self.loader = loader
+        self.after  = after
+
+    def add(self, *row):
+        if self.after <= 0:
+            raise KeyboardInterrupt
+        self.after -= 1
+        self.loader.add(*row)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+def _range_counts(conn, start, end):
+    """(events, rollup takeoffs + landings) in [start, end]."""
+    lo = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    hi = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1)
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM events WHERE ts >= %s AND ts < %s AND type IN ('TAKEOFF', 'LANDING')",
+                    (lo, hi))
+        events = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(SUM(takeoffs + landings), 0) FROM event_daily_rollup WHERE day BETWEEN %s AND %s",
+                    (start, end))
+        rollup = cur.fetchone()[0]
+    conn.commit()
+    return events, rollup
+
+
+def check(args):
+    use_local_database(args, "the check imports events")
+
+    import psycopg2
+    import import_history
+    from bulk_load import BulkLoader
+
+    stub   = serve(0)
+    base   = f"http://127.0.0.1:{stub.server_address[1]}"
+    start  = args.start
+    end    = start + timedelta(days=args.days - 1)
+    days   = [start + timedelta(days=i) for i in range(args.days)]
+    chunks = [(icao24, day) for icao24 in import_history.PLANES for day in days]
+    expected = sum(2 * len(stub_flights(icao24, _begin(day))) for icao24, day in chunks)
+
+    def client():
+        return import_history.OpenSkyClient(f"{base}/flights", f"{base}/token", "stub", "stub",
+                                            import_history.TokenBucket(50, 10))
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    with conn.cursor() as cur:
+        for icao24, tail in import_history.PLANES.items():
+            cur.execute("""
+                INSERT INTO aircraft (icao24, tail_number)
+                SELECT %s, %s WHERE NOT EXISTS (SELECT 1 FROM aircraft WHERE icao24 = %s)
+            """, (icao24, tail, icao24))
+    conn.commit()
+    if _range_counts(conn, start, end) != (0, 0):
+        sys.exit(f"{start} → {end} already has events; pick another --start or a scratch database")
+
+    failures = []
+
+    def expect(ok, what):
+        print(f"  {'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "checkpoint.json")
+
+        print(f"Run 1, interrupted after {expected // 3} events")
+        loader = InterruptingLoader(BulkLoader(conn), expected // 3)
+        try:
+            import_history.run_import(loader, client(), start, end, import_history.Checkpoint(path), 4)
+        except KeyboardInterrupt:
+            pass
+        else:
+            failures.append("run 1 was not interrupted")
+        first_done = set(import_history.Checkpoint(path).done)
+        events, rollup = _range_counts(conn, start, end)
+        expect(0 < len(first_done) < len(chunks), f"{len(first_done)}/{len(chunks)} chunks checkpointed")
+        expect(events == rollup, f"rollup matches the committed events ({rollup}/{events})")
+
+        print("Run 2, resumed")
+        fetched_before = Counter(stub.fetched)
+        loader = BulkLoader(conn)
+        failed = import_history.run_import(loader, client(), start, end, import_history.Checkpoint(path), 4)
+        loader.finish()
+        done = import_history.Checkpoint(path).done
+
+    refetched = [(icao24, day) for icao24, day in chunks
+                 if import_history.Checkpoint.key(icao24, day) in first_done
+                 and stub.fetched[(icao24, _begin(day))] > fetched_before[(icao24, _begin(day))]]
+    events, rollup = _range_counts(conn, start, end)
+    conn.close()
+
+    expect(not failed, f"no failed chunks ({len(failed)})")
+    expect(done == {import_history.Checkpoint.key(i, d) for i, d in chunks},
+           f"every chunk checkpointed ({len(done)}/{len(chunks)})")
+    expect(not refetched, f"no checkpointed chunk fetched again ({len(refetched)})")
+    expect(events == expected, f"events match the stub's flights ({events}/{expected})")
+    expect(rollup == expected, f"rollup matches ({rollup}/{expected})")
+    expect(stub.statuses[401] > 0 and stub.issued > 2,
+           f"expired tokens refreshed ({stub.statuses[401]} x 401, {stub.issued} tokens)")
+    expect(stub.statuses[429] > 0, f"429s backed off and retried ({stub.statuses[429]} x 429)")
+    stub.shutdown()
+    if failures:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--serve", type=int, metavar="PORT", help="only run the stub on this port")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2001, 1, 1))
+    parser.add_argument("--days", type=int, default=6)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.serve is None:
+        return check(args)
+    stub = serve(args.serve)
+    print(f"OpenSky stub on http://127.0.0.1:{args.serve} (/token, /flights); Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
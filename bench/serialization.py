@@ -0,0 +1,168 @@
+"""
+Serialization cost and bytes on the wire for a 24 h /replay/range response.
+
+  python bench/serialization.py [--step 60] [--end 2025-12-01T00:00:00Z] [--synthetic] [--repeat 5]
+
+Builds the payload with db.get_replay_range, from the database (DATABASE_URL,
+24 h ending at --end or at the latest position) or, with --synthetic, from
+generated rows for five aircraft flying three legs a day. It then compares:
+
+  jsonify   the old pipeline: timestamps formatted and meta parsed in Python,
+            then Flask's json.dumps (sort_keys, ensure_ascii)
+  jsonresp  jsonresp.dumps on the rows as they come back (orjson if installed)
+
+and the compressed size and CPU time of each Content-Encoding json_response
+can negotiate. CPU is process time, best of --repeat runs.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsonresp
+from db import get_replay_range
+
+SYNTHETIC_FLEET = ["e0659a", "e030cf", "e06546", "e0b341", "e0b058"]
+POSITION_EVERY  = 25   # seconds, the ingest cycle
+
+
+class _SyntheticConn:
+    """Answers get_replay_range's queries (fleet size, positions, events) with generated rows."""
+
+    def __init__(self, positions, events):
+        self.results = [[{"n": len(SYNTHETIC_FLEET)}], positions, events]
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.rows = self.results.pop(0)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+def synthetic_rows(start, end, seed=1):
+    rng = random.Random(seed)
+    positions, events = [], []
+    for aircraft_id, icao24 in enumerate(SYNTHETIC_FLEET, 1):
+        tail = f"LV-{icao24[-3:].upper()}"
+        t = start
+        while t < end:
+            t += timedelta(hours=rng.uniform(2, 6))
+            legs = int(rng.uniform(1.5, 3) * 3600 / POSITION_EVERY)
+            lat, lon = -34.56 + rng.uniform(-1, 1), -58.42 + rng.uniform(-1, 1)
+            for kind, ts in (("TAKEOFF", t), ("LANDING", t + timedelta(seconds=legs * POSITION_EVERY))):
+                meta = {"icao24": icao24, "altitude": rng.randint(300, 3000), "velocity": round(rng.uniform(150, 300), 1),
+                        "lat": lat, "lon": lon, "source": "OpenSky", "origin_airport": "AEP",
+                        "origin_name": "Aeroparque Jorge Newbery"}
+                events.append({"ts": ts, "type": kind, "meta": json.dumps(meta), "tail_number": tail, "icao24": icao24})
+            for i in range(legs):
+                positions.append({
+                    "ts": t + timedelta(seconds=i * POSITION_EVERY), "aircraft_id": aircraft_id,
+                    "lat": lat + i * 0.002, "lon": lon + i * 0.003, "altitude": 3500.0, "velocity": 420.5,
+                    "heading": 52.0, "on_ground": False, "source": "OpenSky", "tail_number": tail, "icao24": icao24,
+                })
+            t += timedelta(seconds=legs * POSITION_EVERY)
+    positions.sort(key=lambda r: (r["aircraft_id"], r["ts"]))
+    events.sort(key=lambda r: r["ts"])
+    return positions, events
+
+
+def _old_format(steps):
+    """What the steps looked like before jsonresp: strings for timestamps, dicts for meta
+    (parsed once per event, as psycopg2 did)."""
+    metas = {}
+
+    def event(e):
+        meta = e["meta"]
+        if not isinstance(meta, dict):   # orjson.Fragment
+            if id(meta) not in metas:
+                metas[id(meta)] = json.loads(jsonresp.dumps(meta))
+            meta = metas[id(meta)]
+        return {**e, "ts": e["ts"].isoformat(), "meta": meta}
+
+    def position(p):
+        return {**p, "ts": p["ts"].isoformat()}
+
+    return [
+        {**s, "ts": s["ts"].isoformat(),
+         "latest_positions": [position(p) for p in s["latest_positions"]],
+         "last_50_events": [event(e) for e in s["last_50_events"]]}
+        for s in steps
+    ]
+
+
+def _best(fn, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.process_time()
+        out = fn()
+        dt = time.process_time() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--step", type=int, default=60)
+    parser.add_argument("--end", type=lambda s: datetime.fromisoformat(s.replace("Z", "+00:00")))
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        end = args.end or datetime(2025, 12, 1, tzinfo=timezone.utc)
+        conn = _SyntheticConn(*synthetic_rows(end - timedelta(days=2), end))
+    else:
+        import psycopg2
+        import psycopg2.extras
+        from dotenv import load_dotenv
+        load_dotenv()
+        conn = psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=psycopg2.extras.RealDictCursor)
+        end = args.end
+        if end is None:
+            with conn.cursor() as cur:
+                cur.execute("SELECT max(ts) AS ts FROM positions")
+                end = cur.fetchone()["ts"]
+    start = end - timedelta(hours=24)
+    steps = get_replay_range(conn, start, end, args.step)
+    rows = sum(len(s["latest_positions"]) + len(s["last_50_events"]) for s in steps)
+    print(f"24 h replay {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M}, step {args.step}s: "
+          f"{len(steps)} steps, {rows} rows  (orjson: {jsonresp.orjson is not None}, "
+          f"Fragment: {hasattr(jsonresp.orjson, 'Fragment')}, brotli: {jsonresp.brotli is not None})\n")
+
+    old_cpu, old_body = _best(
+        lambda: json.dumps(_old_format(steps), sort_keys=True, separators=(",", ":")).encode(), args.repeat)
+    new_cpu, new_body = _best(lambda: jsonresp.dumps(steps), args.repeat)
+    print(f"{'encoder':<10} {'CPU ms':>9} {'bytes':>11}")
+    print(f"{'jsonify':<10} {old_cpu * 1000:>9.1f} {len(old_body):>11,}")
+    print(f"{'jsonresp':<10} {new_cpu * 1000:>9.1f} {len(new_body):>11,}   {old_cpu / new_cpu:.1f}x faster\n")
+
+    print(f"{'encoding':<10} {'CPU ms':>9} {'bytes':>11} {'ratio':>7}")
+    print(f"{'identity':<10} {0:>9.1f} {len(new_body):>11,} {1:>7.1f}")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and jsonresp.brotli is None:
+            print(f"{'br':<10} {'—':>9} {'—':>11}   (pip install brotli)")
+            continue
+        cpu, body = _best(lambda: jsonresp.encode_body(new_body, encoding), args.repeat)
+        print(f"{encoding:<10} {cpu * 1000:>9.1f} {len(body):>11,} {len(new_body) / len(body):>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Synthetic fleets for scale testing, bulk-loaded into a local Postgres.
+
+  python bench/synth_fleet.py [--aircraft 5000] [--years 2] [--first 0] [--end 2025-12-01T00:00:00Z]
+                              [--position-every 25] [--flights-per-day 0.6] [--seed 1]
+                              [--database-url URL] [--allow-remote]
+
+Aircraft number n (--first .. --first + --aircraft - 1) gets icao24 f00000 + n
+(a block ICAO leaves unallocated) and tail SY-AAAA, belongs to one of the
+"Synthetic operator" operators (OPERATOR_SIZE aircraft each), and every tenth
+one is on the "Synthetic sample" watchlist. Each aircraft is based at a
+random entry of airports.AIRPORTS and flies about --flights-per-day legs a
+day, to airports DEST_MIN_KM..DEST_MAX_KM away (half of the time back home),
+at jet speeds, over the --years before --end (default now). A flight still
+in the air at --end has its takeoff and positions but no landing.
+
+Flights are drawn in Python, the same ones for aircraft n whatever --first
+and --aircraft are, and COPYed into a staging table. Postgres expands them
+into events (TAKEOFF/LANDING with the meta ingest writes) and positions (one
+every --position-every seconds, interpolated between the airports with a
+climb/cruise/descent profile), CHUNK_AIRCRAFT aircraft per transaction, and
+the analytics rollup is rebuilt for the loaded days at the end. Aircraft
+that already have events are skipped, so a load can be resumed or extended.
+As a superuser the load runs with session_replication_role = replica, which
+skips the per-row foreign key checks (the ids come from the aircraft table
+it just read) and more than doubles the insert rate.
+"""
+
+import argparse
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from localdb import add_arguments, use_local_database
+
+ICAO24_BASE    = 0xF00000
+OPERATOR_SIZE  = 25
+WATCHLIST      = "Synthetic sample"
+DEST_MIN_KM    = 100
+DEST_MAX_KM    = 3000
+CRUISE_KMH     = (650, 850)
+CRUISE_M       = (7000, 12500)
+CHUNK_AIRCRAFT = 50
+
+_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS synth_airports (
+        i integer PRIMARY KEY, code text, name text, lat float8, lon float8
+    );
+    CREATE TEMP TABLE IF NOT EXISTS synth_aircraft (n integer, icao24 text, tail_number text, operator text);
+    CREATE TEMP TABLE IF NOT EXISTS synth_flights (
+        aircraft_id integer, takeoff float8, landing float8, origin integer, destination integer,
+        cruise_m float8, velocity float8, heading float8, detect_alt float8
+    );
+"""
+
+_INSERT_AIRCRAFT = """
+    INSERT INTO operators (name)
+    SELECT DISTINCT operator FROM synth_aircraft
+    ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO aircraft (icao24, tail_number, operator_id)
+    SELECT s.icao24, s.tail_number, o.id
+    FROM synth_aircraft s
+    JOIN operators o ON o.name = s.operator
+    WHERE NOT EXISTS (SELECT 1 FROM aircraft a WHERE a.icao24 = s.icao24);
+
+    INSERT INTO watchlists (name) VALUES (%(watchlist)s) ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO watchlist_aircraft (watchlist_id, aircraft_id)
+    SELECT w.id, a.id
+    FROM synth_aircraft s
+    JOIN aircraft a ON a.icao24 = s.icao24
+    JOIN watchlists w ON w.name = %(watchlist)s
+    WHERE s.n %% 10 = 0
+    ON CONFLICT DO NOTHING;
+"""
+
+_INSERT_EVENTS = """
+    INSERT INTO events (aircraft_id, ts, type, meta)
+    SELECT f.aircraft_id, to_timestamp(f.takeoff), 'TAKEOFF',
+           jsonb_build_object('icao24', a.icao24, 'altitude', f.detect_alt, 'velocity', f.velocity,
+                              'lat', o.lat, 'lon', o.lon, 'source', 'synthetic',
+                              'origin_airport', o.code, 'origin_name', o.name)
+    FROM synth_flights f
+    JOIN aircraft a       ON a.id = f.aircraft_id
+    JOIN synth_airports o ON o.i = f.origin
+    UNION ALL
+    SELECT f.aircraft_id, to_timestamp(f.landing), 'LANDING',
+           jsonb_build_object('destination_airport', d.code, 'destination_name', d.name)
+    FROM synth_flights f
+    JOIN synth_airports d ON d.i = f.destination
+    WHERE f.landing <= %(end)s
+    ON CONFLICT DO NOTHING
+"""
+
+# x runs 0 → 1 from takeoff to landing; climb and descent take 15% of the flight each.
+_INSERT_POSITIONS = """
+    INSERT INTO positions (aircraft_id, ts, lat, lon, altitude, velocity, heading, on_ground, source)
+    SELECT f.aircraft_id, to_timestamp(f.takeoff + k * %(step)s),
+           o.lat + (d.lat - o.lat) * p.x, o.lon + (d.lon - o.lon) * p.x,
+           round(least(f.cruise_m, f.cruise_m * p.x / 0.15, f.cruise_m * (1 - p.x) / 0.15)::numeric, 1),
+           f.velocity, f.heading, false, 'synthetic'
+    FROM synth_flights f
+    JOIN synth_airports o ON o.i = f.origin
+    JOIN synth_airports d ON d.i = f.destination
+    CROSS JOIN LATERAL generate_series(0, floor((least(f.landing, %(end)s) - f.takeoff) / %(step)s)::int) k
+    CROSS JOIN LATERAL (SELECT k * %(step)s / (f.landing - f.takeoff) AS x) p
+"""
+
+
+def icao24(n):
+    return f"{ICAO24_BASE + n:06x}"
+
+
+def tail_number(n):
+    letters = ""
+    for _ in range(4):
+        n, r = divmod(n, 26)
+        letters = chr(ord("A") + r) + letters
+    return f"SY-{letters}"
+
+
+def _bearing(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    y = math.sin(lon2 - lon1) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(lon2 - lon1)
+    return round(math.degrees(math.atan2(y, x)) % 360, 1)
+
+
+class Network:
+    """The airports of airports.AIRPORTS that have a destination in range, with their distances."""
+
+    def __init__(self):
+        import airports
+        from replay import haversine_np
+
+        table = airports.AIRPORTS
+        lat = np.frombuffer(table.lat, dtype=np.float64)
+        lon = np.frombuffer(table.lon, dtype=np.float64)
+        km  = haversine_np(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+        reach = (km >= DEST_MIN_KM) & (km <= DEST_MAX_KM)
+        self.airports = [table[i] for i in range(len(table))]
+        self.km       = km
+        self.bases    = [i for i in range(len(table)) if reach[i].any()]
+        self.reach    = [np.flatnonzero(reach[i]).tolist() for i in range(len(table))]
+
+    def copy_text(self):
+        return "".join(f"{i}\t{iata}\t{name}\t{lat}\t{lon}\n"
+                       for i, (_, iata, name, lat, lon) in enumerate(self.airports))
+
+
+def flights(network, n, start, end, per_day, seed):
+    """(takeoff, landing, origin, destination, cruise_m, km/h) for aircraft n, unix times, in order."""
+    rng  = random.Random(seed * 1_000_003 + n)
+    home = here = rng.choice(network.bases)
+    t = start + rng.uniform(0, 86400 / per_day)
+    while t < end:
+        if here != home and rng.random() < 0.5:
+            dest = home
+        else:
+            dest = rng.choice(network.reach[here])
+        kmh      = round(rng.uniform(*CRUISE_KMH), 1)
+        duration = network.km[here, dest] / kmh * 3600 + rng.uniform(900, 1800)   # plus climb and approach
+        yield t, t + duration, here, dest, round(rng.uniform(*CRUISE_M), -1), kmh
+        here = dest
+        t += duration + max(3600, rng.expovariate(per_day / 86400))
+
+
+def _copy(cur, table, text):
+    cur.copy_expert(f"COPY {table} FROM STDIN", io.StringIO(text))
+
+
+def load(conn, first, count, start, end, step=25, per_day=0.6, seed=1, progress=print):
+    """Load aircraft first .. first + count - 1 with their flights between start and end (datetimes).
+    Returns (aircraft, flights, events, positions) added."""
+    import rollup
+
+    network = Network()
+    start_t, end_t = start.timestamp(), end.timestamp()
+    totals = [0, 0, 0, 0]
+    with conn.cursor() as cur:
+        cur.execute("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")
+        skip_fk_checks = cur.fetchone()["rolsuper"]
+        cur.execute(_STAGING)
+        cur.execute("TRUNCATE synth_airports")
+        _copy(cur, "synth_airports", network.copy_text())
+
+        t0 = time.monotonic()
+        for chunk in range(first, first + count, CHUNK_AIRCRAFT):
+            ns = range(chunk, min(chunk + CHUNK_AIRCRAFT, first + count))
+            cur.execute("TRUNCATE synth_aircraft, synth_flights")
+            _copy(cur, "synth_aircraft", "".join(
+                f"{n}\t{icao24(n)}\t{tail_number(n)}\tSynthetic operator {n // OPERATOR_SIZE + 1:04d}\n" for n in ns))
+            cur.execute(_INSERT_AIRCRAFT, {"watchlist": WATCHLIST})
+            cur.execute("""
+                SELECT s.n, a.id, EXISTS (SELECT 1 FROM events e WHERE e.aircraft_id = a.id) AS loaded
+                FROM synth_aircraft s JOIN aircraft a ON a.icao24 = s.icao24
+            """)
+            todo = [(r["n"], r["id"]) for r in cur.fetchall() if not r["loaded"]]
+
+            rows = []
+            for n, aircraft_id in todo:
+                for takeoff, landing, o, d, cruise_m, kmh in flights(network, n, start_t, end_t, per_day, seed):
+                    _, _, _, olat, olon = network.airports[o]
+                    _, _, _, dlat, dlon = network.airports[d]
+                    rows.append(f"{aircraft_id}\t{takeoff}\t{landing}\t{o}\t{d}\t{cruise_m}\t{kmh}\t"
+                                f"{_bearing(olat, olon, dlat, dlon)}\t{round(cruise_m * 0.1, -1)}\n")
+            _copy(cur, "synth_flights", "".join(rows))
+            params = {"end": end_t, "step": float(step)}
+            if skip_fk_checks:
+                cur.execute("SET LOCAL session_replication_role = replica")
+            cur.execute(_INSERT_EVENTS, params)
+            events = cur.rowcount
+            cur.execute(_INSERT_POSITIONS, params)
+            positions = cur.rowcount
+            conn.commit()
+
+            for i, added in enumerate((len(todo), len(rows), events, positions)):
+                totals[i] += added
+            done = ns.stop - first
+            progress(f"  {done}/{count} aircraft, {totals[1]:,} flights, {totals[2]:,} events, "
+                     f"{totals[3]:,} positions ({time.monotonic() - t0:.0f}s)")
+
+        if totals[2]:
+            rollup.rebuild(conn, rollup.utc_day(start), rollup.utc_day(end))
+            conn.commit()
+    return tuple(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--aircraft", type=int, default=5000)
+    parser.add_argument("--first", type=int, default=0, help="number of the first aircraft")
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--end", type=lambda s: datetime.fromisoformat(s.replace("Z", "+00:00")))
+    parser.add_argument("--position-every", type=int, default=25, help="seconds between positions")
+    parser.add_argument("--flights-per-day", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=1)
+    add_arguments(parser)
+    args = parser.parse_args()
+    use_local_database(args, "this loads millions of synthetic rows")
+
+    from db import get_db
+
+    end   = args.end or datetime.now(timezone.utc)
+    start = end - timedelta(days=365.25 * args.years)
+    print(f"Loading aircraft {args.first}..{args.first + args.aircraft - 1}, "
+          f"{start:%Y-%m-%d} → {end:%Y-%m-%d %H:%M}, a position every {args.position_every}s")
+    t0 = time.monotonic()
+    with get_db() as conn:
+        aircraft, n_flights, events, positions = load(
+            conn, args.first, args.aircraft, start, end, args.position_every, args.flights_per_day, args.seed)
+    elapsed = time.monotonic() - t0
+    print(f"Added {aircraft} aircraft, {n_flights:,} flights, {events:,} events, {positions:,} positions "
+          f"in {elapsed:.0f}s ({positions / elapsed if elapsed else 0:,.0f} positions/s)")
+
+
+if __name__ == "__main__":
+    main()
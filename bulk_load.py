@@ -0,0 +1,99 @@
+"""
+Bulk loading of events, shared by the importers.
+
+Rows are buffered in COPY text format and flushed in batches: COPY into a
+temporary staging table, then one INSERT … SELECT into events with
+ON CONFLICT DO NOTHING on the natural key (aircraft, type, UTC minute) from
+migrations/003_events_dedup_key.sql. Loading the same data twice inserts
+nothing the second time. Aircraft ids are resolved once per loader. Each
+flush rebuilds the rollup for the days in its batch in the same transaction,
+so an interrupted load never leaves committed events out of the rollup, and
+a rerun that inserts nothing still repairs the days it covers.
+
+    with psycopg2.connect(url) as conn:
+        loader = BulkLoader(conn)
+        for ...:
+            loader.add(icao24, ts, "TAKEOFF", meta)
+        loader.finish()
+"""
+
+import io
+import json
+
+from rollup import rebuild, utc_day
+
+BATCH_SIZE = 50_000
+
+# Must match the columns of the events_dedup_key index.
+DEDUP_KEY = "aircraft_id, type, date_trunc('minute', ts AT TIME ZONE 'UTC')"
+
+
+def _copy_text(value):
+    """A value in COPY text format."""
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class BulkLoader:
+    """Buffers events and merges them into the events table in batches.
+    Every flush commits, so a long load never holds one huge transaction,
+    and rebuilds the rollup for batch_days, the days of the rows it merged."""
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn       = conn
+        self.batch_size = batch_size
+        self.buf        = io.StringIO()
+        self.buffered   = 0
+        self.inserted   = 0
+        self.unknown    = 0
+        self.batch_days = None   # (first, last) UTC day of the buffered rows
+        with conn.cursor() as cur:
+            cur.execute("SELECT icao24, id FROM aircraft")
+            self.aircraft = dict(cur.fetchall())
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS events_staging (
+                    aircraft_id integer, ts timestamptz, type text, meta jsonb
+                )
+            """)
+
+    def add(self, icao24, ts, event_type, meta=None):
+        """Queue one event. Events for aircraft not in the table are counted and dropped."""
+        aircraft_id = self.aircraft.get(icao24)
+        if aircraft_id is None:
+            self.unknown += 1
+            return
+        self.buf.write(f"{aircraft_id}\t{ts.isoformat()}\t{event_type}\t{_copy_text(json.dumps(meta or {}))}\n")
+        self.buffered += 1
+        day = utc_day(ts)
+        first, last = self.batch_days or (day, day)
+        self.batch_days = (min(first, day), max(last, day))
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Merge the buffered rows, rebuild the rollup for their days and commit.
+        Returns the number of new events."""
+        if not self.buffered:
+            return 0
+        self.buf.seek(0)
+        with self.conn.cursor() as cur:
+            cur.copy_expert("COPY events_staging (aircraft_id, ts, type, meta) FROM STDIN", self.buf)
+            # Duplicates inside the batch hit the conflict check too: the first one wins.
+            cur.execute(f"""
+                INSERT INTO events (aircraft_id, ts, type, meta)
+                SELECT aircraft_id, ts, type, meta FROM events_staging
+                ON CONFLICT ({DEDUP_KEY}) DO NOTHING
+            """)
+            inserted = cur.rowcount
+            cur.execute("TRUNCATE events_staging")
+        rebuild(self.conn, *self.batch_days)
+        self.conn.commit()
+        self.inserted += inserted
+        self.buf = io.StringIO()
+        self.buffered = 0
+        self.batch_days = None
+        return inserted
+
+    def finish(self):
+        """Flush what is left. Returns the number of new events."""
+        self.flush()
+        return self.inserted
@@ -0,0 +1,73 @@
+"""
+Keeps a web process's in-memory analytics and forecast caches in step with
+events written by other processes.
+
+Ingest runs in its own worker (ingest_worker.py), so the hooks it calls after
+writing an event (analytics.invalidate, forecast.record_takeoff) only reach
+its own process. CacheSync.poll reads the events committed since its last
+poll, by id, and replays those hooks here. It runs on live.Follower's thread
+and connection, so each web process adds two cheap indexed queries per
+FOLLOW_SECONDS, whatever the traffic.
+
+Events are followed in id order, which is commit order for the single ingest
+leader. A poll that finds more than MAX_EVENTS new rows (a bulk import) skips
+to the newest and drops the caches wholesale instead of replaying them.
+Imports and backfills that recompute past days bump rollup_version
+(rollup.rebuild); a change there drops every cached analytics segment too.
+"""
+
+import analytics
+import forecast
+
+MAX_EVENTS = 1000
+
+_NEW_EVENTS_SQL = """
+    SELECT id, ts, aircraft_id, type FROM events
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+
+class CacheSync:
+    """Replays other processes' event writes into this process's caches."""
+
+    def __init__(self):
+        self.last_id = None
+        self.version = None
+
+    def _reset(self, cur):
+        cur.execute("SELECT COALESCE(MAX(id), 0) AS id FROM events")
+        self.last_id = cur.fetchone()["id"]
+        analytics.invalidate_all()
+        forecast.resync()
+
+    def _rollup_rebuilt(self, cur):
+        cur.execute("SELECT version FROM rollup_version")
+        row = cur.fetchone()
+        version = row["version"] if row else None
+        changed = self.version is not None and version != self.version
+        self.version = version
+        return changed
+
+    def poll(self, conn):
+        """Apply the events committed since the last poll. Returns how many were applied."""
+        with conn.cursor() as cur:
+            if self._rollup_rebuilt(cur):
+                analytics.invalidate_all()
+            if self.last_id is None:
+                # Whatever was cached before this point may predate events we'll never see.
+                self._reset(cur)
+                return 0
+            cur.execute(_NEW_EVENTS_SQL, (self.last_id, MAX_EVENTS + 1))
+            rows = cur.fetchall()
+            if len(rows) > MAX_EVENTS:
+                self._reset(cur)
+                return 0
+        for r in rows:
+            if r["type"] in ("TAKEOFF", "LANDING"):
+                analytics.invalidate(r["ts"])
+            if r["type"] == "TAKEOFF":
+                forecast.record_takeoff(r["ts"], r["aircraft_id"])
+            self.last_id = r["id"]
+        return len(rows)
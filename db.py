@@ -1,6 +1,46 @@
-import json
+import os
 from datetime import timedelta
 
+import psycopg2
+import psycopg2.extras
+
+from jsonresp import loads, raw_json
+
+# Rows are serialized by jsonresp.json_response, which writes datetimes as
+# isoformat() itself; meta is selected as text and embedded with raw_json().
+# Any json/jsonb that is parsed uses the fast loads.
+psycopg2.extras.register_default_json(globally=True, loads=loads)
+psycopg2.extras.register_default_jsonb(globally=True, loads=loads)
+
+
+def get_db():
+    return psycopg2.connect(os.getenv("DATABASE_URL"), cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+class LazyConnection:
+    """Stands in for a connection and only opens one on the first cursor() call,
+    so handlers that can answer from a cache never touch the database."""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._conn = None
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn.cursor(*args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None:
+            try:
+                self._conn.__exit__(exc_type, exc, tb)
+            finally:
+                self._conn.close()
+        return False
+
 
 def get_snapshot(conn):
     with conn.cursor() as cur:
@@ -20,7 +60,7 @@ def get_snapshot(conn):
             {
                 "tail_number": r["tail_number"],
                 "icao24": r["icao24"],
-                "ts": r["ts"].isoformat() if r["ts"] else None,
+                "ts": r["ts"],
                 "lat": r["lat"],
                 "lon": r["lon"],
                 "altitude": r["altitude"],
@@ -42,11 +82,12 @@ def get_snapshot(conn):
                  FROM events
                  WHERE ts > NOW() - INTERVAL '1 hour') AS events_last_hour,
                 (SELECT EXTRACT(EPOCH FROM (NOW() - MAX(ts)))::int
-                 FROM positions) AS freshness_seconds
+                 FROM positions) AS freshness_seconds,
+                (SELECT COUNT(*) FROM aircraft) AS total_fleet
         """)
         row = cur.fetchone()
         seen_last_15m = int(row["seen_last_15m"] or 0)
-        total_fleet = 5
+        total_fleet = int(row["total_fleet"])
 
         fleet_kpis = {
             "in_air": seen_last_15m,
@@ -58,7 +99,7 @@ def get_snapshot(conn):
 
         # Last 50 events
         cur.execute("""
-            SELECT e.ts, e.type, e.meta, a.tail_number, a.icao24
+            SELECT e.ts, e.type, e.meta::text AS meta, a.tail_number, a.icao24
             FROM events e
             JOIN aircraft a ON a.id = e.aircraft_id
             ORDER BY e.ts DESC
@@ -66,11 +107,11 @@ def get_snapshot(conn):
         """)
         last_50_events = [
             {
-                "ts": r["ts"].isoformat(),
+                "ts": r["ts"],
                 "type": r["type"],
                 "tail_number": r["tail_number"],
                 "icao24": r["icao24"],
-                "meta": r["meta"] if isinstance(r["meta"], dict) else json.loads(r["meta"] or "{}"),
+                "meta": raw_json(r["meta"]),
             }
             for r in cur.fetchall()
         ]
@@ -83,16 +124,16 @@ def get_snapshot(conn):
     }
 
 
-def has_recent_event(conn, aircraft_id, event_type):
-    """True if same event type was recorded for this aircraft within the last 2 minutes."""
+def has_recent_event(conn, aircraft_id, event_type, now=None):
+    """True if same event type was recorded for this aircraft within the 2 minutes before now (default NOW())."""
     with conn.cursor() as cur:
         cur.execute("""
             SELECT 1 FROM events
             WHERE aircraft_id = %s
               AND type = %s
-              AND ts > NOW() - INTERVAL '2 minutes'
+              AND ts > COALESCE(%s::timestamptz, NOW()) - INTERVAL '2 minutes'
             LIMIT 1
-        """, (aircraft_id, event_type))
+        """, (aircraft_id, event_type, now))
         return cur.fetchone() is not None
 
 
@@ -112,7 +153,7 @@ def get_snapshot_at(conn, ts):
             {
                 "tail_number": r["tail_number"],
                 "icao24": r["icao24"],
-                "ts": r["ts"].isoformat(),
+                "ts": r["ts"],
                 "lat": r["lat"],
                 "lon": r["lon"],
                 "altitude": r["altitude"],
@@ -128,12 +169,13 @@ def get_snapshot_at(conn, ts):
                 (SELECT COUNT(DISTINCT aircraft_id) FROM positions
                  WHERE ts > %s - INTERVAL '15 minutes' AND ts <= %s) AS seen_last_15m,
                 (SELECT COUNT(*) FROM events
-                 WHERE ts > %s - INTERVAL '1 hour' AND ts <= %s) AS events_last_hour
+                 WHERE ts > %s - INTERVAL '1 hour' AND ts <= %s) AS events_last_hour,
+                (SELECT COUNT(*) FROM aircraft) AS total_fleet
         """, (ts, ts, ts, ts))
         row = cur.fetchone()
         seen_last_15m = int(row["seen_last_15m"] or 0)
         cur.execute("""
-            SELECT e.ts, e.type, e.meta, a.tail_number, a.icao24
+            SELECT e.ts, e.type, e.meta::text AS meta, a.tail_number, a.icao24
             FROM events e
             JOIN aircraft a ON a.id = e.aircraft_id
             WHERE e.ts <= %s
@@ -142,18 +184,18 @@ def get_snapshot_at(conn, ts):
         """, (ts,))
         last_events = [
             {
-                "ts": r["ts"].isoformat(),
+                "ts": r["ts"],
                 "type": r["type"],
                 "tail_number": r["tail_number"],
                 "icao24": r["icao24"],
-                "meta": r["meta"] if isinstance(r["meta"], dict) else json.loads(r["meta"] or "{}"),
+                "meta": raw_json(r["meta"]),
             }
             for r in cur.fetchall()
         ]
     return {
         "fleet_kpis": {
             "in_air": seen_last_15m,
-            "on_ground": 5 - seen_last_15m,
+            "on_ground": int(row["total_fleet"]) - seen_last_15m,
             "seen_last_15m": seen_last_15m,
             "events_last_hour": int(row["events_last_hour"] or 0),
         },
@@ -170,6 +212,10 @@ def get_replay_range(conn, start_dt, end_dt, step_seconds, aircraft_icao24=None)
     evt_params   = [buffer_start, end_dt] + ([aircraft_icao24] if aircraft_icao24 else [])
 
     with conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) AS n FROM aircraft a WHERE true{icao_filter}",
+                    [aircraft_icao24] if aircraft_icao24 else [])
+        total_fleet = cur.fetchone()["n"]
+
         cur.execute(f"""
             SELECT p.ts, p.aircraft_id, p.lat, p.lon, p.altitude, p.velocity,
                    p.heading, p.on_ground, p.source, a.tail_number, a.icao24
@@ -181,7 +227,7 @@ def get_replay_range(conn, start_dt, end_dt, step_seconds, aircraft_icao24=None)
         all_positions = cur.fetchall()
 
         cur.execute(f"""
-            SELECT e.ts, e.type, e.meta, a.tail_number, a.icao24
+            SELECT e.ts, e.type, e.meta::text AS meta, a.tail_number, a.icao24
             FROM events e
             JOIN aircraft a ON a.id = e.aircraft_id
             WHERE e.ts >= %s AND e.ts <= %s{icao_filter}
@@ -189,53 +235,57 @@ def get_replay_range(conn, start_dt, end_dt, step_seconds, aircraft_icao24=None)
         """, evt_params)
         all_events = cur.fetchall()
 
+    # Each row becomes a dict once; steps share them.
+    event_dicts = [
+        {
+            "ts": e["ts"],
+            "type": e["type"],
+            "tail_number": e["tail_number"],
+            "icao24": e["icao24"],
+            "meta": raw_json(e["meta"]),
+        }
+        for e in all_events
+    ]
+    position_dicts = [
+        {
+            "tail_number": r["tail_number"],
+            "icao24": r["icao24"],
+            "ts": r["ts"],
+            "lat": r["lat"],
+            "lon": r["lon"],
+            "altitude": r["altitude"],
+            "velocity": r["velocity"],
+            "heading": r["heading"],
+            "on_ground": r["on_ground"],
+            "source": r["source"],
+        }
+        for r in all_positions
+    ]
+
     steps = []
     current = start_dt
     while current <= end_dt:
         seen = {}
-        for row in all_positions:
+        for row, d in zip(all_positions, position_dicts):
             if row["ts"] <= current:
-                seen[row["aircraft_id"]] = row
+                seen[row["aircraft_id"]] = d
 
         cutoff_15m = current - timedelta(minutes=15)
         cutoff_1h  = current - timedelta(hours=1)
         seen_15m   = len({r["aircraft_id"] for r in all_positions if cutoff_15m <= r["ts"] <= current})
         events_1h  = sum(1 for e in all_events if cutoff_1h <= e["ts"] <= current)
 
-        events_at = [
-            {
-                "ts": e["ts"].isoformat(),
-                "type": e["type"],
-                "tail_number": e["tail_number"],
-                "icao24": e["icao24"],
-                "meta": e["meta"] if isinstance(e["meta"], dict) else json.loads(e["meta"] or "{}"),
-            }
-            for e in all_events if e["ts"] <= current
-        ][-20:]
+        events_at = [d for e, d in zip(all_events, event_dicts) if e["ts"] <= current][-20:]
 
         steps.append({
-            "ts": current.isoformat(),
+            "ts": current,
             "fleet_kpis": {
                 "in_air": seen_15m,
-                "on_ground": 5 - seen_15m,
+                "on_ground": total_fleet - seen_15m,
                 "seen_last_15m": seen_15m,
                 "events_last_hour": events_1h,
             },
-            "latest_positions": [
-                {
-                    "tail_number": r["tail_number"],
-                    "icao24": r["icao24"],
-                    "ts": r["ts"].isoformat(),
-                    "lat": r["lat"],
-                    "lon": r["lon"],
-                    "altitude": r["altitude"],
-                    "velocity": r["velocity"],
-                    "heading": r["heading"],
-                    "on_ground": r["on_ground"],
-                    "source": r["source"],
-                }
-                for r in seen.values()
-            ],
+            "latest_positions": list(seen.values()),
             "last_50_events": list(reversed(events_at)),
         })
         current += timedelta(seconds=step_seconds)
@@ -287,8 +337,8 @@ def get_flight_board(conn, limit=40, icao24=None):
         flights.append({
             "tail_number":      r["tail_number"],
             "icao24":           r["icao24"],
-            "takeoff_ts":       r["takeoff_ts"].isoformat(),
-            "landing_ts":       r["landing_ts"].isoformat() if r["landing_ts"] else None,
+            "takeoff_ts":       r["takeoff_ts"],
+            "landing_ts":       r["landing_ts"],
             "origin":           r["origin"],
             "origin_name":      r["origin_name"],
             "destination":      r["destination"],
@@ -300,14 +350,17 @@ def get_flight_board(conn, limit=40, icao24=None):
     return {"flights": flights}
 
 
-def get_last_seen_from_db(conn):
-    """Returns {tail_number: unix_timestamp} of the latest position per aircraft."""
+def get_latest_positions(conn):
+    """[{tail_number, ts, on_ground}] of the latest position per aircraft, one
+    index probe per aircraft instead of a DISTINCT ON over every position."""
     with conn.cursor() as cur:
         cur.execute("""
-            SELECT DISTINCT ON (p.aircraft_id)
-                a.tail_number, p.ts
-            FROM positions p
-            JOIN aircraft a ON a.id = p.aircraft_id
-            ORDER BY p.aircraft_id, p.ts DESC
+            SELECT a.tail_number, p.ts, p.on_ground
+            FROM aircraft a
+            JOIN LATERAL (
+                SELECT ts, on_ground FROM positions
+                WHERE aircraft_id = a.id
+                ORDER BY ts DESC LIMIT 1
+            ) p ON true
         """)
-        return {r["tail_number"]: r["ts"].timestamp() for r in cur.fetchall()}
+        return cur.fetchall()
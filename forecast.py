@@ -1,60 +1,177 @@
 import math
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta, timezone
 
+import numpy as np
+
 ARGENTINA_TZ = timezone(timedelta(hours=-3))
 
+WINDOW       = timedelta(days=30)
+RECENT       = timedelta(days=7)
+MAX_HORIZON_HOURS = 168
+# Reload from the DB now and then, as a backstop: takeoffs written by other
+# processes arrive through record_takeoff (cache_sync.CacheSync in web processes).
+RESYNC_SECONDS = 600
 
-def get_forecast(conn):
-    with conn.cursor() as cur:
-
-        # Hourly takeoff counts by hour-of-week (0..167) over last 30 days.
-        # DOW: Sun=0, Mon=1..Sat=6 — matches Python isoweekday() % 7.
-        cur.execute("""
-            SELECT
-                EXTRACT(DOW FROM ts AT TIME ZONE 'America/Argentina/Buenos_Aires')::int * 24
-                + EXTRACT(HOUR FROM ts AT TIME ZONE 'America/Argentina/Buenos_Aires')::int AS how,
-                COUNT(*) AS cnt
-            FROM events
-            WHERE type = 'TAKEOFF'
-              AND ts > NOW() - INTERVAL '30 days'
-            GROUP BY how
-        """)
-        raw_counts = {int(r["how"]): int(r["cnt"]) for r in cur.fetchall()}
-
-        # Recency factor — single query, two filtered aggregates.
-        cur.execute("""
-            SELECT
-                COUNT(*) FILTER (WHERE ts > NOW() - INTERVAL '7 days')  AS last_7,
-                COUNT(*) FILTER (WHERE ts > NOW() - INTERVAL '30 days') AS last_30
-            FROM events
-            WHERE type = 'TAKEOFF'
-        """)
-        row = cur.fetchone()
-        last_7  = int(row["last_7"]  or 0)
-        last_30 = int(row["last_30"] or 0)
-
-    recency_factor = (
-        max(0.5, min(1.5, last_7 / last_30)) if last_30 > 0 else 1.0
-    )
-
-    # Normalize raw counts to per-occurrence rate.
+
+def _hour_of_week(ts):
+    # Sun=0, Mon=1..Sat=6 — matches Postgres EXTRACT(DOW) in Argentina time.
+    local = ts.astimezone(ARGENTINA_TZ)
+    return (local.isoweekday() % 7) * 24 + local.hour
+
+
+def forecast_matrix(counts, last_7, last_30, start_how, hours):
+    """Expected takeoffs per hour for every row of an hour-of-week count matrix.
+
+    counts: (rows, 168) takeoffs per hour-of-week over the 30-day window.
+    last_7, last_30: (rows,) takeoffs in the last 7 / 30 days.
+    Returns a (rows, hours) array for the hours starting at hour-of-week start_how."""
     # Each hour-of-week slot appears ~30/7 times in a 30-day window.
-    weeks_in_window = 30.0 / 7.0
-    hourly_rates = {how: cnt / weeks_in_window for how, cnt in raw_counts.items()}
+    rates  = counts / (30.0 / 7.0)
+    factor = np.where(last_30 > 0, np.clip(last_7 / np.maximum(last_30, 1), 0.5, 1.5), 1.0)
+    slots  = (start_how + np.arange(hours)) % 168
+    return rates[:, slots] * factor[:, None]
+
+
+def confidence_interval(expected_total):
+    margin = 1.96 * np.sqrt(expected_total)
+    return np.maximum(0.0, expected_total - margin), expected_total + margin
+
+
+class TakeoffWindow:
+    """Sliding 30-day window of TAKEOFF timestamps.
+
+    Keeps a per-aircraft (rows, 168) hour-of-week count matrix and the 7/30-day
+    counts up to date as takeoffs are added and as old ones fall out of the
+    window, so a forecast needs no query once the window has been loaded.
+    A takeoff is counted once per (aircraft, ts), however many times it's added."""
+
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.aircraft  = []         # [(aircraft_id, tail_number, icao24)] in row order
+        self.rows      = {}         # aircraft_id -> row
+        self.counts    = np.zeros((0, 168), dtype=np.int64)
+        self.last_7    = np.zeros(0, dtype=np.int64)
+        self.last_30   = np.zeros(0, dtype=np.int64)
+        self.window    = deque()    # (ts, hour_of_week, row), oldest first, within WINDOW
+        self.recent    = deque()    # (ts, row) within RECENT
+        self.keys      = set()      # (aircraft_id, ts) of the takeoffs in window
+        self.loaded_at = None       # time.monotonic() of the last DB load
+
+    def load(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, tail_number, icao24 FROM aircraft ORDER BY id")
+            aircraft = [(r["id"], r["tail_number"], r["icao24"]) for r in cur.fetchall()]
+            cur.execute("""
+                SELECT ts, aircraft_id FROM events
+                WHERE type = 'TAKEOFF'
+                  AND ts > NOW() - INTERVAL '30 days'
+                ORDER BY ts
+            """)
+            takeoffs = cur.fetchall()
+        with self.lock:
+            self.aircraft = aircraft
+            self.rows     = {aid: i for i, (aid, _, _) in enumerate(aircraft)}
+            self.counts   = np.zeros((len(aircraft), 168), dtype=np.int64)
+            self.last_7   = np.zeros(len(aircraft), dtype=np.int64)
+            self.last_30  = np.zeros(len(aircraft), dtype=np.int64)
+            self.window.clear()
+            self.recent.clear()
+            self.keys.clear()
+            for r in takeoffs:
+                self._append(r["ts"], r["aircraft_id"])
+            self.loaded_at = time.monotonic()
+
+    def stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > RESYNC_SECONDS
+
+    def add(self, ts, aircraft_id):
+        with self.lock:
+            if self.loaded_at is not None:
+                self._append(ts, aircraft_id)
+
+    def _row(self, aircraft_id):
+        row = self.rows.get(aircraft_id)
+        if row is None:
+            # Aircraft added after the last load: give it a row, label it on the next resync.
+            row = self.rows[aircraft_id] = len(self.aircraft)
+            self.aircraft.append((aircraft_id, None, None))
+            self.counts  = np.vstack([self.counts, np.zeros((1, 168), dtype=np.int64)])
+            self.last_7  = np.append(self.last_7, 0)
+            self.last_30 = np.append(self.last_30, 0)
+            self.loaded_at = None
+        return row
+
+    def _append(self, ts, aircraft_id):
+        if (aircraft_id, ts) in self.keys:
+            return
+        self.keys.add((aircraft_id, ts))
+        entry = (ts, _hour_of_week(ts), self._row(aircraft_id))
+        if self.window and ts < self.window[-1][0]:
+            # Out-of-order write: keep the deques sorted.
+            self.window.insert(sum(1 for t, _, _ in self.window if t <= ts), entry)
+            self.recent.insert(sum(1 for t, _ in self.recent if t <= ts), (ts, entry[2]))
+        else:
+            self.window.append(entry)
+            self.recent.append((ts, entry[2]))
+        self.counts[entry[2], entry[1]] += 1
+        self.last_30[entry[2]] += 1
+        self.last_7[entry[2]]  += 1
+
+    def slide(self, now):
+        """Drop takeoffs that have left the 30-day / 7-day windows."""
+        while self.window and self.window[0][0] <= now - WINDOW:
+            ts, how, row = self.window.popleft()
+            self.keys.discard((self.aircraft[row][0], ts))
+            self.counts[row, how] -= 1
+            self.last_30[row]     -= 1
+        while self.recent and self.recent[0][0] <= now - RECENT:
+            _, row = self.recent.popleft()
+            self.last_7[row] -= 1
+
+
+_takeoffs = TakeoffWindow()
+
+
+def record_takeoff(ts, aircraft_id):
+    """Feed a freshly written TAKEOFF into the in-memory model."""
+    _takeoffs.add(ts, aircraft_id)
+
+
+def resync():
+    """Reload the model from the database on the next forecast."""
+    with _takeoffs.lock:
+        _takeoffs.loaded_at = None
+
+
+def _run(conn, hours):
+    """Fleet row + one row per aircraft, computed in a single vectorized pass."""
+    if _takeoffs.stale():
+        _takeoffs.load(conn)
 
-    # Build next 24h series starting from current hour (Argentina time).
     now = datetime.now(ARGENTINA_TZ)
+    with _takeoffs.lock:
+        _takeoffs.slide(now)
+        counts   = np.vstack([_takeoffs.counts.sum(axis=0), _takeoffs.counts])
+        last_7   = np.concatenate([[_takeoffs.last_7.sum()],  _takeoffs.last_7])
+        last_30  = np.concatenate([[_takeoffs.last_30.sum()], _takeoffs.last_30])
+        aircraft = list(_takeoffs.aircraft)
+
     current_hour = now.replace(minute=0, second=0, microsecond=0)
+    expected     = forecast_matrix(counts, last_7, last_30, _hour_of_week(current_hour), hours)
+    return current_hour, expected, aircraft
+
 
-    hourly_series = []
-    for i in range(24):
-        slot = current_hour + timedelta(hours=i)
-        how = (slot.isoweekday() % 7) * 24 + slot.hour
-        expected = hourly_rates.get(how, 0.0) * recency_factor
-        hourly_series.append({
-            "ts_hour_start": slot.isoformat(),
-            "expected": round(expected, 4),
-        })
+def _fleet_forecast(current_hour, series):
+    hourly_series = [
+        {
+            "ts_hour_start": (current_hour + timedelta(hours=i)).isoformat(),
+            "expected": round(float(x), 4),
+        }
+        for i, x in enumerate(series)
+    ]
 
     expected_total = sum(h["expected"] for h in hourly_series)
     margin = 1.96 * math.sqrt(expected_total) if expected_total > 0 else 0.0
@@ -65,3 +182,32 @@ def get_forecast(conn):
         "ci_high":        round(expected_total + margin, 4),
         "hourly_series":  hourly_series,
     }
+
+
+def get_forecast(conn):
+    current_hour, expected, _ = _run(conn, 24)
+    return _fleet_forecast(current_hour, expected[0])
+
+
+def get_forecast_horizon(conn, hours=24, per_aircraft=False):
+    """Fleet forecast for the next `hours` (1..168), optionally with one series per aircraft."""
+    hours = max(1, min(int(hours), MAX_HORIZON_HOURS))
+    current_hour, expected, aircraft = _run(conn, hours)
+    result = {"horizon_hours": hours, "fleet": _fleet_forecast(current_hour, expected[0])}
+
+    if per_aircraft:
+        per_hour = np.round(expected[1:], 4)
+        totals   = per_hour.sum(axis=1)
+        ci_low, ci_high = confidence_interval(totals)
+        result["aircraft"] = [
+            {
+                "tail_number":    tail,
+                "icao24":         icao24,
+                "expected_total": round(float(totals[i]), 4),
+                "ci_low":         round(float(ci_low[i]), 4),
+                "ci_high":        round(float(ci_high[i]), 4),
+                "expected":       per_hour[i].tolist(),
+            }
+            for i, (_, tail, icao24) in enumerate(aircraft)
+        ]
+    return result
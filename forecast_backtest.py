@@ -0,0 +1,125 @@
+"""
+Backtests the takeoff forecast against recorded events.
+
+Loads every TAKEOFF needed in one query, then for each historical cutoff
+rebuilds the 30-day hour-of-week matrix exactly as the live model would,
+forecasts the next --horizon hours for the fleet and every aircraft, and
+compares with what actually happened.
+
+Usage:
+  python forecast_backtest.py [--windows 28] [--horizon 24] [--step 24] [--end 2025-12-31T00:00]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import psycopg2
+from dotenv import load_dotenv
+
+from forecast import ARGENTINA_TZ, WINDOW, RECENT, MAX_HORIZON_HOURS, forecast_matrix, confidence_interval, _hour_of_week
+
+HOUR = 3600
+
+
+def hour_of_week(epoch):
+    """Vectorized _hour_of_week for an array of unix timestamps."""
+    local = epoch.astype(np.int64) + int(ARGENTINA_TZ.utcoffset(None).total_seconds())
+    days  = local // 86400
+    # 1970-01-01 was a Thursday (DOW 4).
+    return ((days + 4) % 7) * 24 + (local % 86400) // HOUR
+
+
+def load_takeoffs(conn, start, end):
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM aircraft ORDER BY id")
+        ids = [r[0] for r in cur.fetchall()]
+        cur.execute("""
+            SELECT EXTRACT(EPOCH FROM ts)::bigint, aircraft_id
+            FROM events
+            WHERE type = 'TAKEOFF' AND ts > %s AND ts < %s
+        """, (start, end))
+        rows = cur.fetchall()
+    row_of = {aid: i for i, aid in enumerate(ids)}
+    ts  = np.array([r[0] for r in rows], dtype=np.int64)
+    row = np.array([row_of[r[1]] for r in rows], dtype=np.int64)
+    return len(ids), ts, row
+
+
+def backtest_window(n_aircraft, ts, row, how, cutoff, horizon):
+    """Forecast from `cutoff` (unix, hour-aligned) and return (expected, actual), each (1 + n_aircraft, horizon)."""
+    # Strictly before the cutoff: a takeoff at the cutoff is an outcome, not history.
+    train  = (ts > cutoff - WINDOW.total_seconds()) & (ts < cutoff)
+    recent = train & (ts > cutoff - RECENT.total_seconds())
+
+    counts  = np.bincount(row[train] * 168 + how[train], minlength=n_aircraft * 168).reshape(n_aircraft, 168)
+    last_30 = np.bincount(row[train],  minlength=n_aircraft)
+    last_7  = np.bincount(row[recent], minlength=n_aircraft)
+
+    counts  = np.vstack([counts.sum(axis=0), counts])
+    last_7  = np.concatenate([[last_7.sum()],  last_7])
+    last_30 = np.concatenate([[last_30.sum()], last_30])
+    start_how = _hour_of_week(datetime.fromtimestamp(cutoff, tz=timezone.utc))
+    expected  = forecast_matrix(counts, last_7, last_30, start_how, horizon)
+
+    future = (ts >= cutoff) & (ts < cutoff + horizon * HOUR)
+    offset = (ts[future] - cutoff) // HOUR
+    actual = np.bincount(row[future] * horizon + offset, minlength=n_aircraft * horizon).reshape(n_aircraft, horizon)
+    actual = np.vstack([actual.sum(axis=0), actual])
+    return expected, actual
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--windows", type=int, default=28, help="number of cutoffs to replay")
+    parser.add_argument("--horizon", type=int, default=24, help="forecast horizon in hours (1..168)")
+    parser.add_argument("--step",    type=int, default=24, help="hours between cutoffs")
+    parser.add_argument("--end",     help="last cutoff (ISO, UTC); default: now minus the horizon")
+    args = parser.parse_args()
+    horizon = max(1, min(args.horizon, MAX_HORIZON_HOURS))
+
+    load_dotenv()
+    last_cutoff = (datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end
+                   else datetime.now(timezone.utc) - timedelta(hours=horizon))
+    last_cutoff = last_cutoff.replace(minute=0, second=0, microsecond=0)
+    cutoffs = [last_cutoff - timedelta(hours=args.step * i) for i in reversed(range(args.windows))]
+
+    t0 = time.perf_counter()
+    with psycopg2.connect(os.getenv("DATABASE_URL")) as conn:
+        n_aircraft, ts, row = load_takeoffs(conn, cutoffs[0] - WINDOW, last_cutoff + timedelta(hours=horizon))
+    load_s = time.perf_counter() - t0
+    how = hour_of_week(ts)
+    print(f"Loaded {len(ts)} takeoffs for {n_aircraft} aircraft in {load_s * 1000:.0f} ms")
+    print(f"Replaying {len(cutoffs)} cutoffs, {horizon} h horizon, every {args.step} h\n")
+
+    fleet_abs, fleet_err, hourly_mae, aircraft_mae, covered, runtimes = [], [], [], [], 0, []
+    for cutoff in cutoffs:
+        t0 = time.perf_counter()
+        expected, actual = backtest_window(n_aircraft, ts, row, how, int(cutoff.timestamp()), horizon)
+        runtimes.append(time.perf_counter() - t0)
+
+        totals_exp = expected.sum(axis=1)
+        totals_act = actual.sum(axis=1)
+        ci_low, ci_high = confidence_interval(totals_exp[:1])
+        fleet_err.append(totals_exp[0] - totals_act[0])
+        fleet_abs.append(abs(fleet_err[-1]))
+        hourly_mae.append(np.abs(expected[0] - actual[0]).mean())
+        aircraft_mae.append(np.abs(totals_exp[1:] - totals_act[1:]).mean() if n_aircraft else 0.0)
+        covered += int(ci_low[0] <= totals_act[0] <= ci_high[0])
+        print(f"  {cutoff.strftime('%Y-%m-%d %H:%M')}  expected {totals_exp[0]:6.2f}  actual {totals_act[0]:4d}"
+              f"  err {fleet_err[-1]:+6.2f}")
+
+    runtimes = np.array(runtimes) * 1000
+    print()
+    print(f"Fleet total   MAE {np.mean(fleet_abs):.3f}   bias {np.mean(fleet_err):+.3f}")
+    print(f"Fleet hourly  MAE {np.mean(hourly_mae):.4f}")
+    print(f"Per-aircraft  MAE {np.mean(aircraft_mae):.3f} (total over horizon)")
+    print(f"95% CI coverage   {covered}/{len(cutoffs)}")
+    print(f"Runtime per window: mean {runtimes.mean():.2f} ms, p95 {np.percentile(runtimes, 95):.2f} ms, "
+          f"total {runtimes.sum():.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
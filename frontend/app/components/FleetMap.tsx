@@ -55,7 +55,7 @@ export default function FleetMap({ positions, trail }: { positions: Position[];
             <Popup>
               <div className="text-xs leading-5">
                 <div className="font-semibold text-sm mb-1">{p.tail_number}</div>
-                <div>Alt: {fmt(p.altitude, 'ft')}</div>
+                <div>Alt: {fmt(p.altitude != null ? p.altitude * 3.28084 : null, 'ft')}</div>
                 <div>Speed: {fmt(p.velocity, 'km/h')}</div>
                 <div>Heading: {p.heading != null ? `${Math.round(p.heading)}°` : '—'}</div>
                 <div className="text-gray-400 mt-1 text-[10px]">{p.source}</div>
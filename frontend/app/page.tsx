@@ -83,6 +83,10 @@ interface TopDest {
   count: number;
 }
 
+interface AnalyticsBundle extends MonthlyData {
+  top_destinations: TopDest[];
+}
+
 interface FlightEntry {
   tail_number: string;
   icao24: string;
@@ -115,6 +119,11 @@ function eventBadge(type: string) {
   return EVENT_STYLES[type.toUpperCase()] ?? 'bg-gray-800 text-gray-400';
 }
 
+// The API reports altitudes in meters.
+function feet(m: number) {
+  return Math.round(m * 3.28084);
+}
+
 function relTime(iso: string | null) {
   if (!iso) return '—';
   const diff = Math.floor((Date.now() - new Date(iso).getTime()) / 1000);
@@ -228,7 +237,7 @@ function FlightCard({ f }: { f: FlightEntry }) {
   const unknown   = (v: string) => !v || v === '—' || v === 'UNKNOWN';
   const hasRoute  = !unknown(f.origin) || !unknown(f.destination);
   const durStr    = f.duration_s ? fmtDur(f.duration_s) : null;
-  const altFL     = f.cruise_alt ? `FL${Math.round(f.cruise_alt / 100)}` : null;
+  const altFL     = f.cruise_alt ? `FL${Math.round(feet(f.cruise_alt) / 100)}` : null;
   const tailColor = TAIL_COLORS[f.tail_number] ?? 'text-gray-200';
 
   return (
@@ -332,7 +341,6 @@ export default function Dashboard() {
   const [monthly, setMonthly]         = useState<MonthlyData | null>(null);
   const [mLoading, setMLoading]       = useState(false);
   const [topDest, setTopDest]         = useState<TopDest[]>([]);
-  const [topDestLoading, setTopDestLoading] = useState(false);
 
   // Track which event keys have already been shown — don't highlight on first load
   const seenKeys    = useRef<Set<string>>(new Set());
@@ -481,34 +489,22 @@ export default function Dashboard() {
     }
   }
 
-  const fetchMonthly = useCallback(async (filters: typeof mFilters) => {
+  // KPIs, monthly series and top destinations in one round-trip
+  const fetchAnalytics = useCallback(async (filters: typeof mFilters) => {
     setMLoading(true);
     try {
       const p = new URLSearchParams({ start_date: filters.startDate, end_date: filters.endDate });
       if (filters.aircraft) p.set('aircraft_id', filters.aircraft);
-      const res = await fetch(`/analytics/monthly?${p}`);
+      const res = await fetch(`/analytics/bundle?${p}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      setMonthly(await res.json());
-    } catch { /* silent — monthly section shows empty state */ }
-    finally { setMLoading(false); }
-  }, []);
-
-  useEffect(() => { fetchMonthly(mFilters); }, [fetchMonthly, mFilters]);
-
-  const fetchTopDest = useCallback(async (filters: typeof mFilters) => {
-    setTopDestLoading(true);
-    try {
-      const p = new URLSearchParams({ start_date: filters.startDate, end_date: filters.endDate });
-      if (filters.aircraft) p.set('aircraft_id', filters.aircraft);
-      const res = await fetch(`/analytics/top-destinations?${p}`);
-      if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const data = await res.json();
+      const data: AnalyticsBundle = await res.json();
+      setMonthly(data);
       setTopDest(data.top_destinations ?? []);
-    } catch { /* silent */ }
-    finally { setTopDestLoading(false); }
+    } catch { /* silent — analytics sections show empty state */ }
+    finally { setMLoading(false); }
   }, []);
 
-  useEffect(() => { fetchTopDest(mFilters); }, [fetchTopDest, mFilters]);
+  useEffect(() => { fetchAnalytics(mFilters); }, [fetchAnalytics, mFilters]);
 
   const fetchFlights = useCallback(async () => {
     setFlightsLoading(true);
@@ -859,7 +855,7 @@ export default function Dashboard() {
                 <option value="">All aircraft</option>
                 {PLANES.map(p => <option key={p.icao24} value={p.icao24}>{p.tail}</option>)}
               </select>
-              {(mLoading || topDestLoading) && <span className="text-gray-600 animate-pulse">Loading…</span>}
+              {mLoading && <span className="text-gray-600 animate-pulse">Loading…</span>}
             </div>
           )}
         </div>
@@ -896,7 +892,7 @@ export default function Dashboard() {
                         {p.on_ground ? 'Ground' : 'Air'}
                       </span>
                     </td>
-                    <td className="px-3 py-1.5 text-gray-300">{p.altitude != null ? `${Math.round(p.altitude)} ft` : '—'}</td>
+                    <td className="px-3 py-1.5 text-gray-300">{p.altitude != null ? `${feet(p.altitude)} ft` : '—'}</td>
                     <td className="px-3 py-1.5 text-gray-300">{p.velocity != null ? `${Math.round(p.velocity)} km/h` : '—'}</td>
                     <td className="px-3 py-1.5 text-gray-300">{p.heading != null ? `${Math.round(p.heading)}°` : '—'}</td>
                     <td className="px-3 py-1.5 text-gray-500">{p.source}</td>
@@ -981,17 +977,17 @@ export default function Dashboard() {
               <div>
                 <div className="text-[9px] text-gray-500 uppercase tracking-wide mb-1">Top destinations</div>
 
-                {topDestLoading && (
+                {mLoading && (
                   <div className="flex flex-col gap-1.5">
                     {Array.from({ length: 5 }).map((_, i) => <Skeleton key={i} className="h-4 w-full" />)}
                   </div>
                 )}
 
-                {!topDestLoading && topDest.length === 0 && (
+                {!mLoading && topDest.length === 0 && (
                   <div className="text-xs text-gray-600 py-4 text-center">No destination data yet</div>
                 )}
 
-                {!topDestLoading && topDest.length > 0 && (() => {
+                {!mLoading && topDest.length > 0 && (() => {
                   const shown = topDest.slice(0, 8);
                   const maxCount = shown[0]?.count ?? 1;
                   const ordered = [...shown.filter(d => d.airport !== 'UNKNOWN'), ...shown.filter(d => d.airport === 'UNKNOWN')];
@@ -1,14 +1,37 @@
 """
-One-time script: fetches last 30 days of flight history from OpenSky Network
-and writes a .sql file ready to paste in Supabase SQL Editor.
+Imports flight history from OpenSky Network straight into Postgres.
+
+The range is split into one-day chunks per aircraft (the OAuth2 API allows at
+most 2 day-partitions per query). Chunks are fetched by a pool of workers that
+share one token-bucket rate limit, and are loaded as they arrive through
+bulk_load.BulkLoader, which skips events that already exist. Finished chunks
+are recorded in a checkpoint file, so an interrupted run picks up where it
+stopped; a chunk that was loaded but not yet checkpointed is simply loaded
+again without duplicates. The rollup is rebuilt for each batch's days before
+the batch is checkpointed.
+
+  python import_history.py [--start 2025-10-01] [--end 2025-12-31] [--workers 4] [--rate 1]
+
+Credentials come from credentials_opensky.json (never committed). To run
+against a local stub, point OPENSKY_API_URL / OPENSKY_TOKEN_URL (or
+--api-url / --token-url) at it: bench/opensky_stub.py --serve PORT runs one,
+and without --serve it checks an interrupted and resumed import against it.
 """
 
+import argparse
 import json
 import os
+import threading
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 
+import psycopg2
+import requests
+from dotenv import load_dotenv
+
+from bulk_load import BulkLoader
+
 PLANES = {
     "e0659a": "LV-FVZ",
     "e030cf": "LV-CCO",
@@ -17,127 +40,220 @@ PLANES = {
     "e0b058": "LV-KAX",
 }
 
-OPENSKY_URL       = "https://opensky-network.org/api/flights/aircraft"
-OPENSKY_TOKEN_URL = "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token"
-DELAY_BETWEEN_REQUESTS = 15
-OUTPUT_FILE       = "import_history.sql"
-
-# Load credentials from credentials_opensky.json (never committed)
-_creds_file = os.path.join(os.path.dirname(__file__), "credentials_opensky.json")
-with open(_creds_file) as _f:
-    _creds = json.load(_f)
-CLIENT_ID     = _creds["clientId"]
-CLIENT_SECRET = _creds["clientSecret"]
-
-
-def get_token():
-    resp = requests.post(
-        OPENSKY_TOKEN_URL,
-        data={
-            "grant_type":    "client_credentials",
-            "client_id":     CLIENT_ID,
-            "client_secret": CLIENT_SECRET,
-        },
-        timeout=15,
-    )
-    resp.raise_for_status()
-    return resp.json()["access_token"]
-
-
-def fetch_flights(icao24, begin_ts, end_ts, token):
-    # OAuth2 API allows max 2 day-partitions per query.
-    # Use 1-day aligned chunks (midnight→midnight) to stay within limit.
-    results = []
-    end_dt = datetime.fromtimestamp(end_ts, tz=timezone.utc)
-
-    # Align cursor to midnight UTC
-    raw_start = datetime.fromtimestamp(begin_ts, tz=timezone.utc)
-    cursor = raw_start.replace(hour=0, minute=0, second=0, microsecond=0)
-
-    while cursor < end_dt:
-        chunk_end = min(cursor + timedelta(days=1), end_dt)
-        try:
-            resp = requests.get(
-                OPENSKY_URL,
-                params={"icao24": icao24, "begin": int(cursor.timestamp()), "end": int(chunk_end.timestamp())},
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=30,
-            )
-            if resp.status_code == 200:
-                data = resp.json() or []
-                if data:
-                    print(f"    {cursor.date()} — {len(data)} flights")
-                results.extend(data)
-            elif resp.status_code == 404:
-                pass
-            else:
-                print(f"    {cursor.date()} — HTTP {resp.status_code}")
-        except Exception as e:
-            print(f"    {cursor.date()} — error: {e}")
-        cursor += timedelta(days=1)
-        time.sleep(15)
+OPENSKY_URL       = os.getenv("OPENSKY_API_URL", "https://opensky-network.org/api/flights/aircraft")
+OPENSKY_TOKEN_URL = os.getenv("OPENSKY_TOKEN_URL",
+                              "https://auth.opensky-network.org/auth/realms/opensky-network/protocol/openid-connect/token")
+CREDENTIALS_FILE  = os.path.join(os.path.dirname(__file__), "credentials_opensky.json")
+CHECKPOINT_FILE   = "import_history.checkpoint.json"
 
-    return results
+MAX_ATTEMPTS      = 5
+# Chunks are merged into the database in groups of this many.
+FLUSH_EVERY       = 20
 
 
-def escape(s):
-    return s.replace("'", "''")
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`.
+    pause() holds every caller back, e.g. after a 429."""
 
+    def __init__(self, rate, capacity):
+        self.rate     = rate
+        self.capacity = capacity
+        self.tokens   = capacity
+        self.updated  = time.monotonic()
+        self.resume   = 0.0
+        self.lock     = threading.Lock()
 
-def main():
-    begin = datetime(2025, 10, 1, tzinfo=timezone.utc)
-    now   = datetime(2025, 12, 31, tzinfo=timezone.utc)
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens  = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.resume and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.resume - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
 
-    print(f"Fetching flights from {begin.strftime('%Y-%m-%d')} to {now.strftime('%Y-%m-%d')}\n")
+    def pause(self, seconds):
+        with self.lock:
+            self.resume = max(self.resume, time.monotonic() + seconds)
 
-    print("Authenticating with OpenSky...")
-    token = get_token()
-    print("Token obtained.\n")
 
-    rows = []
+class OpenSkyClient:
+    """Flights API with a shared OAuth2 token, refreshed when it is rejected."""
 
-    for i, (icao24, tail) in enumerate(PLANES.items()):
-        print(f"[{tail}] fetching...")
-        flights = fetch_flights(icao24, begin.timestamp(), now.timestamp(), token)
-        print(f"  {len(flights)} flights returned")
-
-        for f in flights:
-            callsign = escape((f.get("callsign") or "").strip())
-
-            if f.get("firstSeen"):
-                ts  = datetime.fromtimestamp(f["firstSeen"], tz=timezone.utc).isoformat()
-                dep = escape(f.get("estDepartureAirport") or "")
-                meta = json.dumps({"callsign": callsign, "airport": dep, "source": "opensky-history"})
-                rows.append(
-                    f"((SELECT id FROM aircraft WHERE icao24 = '{icao24}'), "
-                    f"'{ts}', 'TAKEOFF', '{escape(meta)}'::jsonb)"
-                )
+    def __init__(self, api_url, token_url, client_id, client_secret, bucket):
+        self.api_url       = api_url
+        self.token_url     = token_url
+        self.client_id     = client_id
+        self.client_secret = client_secret
+        self.bucket        = bucket
+        self.session       = requests.Session()
+        self.token         = None
+        self.token_lock    = threading.Lock()
 
-            if f.get("lastSeen"):
-                ts  = datetime.fromtimestamp(f["lastSeen"], tz=timezone.utc).isoformat()
-                arr = escape(f.get("estArrivalAirport") or "")
-                meta = json.dumps({"callsign": callsign, "airport": arr, "source": "opensky-history"})
-                rows.append(
-                    f"((SELECT id FROM aircraft WHERE icao24 = '{icao24}'), "
-                    f"'{ts}', 'LANDING', '{escape(meta)}'::jsonb)"
+    def get_token(self, stale=None):
+        with self.token_lock:
+            if self.token is None or self.token == stale:
+                resp = self.session.post(
+                    self.token_url,
+                    data={
+                        "grant_type":    "client_credentials",
+                        "client_id":     self.client_id,
+                        "client_secret": self.client_secret,
+                    },
+                    timeout=15,
                 )
+                resp.raise_for_status()
+                self.token = resp.json()["access_token"]
+            return self.token
+
+    def fetch_day(self, icao24, day):
+        """Flights for icao24 on the UTC day [day, day + 1). Raises after MAX_ATTEMPTS failures."""
+        begin = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        params = {"icao24": icao24, "begin": int(begin.timestamp()),
+                  "end": int((begin + timedelta(days=1)).timestamp())}
+        for attempt in range(MAX_ATTEMPTS):
+            token = self.get_token()
+            self.bucket.acquire()
+            try:
+                resp = self.session.get(self.api_url, params=params,
+                                        headers={"Authorization": f"Bearer {token}"}, timeout=30)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if resp.status_code == 200:
+                    return resp.json() or []
+                if resp.status_code == 404:
+                    return []
+                if resp.status_code == 401:
+                    self.get_token(stale=token)
+                if resp.status_code == 429:
+                    retry_after = resp.headers.get("X-Rate-Limit-Retry-After-Seconds")
+                    self.bucket.pause(min(float(retry_after or 60), 3600))
+                error = f"HTTP {resp.status_code}"
+            time.sleep(min(2 ** attempt, 30))
+        raise RuntimeError(error)
+
+
+def flight_rows(icao24, flights):
+    """(icao24, ts, type, meta) events for a list of OpenSky flights."""
+    rows = []
+    for f in flights:
+        callsign = (f.get("callsign") or "").strip()
+        if f.get("firstSeen"):
+            meta = {"callsign": callsign, "airport": f.get("estDepartureAirport") or "", "source": "opensky-history"}
+            rows.append((icao24, datetime.fromtimestamp(f["firstSeen"], tz=timezone.utc), "TAKEOFF", meta))
+        if f.get("lastSeen"):
+            meta = {"callsign": callsign, "airport": f.get("estArrivalAirport") or "", "source": "opensky-history"}
+            rows.append((icao24, datetime.fromtimestamp(f["lastSeen"], tz=timezone.utc), "LANDING", meta))
+    return rows
+
+
+class Checkpoint:
+    """Set of finished "icao24/YYYY-MM-DD" chunks, persisted atomically as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.done = set(json.load(f).get("done", []))
+
+    @staticmethod
+    def key(icao24, day):
+        return f"{icao24}/{day.isoformat()}"
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def add(self, keys):
+        self.done.update(keys)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
 
-        if i < len(PLANES) - 1:
-            print(f"  Waiting {DELAY_BETWEEN_REQUESTS}s...")
-            time.sleep(DELAY_BETWEEN_REQUESTS)
+def load_credentials(path=CREDENTIALS_FILE):
+    """(client_id, client_secret) from the credentials file, or OPENSKY_CLIENT_ID/SECRET."""
+    if not os.path.exists(path):
+        return os.getenv("OPENSKY_CLIENT_ID"), os.getenv("OPENSKY_CLIENT_SECRET")
+    with open(path) as f:
+        creds = json.load(f)
+    return creds["clientId"], creds["clientSecret"]
 
-    if not rows:
-        print("\nNo flights found. SQL file not written.")
-        return
 
-    with open(OUTPUT_FILE, "w") as f:
-        f.write("-- Auto-generated by import_history.py\n")
-        f.write("-- Paste this in Supabase SQL Editor\n\n")
-        f.write("INSERT INTO events (aircraft_id, ts, type, meta)\nVALUES\n")
-        f.write(",\n".join(rows))
-        f.write("\nON CONFLICT DO NOTHING;\n")
+def run_import(loader, client, start, end, checkpoint, workers):
+    """Fetch and load every pending (aircraft, day) chunk. Returns the failed chunks."""
+    days  = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    todo  = [(icao24, day) for icao24 in PLANES for day in days
+             if Checkpoint.key(icao24, day) not in checkpoint]
+    print(f"{len(todo)} chunks to fetch ({len(PLANES) * len(days) - len(todo)} already done)\n")
+
+    failed, pending_keys = [], []
+
+    def flush():
+        loader.flush()
+        checkpoint.add(pending_keys)
+        pending_keys.clear()
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {pool.submit(client.fetch_day, icao24, day): (icao24, day) for icao24, day in todo}
+    try:
+        for n, fut in enumerate(as_completed(futures), 1):
+            icao24, day = futures[fut]
+            try:
+                flights = fut.result()
+            except Exception as e:
+                print(f"  [{PLANES[icao24]}] {day} — failed: {e}")
+                failed.append((icao24, day))
+                continue
+            if flights:
+                print(f"  [{PLANES[icao24]}] {day} — {len(flights)} flights")
+            for row in flight_rows(icao24, flights):
+                loader.add(*row)
+            pending_keys.append(Checkpoint.key(icao24, day))
+            if len(pending_keys) >= FLUSH_EVERY:
+                flush()
+                print(f"  … {n}/{len(todo)} chunks, {loader.inserted} events inserted")
+    finally:
+        # On Ctrl-C don't fetch the queued chunks; whatever was fetched is still saved.
+        pool.shutdown(wait=True, cancel_futures=True)
+        flush()
+    return failed
+
+
+def main():
+    today = datetime.now(timezone.utc).date()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--start", type=lambda s: datetime.fromisoformat(s).date(), default=today - timedelta(days=30))
+    parser.add_argument("--end",   type=lambda s: datetime.fromisoformat(s).date(), default=today)
+    parser.add_argument("--workers", type=int,   default=4)
+    parser.add_argument("--rate",    type=float, default=1.0, help="requests per second, shared by all workers")
+    parser.add_argument("--burst",   type=int,   default=4)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--api-url",    default=OPENSKY_URL)
+    parser.add_argument("--token-url",  default=OPENSKY_TOKEN_URL)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client_id, client_secret = load_credentials()
+    client = OpenSkyClient(args.api_url, args.token_url, client_id, client_secret,
+                           TokenBucket(args.rate, args.burst))
+    checkpoint = Checkpoint(args.checkpoint)
 
-    print(f"\nDone. {len(rows)} rows written to {OUTPUT_FILE}")
+    print(f"Importing flights from {args.start} to {args.end} "
+          f"({args.workers} workers, {args.rate:g} req/s)\n")
+    t0 = time.perf_counter()
+    with psycopg2.connect(os.getenv("DATABASE_URL")) as conn:
+        loader = BulkLoader(conn)
+        failed = run_import(loader, client, args.start, args.end, checkpoint, args.workers)
+        inserted = loader.finish()
+    print(f"\nDone in {time.perf_counter() - t0:.0f}s. {inserted} events inserted.")
+    if failed:
+        print(f"{len(failed)} chunks failed; run again to retry them.")
 
 
 if __name__ == "__main__":
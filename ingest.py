@@ -0,0 +1,631 @@
+"""
+Flight ingest: polls OpenSky / ADSB.one, stores positions and events, and sends
+the Telegram alerts.
+
+Ingest runs apart from web serving (python ingest_worker.py, or a thread in
+app.py with ENABLE_MONITOR=true), and any number of processes may run it:
+they elect one leader through a Postgres advisory lock, and only the leader
+runs cycles. The lock belongs to the leader's connection, so if the process
+dies Postgres releases it and a follower takes over on its next poll. After
+each cycle the leader heartbeats into ingest_leader
+(migrations/004_ingest_leader.sql) with its monitor state, which the next
+leader picks up so a failover doesn't re-announce planes already in the air.
+A leader that is alive but stuck stops heartbeating; after LEADER_TIMEOUT a
+follower terminates its backend, which frees the lock, and the old leader
+steps down at its next heartbeat.
+
+Session advisory locks need a direct (or session-pooled) connection:
+DATABASE_URL must not point at a transaction-mode pooler.
+
+Sources are read through fetch() and time through clock, which
+bench/ingest_replay.py replaces to run recorded responses (recorder.py)
+through check_flights on a virtual clock.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import psycopg2
+import requests
+from psycopg2.extras import Json
+
+import live
+import position
+import recorder
+from airports import nearest_airport
+from analytics import invalidate as invalidate_analytics
+from db import get_db, has_recent_event, get_latest_positions
+from forecast import record_takeoff
+from jsonresp import loads
+from rollup import record_event
+
+OPENSKY_URL = "https://opensky-network.org/api/states/all"
+ADSB_ONE_URL = "https://api.adsb.one/v2/hex/{}"
+
+PLANES = {
+    "e0659a": "LV-FVZ",
+    "e030cf": "LV-CCO",
+    "e06546": "LV-FUF",
+    "e0b341": "LV-KMA",
+    "e0b058": "LV-KAX",
+}
+
+active_planes = set()
+notified_planes = set()
+last_seen = {}
+on_ground_state = {}
+LANDING_GRACE_PERIOD = 600
+APPEARED_THRESHOLD = 7200  # 2 hours
+_aircraft_ids = {}   # icao24 -> aircraft.id, filled by load_aircraft_ids() and on lookup
+
+
+class WallClock:
+    """Real time. Rows are timestamped by the database's now() (row_ts() is None)."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def row_ts(self):
+        return None
+
+
+clock = WallClock()
+
+
+def fetch(url, timeout):
+    """GET url -> (status, body text), recorded when INGEST_RECORD_DIR is set."""
+    response = requests.get(url, timeout=timeout)
+    recorder.record(clock.time(), url, response.status_code, response.text)
+    return response.status_code, response.text
+
+
+def load_aircraft_ids(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT icao24, id FROM aircraft")
+        _aircraft_ids.update({r["icao24"]: r["id"] for r in cur.fetchall()})
+
+
+def get_aircraft_id(cur, icao24):
+    aircraft_id = _aircraft_ids.get(icao24)
+    if aircraft_id is None:
+        cur.execute("SELECT id FROM aircraft WHERE icao24 = %s", (icao24,))
+        row = cur.fetchone()
+        if row:
+            aircraft_id = _aircraft_ids[icao24] = row["id"]
+    return aircraft_id
+
+
+def seed_from_positions(conn):
+    """last_seen and on_ground_state from each aircraft's latest position. Planes
+    seen airborne within LANDING_GRACE_PERIOD count as active, so a restart
+    neither announces them as new takeoffs nor misses their landing."""
+    now = time.time()
+    for r in get_latest_positions(conn):
+        tail, seen = r["tail_number"], r["ts"].timestamp()
+        last_seen[tail] = seen
+        on_ground_state[tail] = bool(r["on_ground"])
+        if not r["on_ground"] and now - seen < LANDING_GRACE_PERIOD:
+            active_planes.add(tail)
+
+
+def save_position(icao24, pos):
+    try:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                aircraft_id = get_aircraft_id(cur, icao24)
+                if not aircraft_id:
+                    return
+                row = (pos.lat, pos.lon, pos.altitude_m, pos.velocity_kmh,
+                       pos.heading, pos.on_ground, pos.source)
+                cur.execute("""
+                    INSERT INTO positions (ts, aircraft_id, lat, lon, altitude, velocity, heading, on_ground, source)
+                    VALUES (COALESCE(%s::timestamptz, now()), %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING ts
+                """, (clock.row_ts(), aircraft_id) + row)
+                ts = cur.fetchone()["ts"]
+        live.record(icao24, PLANES.get(icao24), ts, *row)
+    except Exception as e:
+        print(f"Error saving position: {e}")
+
+
+def save_flight_event(icao24, event_type, data=None):
+    inserted_ts = None
+    now = clock.row_ts()
+    try:
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                aircraft_id = get_aircraft_id(cur, icao24)
+                if not aircraft_id:
+                    return
+                if has_recent_event(conn, aircraft_id, event_type.upper(), now):
+                    print(f"  Dedup: skipping {event_type.upper()} for {icao24}")
+                    return
+                meta = dict(data or {})
+
+                if event_type.upper() == "TAKEOFF":
+                    lat, lon = meta.get("lat"), meta.get("lon")
+                    if lat is not None and lon is not None:
+                        apt = nearest_airport(lat, lon)
+                        if apt:
+                            meta["origin_airport"] = apt["iata"]
+                            meta["origin_name"]    = apt["name"]
+                        else:
+                            meta["origin_airport"] = "UNKNOWN"
+                    else:
+                        # Fallback: use the destination of the previous landing as origin
+                        cur.execute("""
+                            SELECT meta->>'destination_airport' AS dest,
+                                   meta->>'destination_name'    AS dest_name
+                            FROM events
+                            WHERE aircraft_id = %s AND type = 'LANDING'
+                            ORDER BY ts DESC LIMIT 1
+                        """, (aircraft_id,))
+                        prev = cur.fetchone()
+                        if prev and prev["dest"] and prev["dest"] not in ("UNKNOWN", None):
+                            meta["origin_airport"] = prev["dest"]
+                            meta["origin_name"]    = prev["dest_name"] or prev["dest"]
+                        else:
+                            meta["origin_airport"] = "UNKNOWN"
+
+                if event_type.upper() == "LANDING":
+                    # Use last known position within 2h (grace period is 10min, 5min was too narrow)
+                    cur.execute("""
+                        SELECT lat, lon FROM positions
+                        WHERE aircraft_id = %s AND lat IS NOT NULL
+                          AND ts >= COALESCE(%s::timestamptz, NOW()) - INTERVAL '2 hours'
+                        ORDER BY ts DESC LIMIT 1
+                    """, (aircraft_id, now))
+                    pos = cur.fetchone()
+                    if pos:
+                        apt = nearest_airport(pos["lat"], pos["lon"])
+                        meta["destination_airport"] = apt["iata"] if apt else "UNKNOWN"
+                        if apt:
+                            meta["destination_name"] = apt["name"]
+                    else:
+                        meta["destination_airport"] = "UNKNOWN"
+                cur.execute("""
+                    INSERT INTO events (ts, aircraft_id, type, meta)
+                    VALUES (COALESCE(%s::timestamptz, now()), %s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING ts
+                """, (now, aircraft_id, event_type.upper(), json.dumps(meta)))
+                row = cur.fetchone()
+                if not row:
+                    # Same aircraft/type/minute already recorded (events_dedup_key).
+                    return
+                inserted_ts = row["ts"]
+                record_event(cur, aircraft_id, event_type.upper(), inserted_ts, meta)
+    except Exception as e:
+        print(f"Error saving event: {e}")
+    if inserted_ts:
+        invalidate_analytics(inserted_ts)
+        if event_type.upper() == "TAKEOFF":
+            record_takeoff(inserted_ts, aircraft_id)
+
+
+
+def get_cardinal_direction(heading):
+    if heading is None:
+        return ""
+    directions = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+    idx = int((heading + 22.5) / 45) % 8
+    return directions[idx]
+
+
+def get_vertical_status(baro_rate):
+    if baro_rate is None:
+        return ""
+    if baro_rate > 64:
+        return f"⬆️ Subiendo +{baro_rate} ft/min"
+    elif baro_rate < -64:
+        return f"⬇️ Descendiendo {baro_rate} ft/min"
+    else:
+        return "➡️ Altitud estable"
+
+
+def check_emergency(squawk):
+    if squawk == "7700":
+        return "🆘 EMERGENCIA"
+    elif squawk == "7600":
+        return "📻 Falla de radio"
+    elif squawk == "7500":
+        return "🚨 HIJACK"
+    return None
+
+
+def notify_telegram(msg):
+    token = os.getenv("TELEGRAM_TOKEN")
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    if token and chat_id:
+        try:
+            requests.post(
+                f"https://api.telegram.org/bot{token}/sendMessage",
+                data={"chat_id": chat_id, "text": msg},
+                timeout=10,
+            )
+        except Exception as e:
+            print(f"Error enviando mensaje por Telegram: {e}")
+
+
+def check_adsb_one(icao24):
+    try:
+        print(f"  Consultando ADSB.one para {icao24}...")
+        status, body = fetch(ADSB_ONE_URL.format(icao24), 5)
+        print(f"  ADSB.one {icao24}: status {status}")
+        if status == 200:
+            data = loads(body)
+            if data.get("total", 0) > 0 and data.get("ac"):
+                return position.from_adsb_one(data["ac"][0])
+    except Exception as e:
+        print(f"ADSB.one error for {icao24}: {e}")
+    return None
+
+
+def check_opensky():
+    results = {}
+    try:
+        print(f"Consultando OpenSky Network...")
+        status, body = fetch(OPENSKY_URL, 30)
+        print(f"OpenSky response: status {status}")
+        if status == 200:
+            data = loads(body)
+            for state in data.get("states") or []:
+                if len(state) < 14:
+                    continue
+                if state[0] and state[0].lower() in PLANES:
+                    pos = position.from_opensky(state)
+                    results[pos.icao24] = pos
+    except Exception as e:
+        print(f"OpenSky error: {e}")
+    return results
+
+
+def check_flights():
+    global active_planes, last_seen, notified_planes, on_ground_state
+    currently_flying = set()
+    planes_info = []
+
+    current_timestamp = clock.time()
+    print(f"{datetime.fromtimestamp(current_timestamp).strftime('%Y-%m-%d %H:%M:%S')} - Checking OpenSky Network...")
+    opensky_results = check_opensky()
+
+    for icao24, registration in PLANES.items():
+        if icao24 in opensky_results:
+            currently_flying.add(registration)
+            pos = opensky_results[icao24]
+            pos.callsign = registration
+            planes_info.append(pos)
+            last_seen[registration] = current_timestamp
+            save_position(icao24, pos)
+            print(f"  Found {registration} via OpenSky")
+
+    if len(currently_flying) < len(PLANES):
+        print(f"OpenSky found {len(currently_flying)}/{len(PLANES)} planes. Checking ADSB.one for missing planes...")
+        for icao24, registration in PLANES.items():
+            if registration not in currently_flying:
+                try:
+                    pos = check_adsb_one(icao24)
+                    if pos:
+                        currently_flying.add(registration)
+                        pos.callsign = registration
+                        planes_info.append(pos)
+                        last_seen[registration] = current_timestamp
+                        save_position(icao24, pos)
+                        print(f"  Found {registration} via ADSB.one")
+                except Exception as e:
+                    print(f"  Error checking {registration} on ADSB.one: {e}")
+                clock.sleep(0.5)
+
+    for pos in planes_info:
+        registration = pos.callsign
+        icao24 = pos.icao24
+
+        if registration not in active_planes:
+            # Skip ground movements misdetected as takeoffs (altitude < 500ft AND velocity < 80km/h)
+            if not pos.airborne:
+                print(f"  Skipping ground movement for {registration}: alt={pos.altitude_m} m, vel={pos.velocity_kmh}")
+                active_planes.add(registration)   # track it so we don't re-evaluate next cycle
+                continue
+
+            is_in_progress = registration in notified_planes
+            event_icon = "🔄" if is_in_progress else "✈️"
+            event_type = "en curso" if is_in_progress else "despegó"
+
+            msg = f"{event_icon} {registration} {event_type}\nICAO24: {icao24}\n"
+
+            emergency = check_emergency(pos.squawk)
+            if emergency:
+                msg += f"{emergency}\n"
+
+            if pos.has_fix:
+                msg += f"\n📍 Posición: {pos.lat:.4f}, {pos.lon:.4f}\n"
+
+            altitude_ft = round(pos.altitude_m / position.M_PER_FT) if pos.altitude_m is not None else "N/A"
+            msg += f"📊 Altitud: {altitude_ft} ft\n"
+            msg += f"🚀 Velocidad: {pos.velocity_kmh if pos.velocity_kmh is not None else 'N/A'} km/h\n"
+
+            if pos.heading is not None:
+                cardinal = get_cardinal_direction(pos.heading)
+                msg += f"🧭 Rumbo: {int(pos.heading)}° ({cardinal})\n"
+
+            vertical = get_vertical_status(pos.vertical_rate_fpm)
+            if vertical:
+                msg += f"{vertical}\n"
+
+            msg += f"\n🔗 Ver en vivo: https://www.flightradar24.com/{registration}\n"
+            msg += f"📡 Fuente: {pos.source}\n"
+            msg += f"🕐 {datetime.fromtimestamp(clock.time()).strftime('%Y-%m-%d %H:%M:%S')}"
+
+            notify_telegram(msg)
+            notified_planes.add(registration)
+
+            save_flight_event(icao24, "in_progress" if is_in_progress else "takeoff", {
+                "icao24": icao24,
+                "altitude": pos.altitude_m,
+                "velocity": pos.velocity_kmh,
+                "lat": pos.lat,
+                "lon": pos.lon,
+                "source": pos.source
+            })
+
+        # APPEARED: plane not seen for > 2h
+        prev_ts = last_seen.get(registration)
+        if prev_ts and (current_timestamp - prev_ts) > APPEARED_THRESHOLD:
+            gap_h = int((current_timestamp - prev_ts) / 3600)
+            save_flight_event(icao24, "appeared", {"gap_seconds": int(current_timestamp - prev_ts)})
+            notify_telegram(f"👀 {registration} reapareció después de {gap_h}h sin señal")
+
+        # EMERGENCY: save to DB (Telegram already handled above for new flights)
+        if pos.squawk in ("7700", "7600", "7500"):
+            save_flight_event(icao24, "emergency", {"squawk": pos.squawk})
+
+        on_ground_state[registration] = pos.on_ground
+
+    planes_to_remove = []
+    for plane in active_planes - currently_flying:
+        if plane in last_seen:
+            time_since_seen = current_timestamp - last_seen[plane]
+            if time_since_seen < LANDING_GRACE_PERIOD:
+                print(f"  {plane} no detectado, pero dentro del período de gracia ({int(time_since_seen)}s < {LANDING_GRACE_PERIOD}s)")
+                currently_flying.add(plane)
+                continue
+
+        icao24 = next((k for k, v in PLANES.items() if v == plane), None)
+        msg = f"🛬 {plane} aterrizó\n🕐 {datetime.fromtimestamp(clock.time()).strftime('%Y-%m-%d %H:%M:%S')}"
+        notify_telegram(msg)
+        if icao24:
+            save_flight_event(icao24, "landing")
+        planes_to_remove.append(plane)
+
+    for plane in planes_to_remove:
+        notified_planes.discard(plane)
+        last_seen.pop(plane, None)
+
+    active_planes = currently_flying
+    print(f"{datetime.fromtimestamp(clock.time()).strftime('%Y-%m-%d %H:%M:%S')} - Verificación completada. Aviones en vuelo: {len(currently_flying)}")
+    return [p.to_dict() for p in planes_info]
+
+
+# ── Leader election ──────────────────────────────────────────────────────────
+
+LOCK_KEY       = 4_147_001   # pg advisory lock shared by every ingest process
+CYCLE_SECONDS  = 25
+FOLLOWER_POLL  = 10
+# Longer than any healthy cycle (OpenSky + ADSB.one timeouts + Telegram).
+LEADER_TIMEOUT = 180
+# A manual check reuses any cycle finished this recently instead of running one.
+CHECK_FRESH_SECONDS = 20
+
+
+class Leadership:
+    """The ingest advisory lock, held on a dedicated autocommit connection."""
+
+    def __init__(self):
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.conn   = None
+
+    @property
+    def is_leader(self):
+        return self.conn is not None
+
+    def try_acquire(self):
+        """Take the lock if it is free. Returns True when this process now leads."""
+        conn = get_db()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s) AS ok", (LOCK_KEY,))
+                if cur.fetchone()["ok"]:
+                    cur.execute("""
+                        INSERT INTO ingest_leader (id, holder, pid, acquired_at, heartbeat_at)
+                        VALUES (1, %s, pg_backend_pid(), now(), now())
+                        ON CONFLICT (id) DO UPDATE
+                        SET holder = excluded.holder, pid = excluded.pid,
+                            acquired_at = now(), heartbeat_at = now()
+                    """, (self.holder,))
+                    self.conn = conn
+                    return True
+                self._fence_stale(cur)
+        except Exception:
+            conn.close()
+            raise
+        conn.close()
+        return False
+
+    def _fence_stale(self, cur):
+        """Terminate the leader's backend if it holds the lock but stopped heartbeating."""
+        cur.execute("""
+            SELECT l.holder, pg_terminate_backend(l.pid) AS terminated
+            FROM ingest_leader l
+            JOIN pg_locks k ON k.pid = l.pid
+             AND k.locktype = 'advisory' AND k.granted
+             AND k.classid = 0 AND k.objid = %s AND k.objsubid = 1
+            WHERE l.id = 1
+              AND l.heartbeat_at < now() - %s * interval '1 second'
+        """, (LOCK_KEY, LEADER_TIMEOUT))
+        row = cur.fetchone()
+        if row and row["terminated"]:
+            print(f"⚠️ Ingest leader {row['holder']} stopped heartbeating, terminated its session")
+
+    def handed_over_state(self):
+        """Monitor state saved by the previous leader ({} on a fresh table)."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT state FROM ingest_leader WHERE id = 1")
+            return cur.fetchone()["state"]
+
+    def heartbeat(self, state, planes_info):
+        """Record a finished cycle. Returns False, and lets go, if leadership was lost."""
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE ingest_leader
+                    SET heartbeat_at = now(), state = %s, last_cycle = %s
+                    WHERE id = 1 AND pid = pg_backend_pid()
+                """, (Json(state), Json(planes_info)))
+                if cur.rowcount == 1:
+                    return True
+        except psycopg2.Error as e:
+            print(f"Ingest heartbeat failed: {e}")
+        self.release()
+        return False
+
+    def release(self):
+        """Close the session, which releases the lock."""
+        if self.conn is None:
+            return
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+        self.conn = None
+
+
+leadership = Leadership()
+
+_cycle_lock = threading.Lock()    # one check_flights at a time in this process
+_last_cycle = (0.0, [])           # (unix time finished, planes_info), here or published by the leader
+_inflight   = None                # Future of the manual check in progress, shared by concurrent callers
+_inflight_lock = threading.Lock()
+
+
+def _state():
+    return {
+        "active_planes":   sorted(active_planes),
+        "notified_planes": sorted(notified_planes),
+        "last_seen":       last_seen,
+        "on_ground":       on_ground_state,
+    }
+
+
+def _restore(state):
+    """Adopt the previous leader's state; on first start, seed it from positions."""
+    global active_planes, notified_planes, last_seen, on_ground_state
+    if state:
+        active_planes   = set(state.get("active_planes", []))
+        notified_planes = set(state.get("notified_planes", []))
+        last_seen       = dict(state.get("last_seen", {}))
+        on_ground_state = dict(state.get("on_ground", {}))
+        return
+    try:
+        with get_db() as conn:
+            seed_from_positions(conn)
+        print(f"Initialized state from DB: last seen {sorted(last_seen)}, in the air {sorted(active_planes)}")
+    except Exception as e:
+        print(f"Could not initialize state from DB: {e}")
+
+
+def run_cycle():
+    """check_flights, never concurrently with another cycle in this process."""
+    global _last_cycle
+    with _cycle_lock:
+        planes_info = check_flights()
+        _last_cycle = (time.time(), planes_info)
+    return planes_info
+
+
+def run_forever(stop=None):
+    """Campaign for leadership and, while leading, run a cycle every CYCLE_SECONDS."""
+    stop = stop or threading.Event()
+    try:
+        while not stop.is_set():
+            if not leadership.is_leader:
+                try:
+                    if leadership.try_acquire():
+                        print(f"✅ Ingest leader: {leadership.holder}")
+                        _restore(leadership.handed_over_state())
+                except psycopg2.Error as e:
+                    print(f"Ingest election failed: {e}")
+                    leadership.release()
+                if not leadership.is_leader:
+                    stop.wait(FOLLOWER_POLL)
+                    continue
+            planes_info = run_cycle()
+            if not leadership.heartbeat(_state(), planes_info):
+                print("⚠️ Ingest leadership lost, back to standby")
+                continue
+            stop.wait(CYCLE_SECONDS)
+    finally:
+        leadership.release()
+
+
+def leader_status():
+    """The ingest_leader row (holder, acquired_at, heartbeat_at, state, last_cycle), or None."""
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT holder, acquired_at, heartbeat_at, state, last_cycle FROM ingest_leader WHERE id = 1")
+            return cur.fetchone()
+
+
+def _check():
+    """Updates _last_cycle: runs a cycle here if this process leads or can take
+    the lock for one, otherwise takes the leader's last cycle, so a manual
+    check never runs alongside the leader."""
+    global _last_cycle
+    if leadership.is_leader:
+        run_cycle()
+        return
+    once = Leadership()
+    if once.try_acquire():
+        try:
+            _restore(once.handed_over_state())
+            once.heartbeat(_state(), run_cycle())
+        finally:
+            once.release()
+        return
+    row = leader_status()
+    _last_cycle = (row["heartbeat_at"].timestamp(), row["last_cycle"]) if row else (time.time(), [])
+
+
+def check_now():
+    """(finished_at, planes_info) for a manual check (/api/check).
+
+    Serves the last cycle if it finished within CHECK_FRESH_SECONDS. Otherwise
+    the first caller runs _check() and everyone arriving meanwhile waits for
+    that same result, so a burst of requests costs at most one cycle."""
+    global _inflight
+    finished_at, planes_info = _last_cycle
+    if time.time() - finished_at < CHECK_FRESH_SECONDS:
+        return finished_at, planes_info
+    with _inflight_lock:
+        fut = _inflight
+        owner = fut is None
+        if owner:
+            fut = _inflight = Future()
+    if owner:
+        try:
+            _check()
+            fut.set_result(_last_cycle)
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with _inflight_lock:
+                _inflight = None
+    return fut.result()
@@ -0,0 +1,35 @@
+"""
+Runs flight ingest as its own process, apart from the web tier:
+
+  python ingest_worker.py
+
+Start as many as you like (e.g. more than one Railway replica for failover).
+They elect a single leader through Postgres and the others stand by, ready to
+take over; see ingest.py. SIGTERM/SIGINT finish the current cycle and hand
+the lock back.
+"""
+
+import signal
+import threading
+
+from dotenv import load_dotenv
+
+import ingest
+
+
+def main():
+    load_dotenv()
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        print("Ingest worker stopping...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    print(f"🚀 Ingest worker {ingest.leadership.holder} started")
+    ingest.run_forever(stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Recent positions per aircraft, kept in memory for the live views.
+
+Each aircraft has a Track: a ring of the last TRACK_SIZE positions stored in
+parallel array() columns, so memory per aircraft is fixed (about 50 bytes a
+point) however long the process runs. Ingest appends to the tracks as it
+saves positions. Web processes, which usually don't run ingest, keep theirs
+current with a Follower: one incremental query every FOLLOW_SECONDS per
+process, whatever the traffic. Other pollers that must follow the database
+(cache_sync.CacheSync) ride on the same thread and connection. /live/snapshot and /live/trail answer from
+the tracks alone.
+
+Each web worker holds its own tracks and runs its own Follower, so the cost
+is per worker: about 50 bytes x LIVE_TRACK_SIZE (default 720) per aircraft
+that has flown since the process started, i.e. 36 KB an aircraft, 180 MB for
+a 5000-aircraft fleet. Lower LIVE_TRACK_SIZE (or the worker count) for large
+fleets. Every poll, the seed included, reads at most the last TRACK_SIZE
+points of each aircraft, through the (aircraft_id, ts) index.
+
+Points carry the database timestamp and a track only accepts points newer
+than its last one, so ingest and the follower can both feed the same process.
+"""
+
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+TRACK_SIZE     = int(os.getenv("LIVE_TRACK_SIZE", 720))   # 720: 5 h at one position per 25 s ingest cycle
+TRACK_SECONDS  = TRACK_SIZE * 25
+FOLLOW_SECONDS = 5
+# The follower re-reads this much before its last point, for rows committed late.
+FOLLOW_OVERLAP = 30
+
+_NaN = math.nan
+
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else _NaN
+
+
+def _val(x):
+    return None if x != x else x
+
+
+class Track:
+    """Fixed-size ring of one aircraft's recent positions."""
+
+    __slots__ = ("icao24", "tail_number", "ts", "lat", "lon", "altitude", "velocity",
+                 "heading", "on_ground", "source", "head", "count")
+
+    _sources = []   # source names, indexed by the per-point source code
+
+    def __init__(self, icao24, tail_number, size=TRACK_SIZE):
+        self.icao24      = icao24
+        self.tail_number = tail_number
+        zeros = bytes(8 * size)
+        self.ts        = array("d", zeros)
+        self.lat       = array("d", zeros)
+        self.lon       = array("d", zeros)
+        self.altitude  = array("d", zeros)
+        self.velocity  = array("d", zeros)
+        self.heading   = array("d", zeros)
+        self.on_ground = array("b", bytes(size))
+        self.source    = array("b", bytes(size))
+        self.head      = 0    # next slot to write
+        self.count     = 0
+
+    @classmethod
+    def _source_code(cls, name):
+        try:
+            return cls._sources.index(name)
+        except ValueError:
+            cls._sources.append(name)
+            return len(cls._sources) - 1
+
+    def append(self, ts, lat, lon, altitude, velocity, heading, on_ground, source):
+        """Add a point (ts in unix seconds). Returns False if it isn't newer than the last one."""
+        if self.count and ts <= self.ts[self.head - 1]:
+            return False
+        i = self.head
+        self.ts[i]        = ts
+        self.lat[i]       = _num(lat)
+        self.lon[i]       = _num(lon)
+        self.altitude[i]  = _num(altitude)
+        self.velocity[i]  = _num(velocity)
+        self.heading[i]   = _num(heading)
+        self.on_ground[i] = bool(on_ground)
+        self.source[i]    = self._source_code(source)
+        self.head  = (i + 1) % len(self.ts)
+        self.count = min(self.count + 1, len(self.ts))
+        return True
+
+    def _slots(self, since=None):
+        """Ring indices oldest to newest, optionally only points after `since`."""
+        size  = len(self.ts)
+        start = (self.head - self.count) % size
+        idx   = [(start + k) % size for k in range(self.count)]
+        if since is not None:
+            idx = [i for i in idx if self.ts[i] > since]
+        return idx
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = self.head - 1
+        return {
+            "tail_number": self.tail_number,
+            "icao24":      self.icao24,
+            "ts":          datetime.fromtimestamp(self.ts[i], timezone.utc),
+            "lat":         _val(self.lat[i]),
+            "lon":         _val(self.lon[i]),
+            "altitude":    _val(self.altitude[i]),
+            "velocity":    _val(self.velocity[i]),
+            "heading":     _val(self.heading[i]),
+            "on_ground":   bool(self.on_ground[i]),
+            "source":      self._sources[self.source[i]],
+        }
+
+    def trail(self, since):
+        """[[ts, lat, lon, altitude], ...] after `since`, oldest first, skipping points without a fix."""
+        return [
+            [datetime.fromtimestamp(self.ts[i], timezone.utc), self.lat[i], self.lon[i], _val(self.altitude[i])]
+            for i in self._slots(since) if self.lat[i] == self.lat[i]
+        ]
+
+
+_tracks = {}             # icao24 -> Track
+_lock   = threading.Lock()
+
+
+def record(icao24, tail_number, ts, lat, lon, altitude, velocity, heading, on_ground, source):
+    """Append a saved position (ts: the row's timestamp) to the aircraft's track."""
+    with _lock:
+        track = _tracks.get(icao24)
+        if track is None:
+            track = _tracks[icao24] = Track(icao24, tail_number)
+        return track.append(ts.timestamp(), lat, lon, altitude, velocity, heading, on_ground, source)
+
+
+def last_ts():
+    with _lock:
+        return max((t.ts[t.head - 1] for t in _tracks.values() if t.count), default=None)
+
+
+def snapshot():
+    """Latest position of every tracked aircraft, in the shape of get_snapshot's latest_positions."""
+    with _lock:
+        rows = [t.latest() for t in _tracks.values() if t.count]
+    return sorted(rows, key=lambda r: r["tail_number"] or "")
+
+
+def trail(minutes, icao24=None):
+    """{icao24: {tail_number, points}} for the last `minutes` minutes."""
+    since = time.time() - minutes * 60
+    with _lock:
+        tracks = [_tracks[icao24]] if icao24 in _tracks else [] if icao24 else list(_tracks.values())
+        return {t.icao24: {"tail_number": t.tail_number, "points": t.trail(since)} for t in tracks}
+
+
+def overlay(latest_positions):
+    """latest_positions with each aircraft's entry replaced by its track's newer point, if any."""
+    with _lock:
+        newer = {icao24: t.latest() for icao24, t in _tracks.items() if t.count}
+    out = []
+    for p in latest_positions:
+        live = newer.get(p["icao24"])
+        out.append(live if live and (p["ts"] is None or live["ts"] > p["ts"]) else p)
+    return out
+
+
+_FOLLOW_SQL = """
+    SELECT a.icao24, a.tail_number, p.ts, p.lat, p.lon, p.altitude, p.velocity,
+           p.heading, p.on_ground, p.source
+    FROM aircraft a
+    JOIN LATERAL (
+        SELECT ts, lat, lon, altitude, velocity, heading, on_ground, source
+        FROM positions
+        WHERE aircraft_id = a.id AND ts > %s
+        ORDER BY ts DESC
+        LIMIT %s
+    ) p ON true
+    ORDER BY p.ts
+"""
+
+
+class Follower:
+    """Feeds the tracks of a web process from the positions table, then runs
+    each of `pollers` (poll(conn) callables) on the same connection."""
+
+    def __init__(self, connect, interval=FOLLOW_SECONDS, pollers=()):
+        self.connect  = connect
+        self.interval = interval
+        self.pollers  = list(pollers)
+        self.polls    = 0
+
+    def start(self):
+        threading.Thread(target=self.run, name="live-follower", daemon=True).start()
+
+    def poll(self, conn):
+        """Read positions after the newest point held (the last TRACK_SECONDS on the first poll)."""
+        newest = last_ts()
+        if self.polls and newest is not None:
+            since = newest - FOLLOW_OVERLAP
+        else:
+            since = time.time() - TRACK_SECONDS
+        since = datetime.fromtimestamp(since, timezone.utc)
+        with conn.cursor() as cur:
+            cur.execute(_FOLLOW_SQL, (since, TRACK_SIZE))
+            added = sum(record(r["icao24"], r["tail_number"], r["ts"], r["lat"], r["lon"], r["altitude"],
+                               r["velocity"], r["heading"], r["on_ground"], r["source"])
+                        for r in cur.fetchall())
+        self.polls += 1
+        return added
+
+    def run(self):
+        conn = None
+        while True:
+            try:
+                if conn is None:
+                    conn = self.connect()
+                    conn.autocommit = True
+                self.poll(conn)
+                for poll in self.pollers:
+                    poll(conn)
+            except Exception as e:
+                print(f"Live follower: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+            time.sleep(self.interval)
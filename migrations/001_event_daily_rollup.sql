@@ -0,0 +1,25 @@
+-- Daily per-aircraft rollup of TAKEOFF/LANDING events, read by /analytics/*.
+-- Paste this in Supabase SQL Editor, then fill it once with: python rollup.py
+
+CREATE TABLE IF NOT EXISTS event_daily_rollup (
+    day         date    NOT NULL,
+    aircraft_id integer NOT NULL REFERENCES aircraft(id),
+    takeoffs    integer NOT NULL DEFAULT 0,
+    landings    integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, aircraft_id)
+);
+
+CREATE INDEX IF NOT EXISTS event_daily_rollup_aircraft_day
+    ON event_daily_rollup (aircraft_id, day);
+
+CREATE TABLE IF NOT EXISTS event_daily_destinations (
+    day         date    NOT NULL,
+    aircraft_id integer NOT NULL REFERENCES aircraft(id),
+    airport     text    NOT NULL,
+    name        text,
+    landings    integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, aircraft_id, airport)
+);
+
+CREATE INDEX IF NOT EXISTS event_daily_destinations_aircraft_day
+    ON event_daily_destinations (aircraft_id, day);
@@ -0,0 +1,32 @@
+-- Operators and watchlists used by the analytics operator_name / watchlist_id filters.
+-- Paste this in Supabase SQL Editor.
+
+CREATE TABLE IF NOT EXISTS operators (
+    id   serial PRIMARY KEY,
+    name text   NOT NULL UNIQUE
+);
+
+ALTER TABLE aircraft ADD COLUMN IF NOT EXISTS operator_id integer REFERENCES operators(id);
+
+CREATE INDEX IF NOT EXISTS aircraft_operator_id ON aircraft (operator_id);
+
+CREATE TABLE IF NOT EXISTS watchlists (
+    id   serial PRIMARY KEY,
+    name text   NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS watchlist_aircraft (
+    watchlist_id integer NOT NULL REFERENCES watchlists(id) ON DELETE CASCADE,
+    aircraft_id  integer NOT NULL REFERENCES aircraft(id)   ON DELETE CASCADE,
+    PRIMARY KEY (watchlist_id, aircraft_id)
+);
+
+CREATE INDEX IF NOT EXISTS watchlist_aircraft_aircraft ON watchlist_aircraft (aircraft_id);
+
+-- Example:
+--   INSERT INTO operators (name) VALUES ('Operator SA');
+--   UPDATE aircraft SET operator_id = (SELECT id FROM operators WHERE name = 'Operator SA')
+--    WHERE tail_number IN ('LV-FVZ', 'LV-CCO');
+--   INSERT INTO watchlists (name) VALUES ('Fleet');
+--   INSERT INTO watchlist_aircraft (watchlist_id, aircraft_id)
+--   SELECT w.id, a.id FROM watchlists w, aircraft a WHERE w.name = 'Fleet';
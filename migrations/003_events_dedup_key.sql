@@ -0,0 +1,15 @@
+-- Natural key for events: one event of a type per aircraft per UTC minute.
+-- Bulk loads and save_flight_event use it with ON CONFLICT DO NOTHING, so
+-- re-imports can't duplicate events.
+-- Paste this in Supabase SQL Editor, then refresh the rollup: python rollup.py
+
+-- Drop existing duplicates, keeping the first row written.
+DELETE FROM events e
+USING events keep
+WHERE keep.aircraft_id = e.aircraft_id
+  AND keep.type        = e.type
+  AND date_trunc('minute', keep.ts AT TIME ZONE 'UTC') = date_trunc('minute', e.ts AT TIME ZONE 'UTC')
+  AND keep.id < e.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS events_dedup_key
+    ON events (aircraft_id, type, date_trunc('minute', ts AT TIME ZONE 'UTC'));
@@ -0,0 +1,14 @@
+-- Ingest leader election (ingest.py). A single row recording which process
+-- holds the ingest advisory lock, its last heartbeat, the monitor state it
+-- hands over to the next leader, and the planes seen in its last cycle.
+-- Paste this in Supabase SQL Editor.
+
+CREATE TABLE IF NOT EXISTS ingest_leader (
+    id           integer     PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    holder       text        NOT NULL,
+    pid          integer     NOT NULL,
+    acquired_at  timestamptz NOT NULL,
+    heartbeat_at timestamptz NOT NULL,
+    state        jsonb       NOT NULL DEFAULT '{}',
+    last_cycle   jsonb       NOT NULL DEFAULT '[]'
+);
@@ -0,0 +1,36 @@
+-- Altitudes in meters for every source. Ingest used to store ADSB.one
+-- altitudes in feet (OpenSky's were already meters), both in positions.altitude
+-- and in the events' meta.altitude; this converts the existing ADSB.one rows,
+-- and nulls the "N/A" / "ground" strings older events carry in numeric fields.
+-- Stop the ingest worker, paste this in Supabase SQL Editor, then deploy.
+-- The column comment marks the conversion as done, so running it again is a no-op.
+
+DO $$
+DECLARE
+    k text;
+BEGIN
+    IF col_description('positions'::regclass,
+                       (SELECT attnum FROM pg_attribute
+                        WHERE attrelid = 'positions'::regclass AND attname = 'altitude')) = 'meters' THEN
+        RAISE NOTICE 'altitudes already in meters';
+        RETURN;
+    END IF;
+
+    UPDATE positions
+    SET altitude = round((altitude * 0.3048)::numeric, 1)
+    WHERE source = 'ADSB.one' AND altitude IS NOT NULL;
+
+    UPDATE events
+    SET meta = jsonb_set(meta, '{altitude}',
+                         to_jsonb(round((meta->>'altitude')::numeric * 0.3048, 1)))
+    WHERE meta->>'source' = 'ADSB.one'
+      AND jsonb_typeof(meta->'altitude') = 'number';
+
+    FOREACH k IN ARRAY ARRAY['altitude', 'velocity', 'lat', 'lon'] LOOP
+        UPDATE events
+        SET meta = jsonb_set(meta, ARRAY[k], 'null')
+        WHERE jsonb_typeof(meta->k) = 'string';
+    END LOOP;
+
+    COMMENT ON COLUMN positions.altitude IS 'meters';
+END $$;
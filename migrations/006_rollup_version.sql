@@ -0,0 +1,12 @@
+-- Version stamp of the daily rollup. rollup.rebuild() bumps it whenever past
+-- days are recomputed (imports, backfills); web processes poll it and drop
+-- their cached analytics when it changes (cache_sync.py).
+-- Paste this in Supabase SQL Editor.
+
+CREATE TABLE IF NOT EXISTS rollup_version (
+    id         integer     PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version    bigint      NOT NULL DEFAULT 0,
+    rebuilt_at timestamptz
+);
+
+INSERT INTO rollup_version (id) VALUES (1) ON CONFLICT DO NOTHING;
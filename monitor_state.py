@@ -0,0 +1,178 @@
+"""
+Persistent state and event history for monitor_vuelos.py.
+
+Both live in one SQLite database in WAL mode. Every change is a small
+transaction appended to the write-ahead log: marking a plane notified or
+seen is one UPSERT, recording an event is one INSERT, so the cost per event
+does not grow with the history. A crash mid-write loses at most the
+transaction in progress; the database is never left half-written.
+
+compact() trims the history to HISTORY_LIMIT, checkpoints the WAL back into
+the database, and writes plane_state.json / flight_history.json as read-only
+snapshots for inspection (tmp file + rename, so they are always complete).
+On first use, state from those legacy JSON files is imported.
+"""
+
+import json
+import os
+import sqlite3
+
+DB_FILE            = "monitor_state.db"
+LEGACY_STATE_FILE  = "plane_state.json"
+LEGACY_HISTORY     = "flight_history.json"
+HISTORY_LIMIT      = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS planes (
+    registration TEXT PRIMARY KEY,
+    notified     INTEGER NOT NULL DEFAULT 0,
+    active       INTEGER NOT NULL DEFAULT 0,
+    last_seen    REAL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    callsign  TEXT NOT NULL,
+    type      TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data      TEXT NOT NULL
+);
+"""
+
+
+def _write_json_atomic(path, obj):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class MonitorState:
+    """The monitor's plane state and last HISTORY_LIMIT events, backed by SQLite."""
+
+    def __init__(self, path=DB_FILE, snapshot_dir="."):
+        self.snapshot_dir = snapshot_dir
+        fresh = not os.path.exists(path)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        if fresh:
+            self._import_legacy()
+
+    def _snapshot_path(self, name):
+        return os.path.join(self.snapshot_dir, name)
+
+    def _import_legacy(self):
+        """One-time import of plane_state.json / flight_history.json."""
+        state, history = {}, []
+        try:
+            with open(self._snapshot_path(LEGACY_STATE_FILE)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(self._snapshot_path(LEGACY_HISTORY)) as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        notified  = set(state.get("notified_planes", []))
+        active    = set(state.get("active_planes", []))
+        last_seen = state.get("last_seen", {})
+        with self.db:
+            for reg in notified | active | set(last_seen):
+                self.db.execute(
+                    "INSERT INTO planes (registration, notified, active, last_seen) VALUES (?, ?, ?, ?)",
+                    (reg, reg in notified, reg in active, last_seen.get(reg)),
+                )
+            # The file is newest first.
+            for e in reversed(history[:HISTORY_LIMIT]):
+                self.db.execute(
+                    "INSERT INTO history (callsign, type, timestamp, data) VALUES (?, ?, ?, ?)",
+                    (e.get("callsign", ""), e.get("type", ""), e.get("timestamp", ""), json.dumps(e.get("data") or {})),
+                )
+
+    # ── State ────────────────────────────────────────────────────────────────
+
+    def load(self):
+        """(notified_planes, active_planes, last_seen) as set, set, dict."""
+        rows = self.db.execute("SELECT registration, notified, active, last_seen FROM planes").fetchall()
+        return (
+            {r[0] for r in rows if r[1]},
+            {r[0] for r in rows if r[2]},
+            {r[0]: r[3] for r in rows if r[3] is not None},
+        )
+
+    def _upsert(self, registration, column, value):
+        self.db.execute(f"""
+            INSERT INTO planes (registration, {column}) VALUES (?, ?)
+            ON CONFLICT (registration) DO UPDATE SET {column} = excluded.{column}
+        """, (registration, value))
+
+    def mark_notified(self, registration):
+        with self.db:
+            self._upsert(registration, "notified", 1)
+
+    def seen(self, registration, ts):
+        with self.db:
+            self._upsert(registration, "last_seen", ts)
+
+    def landed(self, registration):
+        """Clear notified/last_seen after a landing."""
+        with self.db:
+            self.db.execute("UPDATE planes SET notified = 0, last_seen = NULL WHERE registration = ?", (registration,))
+
+    def set_active(self, registrations):
+        """Make `registrations` the set of planes in the air; only changed rows are written."""
+        registrations = set(registrations)
+        current = {r[0] for r in self.db.execute("SELECT registration FROM planes WHERE active = 1")}
+        if current == registrations:
+            return
+        with self.db:
+            for reg in current - registrations:
+                self._upsert(reg, "active", 0)
+            for reg in registrations - current:
+                self._upsert(reg, "active", 1)
+
+    # ── History ──────────────────────────────────────────────────────────────
+
+    def append_event(self, event):
+        with self.db:
+            self.db.execute(
+                "INSERT INTO history (callsign, type, timestamp, data) VALUES (?, ?, ?, ?)",
+                (event["callsign"], event["type"], event["timestamp"], json.dumps(event.get("data") or {})),
+            )
+
+    def history(self, limit=HISTORY_LIMIT):
+        """Most recent events first, in the flight_history.json format."""
+        return [
+            {"callsign": r[0], "type": r[1], "timestamp": r[2], "data": json.loads(r[3])}
+            for r in self.db.execute(
+                "SELECT callsign, type, timestamp, data FROM history ORDER BY id DESC LIMIT ?", (limit,)
+            )
+        ]
+
+    # ── Maintenance ──────────────────────────────────────────────────────────
+
+    def compact(self):
+        """Trim history, fold the WAL into the database and refresh the JSON snapshots."""
+        with self.db:
+            self.db.execute("""
+                DELETE FROM history
+                WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)
+            """, (HISTORY_LIMIT,))
+        self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        notified, active, last_seen = self.load()
+        _write_json_atomic(self._snapshot_path(LEGACY_STATE_FILE), {
+            "notified_planes": sorted(notified),
+            "active_planes":   sorted(active),
+            "last_seen":       last_seen,
+        })
+        _write_json_atomic(self._snapshot_path(LEGACY_HISTORY), self.history())
+
+    def close(self):
+        self.db.close()
+
@@ -1,11 +1,13 @@
 import requests
+import sqlite3
 import time
 import os
-import json
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 from math import radians, cos, sin, asin, sqrt, atan2, degrees
 
+from monitor_state import MonitorState
+
 load_dotenv()
 
 ARGENTINA_TZ = timezone(timedelta(hours=-3))
@@ -21,58 +23,35 @@ PLANES = {
 active_planes = set()
 notified_planes = set()
 last_seen = {}
-STATE_FILE = "plane_state.json"
-HISTORY_FILE = "flight_history.json"
+state = None
 LANDING_GRACE_PERIOD = 600
+# Trim history, checkpoint the WAL and refresh the JSON snapshots every N cycles.
+COMPACT_EVERY = 12
 
 def load_state():
-    global notified_planes, active_planes, last_seen
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                state = json.load(f)
-                notified_planes = set(state.get('notified_planes', []))
-                active_planes = set(state.get('active_planes', []))
-                last_seen = state.get('last_seen', {})
-        except:
-            notified_planes = set()
-            active_planes = set()
-            last_seen = {}
-
-def save_state():
+    global notified_planes, active_planes, last_seen, state
+    state = MonitorState()
+    notified_planes, active_planes, last_seen = state.load()
+
+def save_state(write, *args):
+    """Run one MonitorState write; a failed write is logged and the monitor carries on."""
     try:
-        with open(STATE_FILE, 'w') as f:
-            json.dump({
-                'notified_planes': list(notified_planes),
-                'active_planes': list(active_planes),
-                'last_seen': last_seen
-            }, f, indent=2)
-    except Exception as e:
+        write(*args)
+    except (sqlite3.Error, OSError) as e:
         print(f"Error guardando estado: {e}")
 
 def load_history():
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    return state.history()
 
 def save_flight_event(callsign, event_type, data=None):
-    history = load_history()
     event = {
         "callsign": callsign,
         "type": event_type,
         "timestamp": datetime.now(ARGENTINA_TZ).isoformat(),
         "data": data or {}
     }
-    history.insert(0, event)
-    history = history[:100]
-
     try:
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+        state.append_event(event)
     except Exception as e:
         print(f"Error guardando historial: {e}")
 
@@ -161,6 +140,7 @@ def check_flights():
             currently_flying.add(registration)
             plane_data = opensky_results[icao24]
             last_seen[registration] = current_timestamp
+            save_state(state.seen, registration, current_timestamp)
 
             if registration not in active_planes:
                 altitude_unit = "m"
@@ -200,7 +180,7 @@ def check_flights():
 
                 notify_telegram(msg)
                 notified_planes.add(registration)
-                save_state()
+                save_state(state.mark_notified, registration)
 
                 save_flight_event(registration, "in_progress" if is_in_progress else "takeoff", {
                     "icao24": icao24,
@@ -231,9 +211,10 @@ def check_flights():
             notified_planes.remove(plane)
         if plane in last_seen:
             del last_seen[plane]
+        save_state(state.landed, plane)
 
     active_planes = currently_flying
-    save_state()
+    save_state(state.set_active, active_planes)
     print(f"{now_arg.strftime('%Y-%m-%d %H:%M:%S %Z')} - Verificación completada. Aviones en vuelo: {len(currently_flying)}")
 
 def main():
@@ -243,14 +224,21 @@ def main():
     print(f"Estado cargado. Aviones previamente notificados: {notified_planes}")
     print("Presiona Ctrl+C para detener el monitoreo\n")
 
+    cycles = 0
     try:
         while True:
             check_flights()
+            cycles += 1
+            if cycles % COMPACT_EVERY == 0:
+                save_state(state.compact)
             time.sleep(300)
     except KeyboardInterrupt:
         print("\nMonitoreo detenido por el usuario.")
     except Exception as e:
         print(f"Error fatal: {e}")
+    finally:
+        state.compact()
+        state.close()
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,15 @@
 """
 Parses a Telegram chat (JSON export OR plain text paste) from the flight monitor bot
-and generates import_telegram.sql ready to paste in Supabase SQL Editor.
+and loads the events into the database (DATABASE_URL) through bulk_load. Running
+it again on the same export inserts nothing new.
+
+The export is read incrementally: messages are yielded one at a time from
+either format and go straight to the loader, so memory stays flat no matter
+how large the file is. With --workers N the regex extraction runs in a
+process pool, a bounded number of batches at a time.
 
 Usage:
-  python parse_telegram.py [input_file]
+  python parse_telegram.py [input_file] [--workers N] [--dry-run]
 
 Accepts:
   - telegram_export.json  (Telegram Desktop JSON export)
@@ -12,12 +18,21 @@ Accepts:
 Default: tries telegram_export.txt, then telegram_export.json
 """
 
+import argparse
 import json
+import multiprocessing
+import os
 import re
-import sys
+import time
+from collections import deque
 from datetime import datetime, timezone
+from itertools import islice
+
+import psycopg2
+from dotenv import load_dotenv
 
-OUTPUT_FILE = "import_telegram.sql"
+from bulk_load import BulkLoader
+from position import M_PER_FT
 
 PLANES = {
     "LV-FVZ": "e0659a",
@@ -31,9 +46,16 @@ PLANES = {
 TAIL_RE  = re.compile(r'\b(LV-[A-Z]{3})\b')
 # Timestamp line like: 🕐 2025-11-15 14:30:22
 TIME_RE  = re.compile(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})')
-ALT_RE   = re.compile(r'Altitud:\s*([\d.]+)')
+# "Altitud: 35000 ft"; older messages have no unit (meters for OpenSky, feet for ADSB.one)
+ALT_RE   = re.compile(r'Altitud:\s*([\d.]+)\s*(m|ft)?\b')
 VEL_RE   = re.compile(r'Velocidad:\s*([\d.]+)')
 SRC_RE   = re.compile(r'Fuente:\s*(\S+)')
+POS_RE   = re.compile(r'Posición:\s*(-?[\d.]+),\s*(-?[\d.]+)')
+# Plain-text paste header line like: Monitor de Vuelos, [31/12/2025 17:29]
+HEADER_RE = re.compile(r'^.+,\s*\[\d+/\d+/\d{4}\s+\d+:\d+\]$')
+
+READ_SIZE  = 1 << 20
+BATCH_SIZE = 2000
 
 
 def get_text(msg):
@@ -75,116 +97,211 @@ def parse_timestamp(text, msg_date):
         return None
 
 
-def escape(s):
-    return s.replace("'", "''")
-
-
-def load_messages(path):
-    """Return list of {text, date} dicts regardless of input format."""
+class _JSONReader:
+    """Pulls JSON values one at a time out of a file read in READ_SIZE pieces."""
+
+    _WS = re.compile(r'\s*')
+
+    def __init__(self, f):
+        self.f       = f
+        self.buf     = ""
+        self.pos     = 0
+        self.eof     = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ("" at end of file)."""
+        while True:
+            self.pos = self._WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+    def skip(self, ch):
+        if self.peek() == ch:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value cut off by the end of the buffer: read more and retry.
+                if self._fill():
+                    continue
+                raise
+            # A number ending exactly at the buffer end may continue in the next piece.
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_messages(f):
+    """{text, date} for each message of a Telegram Desktop JSON export."""
+    r = _JSONReader(f)
+    r.expect("{")
+    while not r.skip("}"):
+        key = r.value()
+        r.expect(":")
+        if key != "messages":
+            r.value()
+        else:
+            r.expect("[")
+            while not r.skip("]"):
+                m = r.value()
+                if m.get("type") == "message":
+                    yield {"text": get_text(m), "date": m.get("date", "")}
+                r.skip(",")
+        r.skip(",")
+
+
+def iter_text_messages(f):
+    """{text, date} for each message of a plain-text paste, split on the header lines."""
+    lines = []
+    for line in f:
+        if HEADER_RE.match(line.rstrip("\n")):
+            text = "".join(lines).strip()
+            if text:
+                yield {"text": text, "date": ""}
+            lines = []
+        else:
+            lines.append(line)
+    text = "".join(lines).strip()
+    if text:
+        yield {"text": text, "date": ""}
+
+
+def iter_messages(path):
+    """Yield {text, date} dicts one at a time, regardless of input format."""
     with open(path, encoding="utf-8") as f:
-        raw = f.read()
-
-    # Try JSON first
-    if raw.lstrip().startswith("{"):
-        data = json.loads(raw)
-        out = []
-        for m in data.get("messages", []):
-            if m.get("type") == "message":
-                out.append({"text": get_text(m), "date": m.get("date", "")})
-        return out
-
-    # Plain text: split by Telegram header lines like "Monitor de Vuelos, [31/12/2025 17:29]"
-    parts = re.split(r'^.+,\s*\[\d+/\d+/\d{4}\s+\d+:\d+\]\n', raw, flags=re.MULTILINE)
-    return [{"text": c.strip(), "date": ""} for c in parts if c.strip()]
+        head = f.read(READ_SIZE)
+        is_json = head.lstrip().startswith("{")
+        f.seek(0)
+        yield from (iter_json_messages(f) if is_json else iter_text_messages(f))
+
+
+def parse_message(msg):
+    """("event", (icao24, ts, type, meta)), ("skipped", None) for a flight message
+    without a known tail/timestamp, or ("ignored", None) for anything else."""
+    text = msg["text"]
+    if not text:
+        return "ignored", None
+
+    event_type = detect_event(text)
+    if not event_type:
+        return "ignored", None
+
+    tails = TAIL_RE.findall(text)
+    icao24 = PLANES.get(tails[0]) if tails else None
+    if not icao24:
+        return "skipped", None
+
+    ts = parse_timestamp(text, msg.get("date", ""))
+    if not ts:
+        return "skipped", None
+
+    # Extract optional metadata
+    alt = ALT_RE.search(text)
+    vel = VEL_RE.search(text)
+    src = SRC_RE.search(text)
+    pos = POS_RE.search(text)
+    meta = {
+        "source": src.group(1) if src else "telegram-history",
+    }
+    if alt:
+        unit = alt.group(2) or ("ft" if meta["source"] == "ADSB.one" else "m")
+        meta["altitude"] = round(float(alt.group(1)) * (M_PER_FT if unit == "ft" else 1), 1)   # meters
+    if vel:
+        meta["velocity"] = float(vel.group(1))
+    if pos:
+        meta["lat"], meta["lon"] = float(pos.group(1)), float(pos.group(2))
+    return "event", (icao24, ts, event_type, meta)
+
+
+def parse_messages(messages, workers=1):
+    """parse_message over a message stream, in order; with workers > 1 in a
+    process pool, keeping at most a few batches in flight."""
+    if workers <= 1:
+        yield from map(parse_message, messages)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        while True:
+            batch = list(islice(messages, BATCH_SIZE))
+            if batch:
+                pending.append(pool.map_async(parse_message, batch, chunksize=max(1, BATCH_SIZE // workers)))
+            if pending and (not batch or len(pending) > workers):
+                yield from pending.popleft().get()
+            if not batch and not pending:
+                return
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input_file", nargs="?")
+    parser.add_argument("--workers", type=int, default=1, help="processes for regex extraction")
+    parser.add_argument("--dry-run", action="store_true", help="parse and count, don't load")
+    args = parser.parse_args()
+
     # Determine input file
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
-    elif __import__("os").path.exists("telegram_export.txt"):
+    if args.input_file:
+        input_file = args.input_file
+    elif os.path.exists("telegram_export.txt"):
         input_file = "telegram_export.txt"
-    elif __import__("os").path.exists("telegram_export.json"):
+    elif os.path.exists("telegram_export.json"):
         input_file = "telegram_export.json"
     else:
         print("No input file found.")
         print("Save copied Telegram messages as telegram_export.txt in this folder.")
         return
-
-    try:
-        messages = load_messages(input_file)
-    except FileNotFoundError:
+    if not os.path.exists(input_file):
         print(f"File not found: {input_file}")
         return
 
-    print(f"Loaded {len(messages)} message chunks from {input_file}")
-
-    rows = []
-    skipped = 0
-
-    for msg in messages:
-        if "type" in msg and msg["type"] != "message":
-            continue
-
-        text = get_text(msg)
-        if not text:
-            continue
-
-        event_type = detect_event(text)
-        if not event_type:
-            continue
-
-        tails = TAIL_RE.findall(text)
-        if not tails:
-            skipped += 1
-            continue
-
-        tail = tails[0]
-        icao24 = PLANES.get(tail)
-        if not icao24:
-            skipped += 1
-            continue
-
-        ts = parse_timestamp(text, msg.get("date", ""))
-        if not ts:
-            skipped += 1
-            continue
-
-        # Extract optional metadata
-        alt = ALT_RE.search(text)
-        vel = VEL_RE.search(text)
-        src = SRC_RE.search(text)
-        meta = {
-            "source": src.group(1) if src else "telegram-history",
-        }
-        if alt:
-            meta["altitude"] = float(alt.group(1))
-        if vel:
-            meta["velocity"] = float(vel.group(1))
-
-        meta_json = escape(json.dumps(meta))
-        ts_iso    = ts.isoformat()
-
-        rows.append(
-            f"((SELECT id FROM aircraft WHERE icao24 = '{icao24}'), "
-            f"'{ts_iso}', '{event_type}', '{meta_json}'::jsonb)"
-        )
-
-    print(f"Parsed {len(rows)} events ({skipped} skipped — no tail/timestamp)")
-
-    if not rows:
+    t0 = time.perf_counter()
+    counts = {"event": 0, "skipped": 0, "ignored": 0}
+    loader = None
+    load_dotenv()
+    conn = None if args.dry_run else psycopg2.connect(os.getenv("DATABASE_URL"))
+    try:
+        if conn:
+            loader = BulkLoader(conn)
+        for status, event in parse_messages(iter_messages(input_file), args.workers):
+            counts[status] += 1
+            if event and loader:
+                loader.add(*event)
+        inserted = loader.finish() if loader else 0
+    finally:
+        if conn:
+            conn.close()
+
+    total = sum(counts.values())
+    print(f"Read {total} message chunks from {input_file} in {time.perf_counter() - t0:.1f}s")
+    print(f"Parsed {counts['event']} events ({counts['skipped']} skipped — no tail/timestamp)")
+    if not counts["event"]:
         print("No events found. Check that the export is from the flight monitor bot.")
-        return
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write("-- Auto-generated by parse_telegram.py\n")
-        f.write("-- Paste this in Supabase SQL Editor\n\n")
-        f.write("INSERT INTO events (aircraft_id, ts, type, meta)\nVALUES\n")
-        f.write(",\n".join(rows))
-        f.write("\nON CONFLICT DO NOTHING;\n")
-
-    print(f"Done. {len(rows)} rows written to {OUTPUT_FILE}")
-    print(f"Paste {OUTPUT_FILE} into Supabase SQL Editor to import.")
+    elif loader:
+        print(f"Done. {inserted} new events loaded ({counts['event'] - inserted - loader.unknown} already in the "
+              f"database{f', {loader.unknown} for unknown aircraft' if loader.unknown else ''}).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+Typed position reports, built once at the source boundary.
+
+from_opensky() and from_adsb_one() turn a raw source record into a Position
+with canonical units (altitude in meters, speed in km/h, vertical rate in
+ft/min) and None for anything the source didn't report, so the ingest loop
+never re-checks types or "N/A" strings. These are the units stored in
+positions and event meta (see migrations/005_altitude_meters.sql).
+"""
+
+M_PER_FT     = 0.3048
+KMH_PER_KT   = 1.852
+KMH_PER_MS   = 3.6
+FPM_PER_MS   = 196.85
+
+# Below 500 ft, or below 1000 ft and 80 km/h, a plane is on the ground (ADSB.one
+# doesn't reliably report on_ground) and not taking off.
+GROUND_ALT_M   = 500 * M_PER_FT
+TAXI_ALT_M     = 1000 * M_PER_FT
+TAXI_SPEED_KMH = 80
+
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+
+
+class Position:
+    """One aircraft's report from one source."""
+
+    __slots__ = ("icao24", "callsign", "source", "lat", "lon", "altitude_m", "velocity_kmh",
+                 "heading", "vertical_rate_fpm", "squawk", "on_ground", "country")
+
+    def __init__(self, icao24, callsign, source, lat=None, lon=None, altitude_m=None, velocity_kmh=None,
+                 heading=None, vertical_rate_fpm=None, squawk=None, on_ground=False, country=None):
+        self.icao24            = icao24
+        self.callsign          = callsign
+        self.source            = source
+        self.lat               = lat
+        self.lon               = lon
+        self.altitude_m        = altitude_m
+        self.velocity_kmh      = velocity_kmh
+        self.heading           = heading
+        self.vertical_rate_fpm = vertical_rate_fpm
+        self.squawk            = squawk
+        self.on_ground         = on_ground
+        self.country           = country
+
+    @property
+    def has_fix(self):
+        return self.lat is not None and self.lon is not None
+
+    @property
+    def airborne(self):
+        """Above 500 ft or faster than taxiing speed."""
+        return ((self.altitude_m is not None and self.altitude_m > GROUND_ALT_M)
+                or (self.velocity_kmh is not None and self.velocity_kmh > TAXI_SPEED_KMH))
+
+    def to_dict(self):
+        """The /api/check shape (null when missing)."""
+        return {
+            "icao24":    self.icao24,
+            "callsign":  self.callsign,
+            "altitude":  self.altitude_m,
+            "velocity":  self.velocity_kmh,
+            "country":   self.country,
+            "lat":       self.lat,
+            "lon":       self.lon,
+            "heading":   self.heading,
+            "baro_rate": self.vertical_rate_fpm,
+            "squawk":    self.squawk,
+            "on_ground": self.on_ground,
+            "source":    self.source,
+        }
+
+
+def from_opensky(state):
+    """Position from an OpenSky /states/all state vector."""
+    vertical_ms = _num(state[11])
+    return Position(
+        icao24            = state[0].lower(),
+        callsign          = state[1].strip() if state[1] else "",
+        source            = "OpenSky",
+        lat               = _num(state[6]),
+        lon               = _num(state[5]),
+        altitude_m        = _num(state[13]),
+        velocity_kmh      = round(state[9] * KMH_PER_MS, 1) if _num(state[9]) is not None else None,
+        heading           = _num(state[10]),
+        vertical_rate_fpm = round(vertical_ms * FPM_PER_MS) if vertical_ms else None,
+        squawk            = state[14] if len(state) > 14 and state[14] else None,
+        on_ground         = bool(state[8]),
+        country           = state[2] or None,
+    )
+
+
+def from_adsb_one(aircraft):
+    """Position from an ADSB.one /v2/hex aircraft record. alt_baro may be the string "ground"."""
+    alt_ft = aircraft.get("alt_baro")
+    gs_kt  = _num(aircraft.get("gs"))
+    baro_fpm = _num(aircraft.get("baro_rate"))
+    altitude_m   = round(_num(alt_ft) * M_PER_FT, 1) if _num(alt_ft) is not None else None
+    velocity_kmh = round(gs_kt * KMH_PER_KT, 1) if gs_kt else None
+    if alt_ft == "ground":
+        on_ground = True
+    elif altitude_m is not None and velocity_kmh is not None:
+        on_ground = altitude_m < TAXI_ALT_M and velocity_kmh < TAXI_SPEED_KMH
+    else:
+        on_ground = altitude_m is not None and altitude_m < GROUND_ALT_M
+    return Position(
+        icao24            = aircraft.get("hex", "").lower(),
+        callsign          = (aircraft.get("flight") or "").strip() or aircraft.get("r", ""),
+        source            = "ADSB.one",
+        lat               = _num(aircraft.get("lat")),
+        lon               = _num(aircraft.get("lon")),
+        altitude_m        = altitude_m,
+        velocity_kmh      = velocity_kmh,
+        heading           = _num(aircraft.get("track")),
+        vertical_rate_fpm = round(baro_fpm) if baro_fpm is not None else None,
+        squawk            = aircraft.get("squawk") or None,
+        on_ground         = on_ground,
+    )
@@ -0,0 +1,55 @@
+"""
+Recording of the raw OpenSky / ADSB.one responses ingest receives, for
+bench/ingest_replay.py.
+
+With INGEST_RECORD_DIR set, every response check_opensky and check_adsb_one
+get is appended to <dir>/YYYYMMDD-HH.jsonl.gz (UTC hour of the request), one
+JSON object per line: {"t": unix time, "url", "status", "body"}. Bodies are
+kept verbatim. A full OpenSky /states/all is a megabyte or two, about 50 MB an
+hour compressed, so record for a few hours or days, not permanently.
+
+Each write is its own gzip member, closed right away: a worker killed
+mid-cycle leaves readable files.
+"""
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+RECORD_DIR = os.getenv("INGEST_RECORD_DIR")
+
+_lock = threading.Lock()
+
+
+def record(t, url, status, body):
+    if not RECORD_DIR:
+        return
+    line = json.dumps({"t": t, "url": url, "status": status, "body": body}, ensure_ascii=False) + "\n"
+    path = os.path.join(RECORD_DIR, datetime.fromtimestamp(t, timezone.utc).strftime("%Y%m%d-%H.jsonl.gz"))
+    try:
+        with _lock:
+            os.makedirs(RECORD_DIR, exist_ok=True)
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        print(f"Recorder: {e}")
+
+
+def read(paths):
+    """Recorded responses from files and/or directories, oldest file first."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in os.listdir(path) if name.endswith(".jsonl.gz")]
+        else:
+            files.append(path)
+    for path in sorted(files, key=os.path.basename):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+            except EOFError:   # truncated last member
+                pass
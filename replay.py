@@ -0,0 +1,391 @@
+"""
+Flight replay for /replay/flight.
+
+A flight is the latest TAKEOFF (velocity > 100) with its LANDING, if any,
+within 12 hours. Two modes:
+
+recorded     the positions stored for the flight, resampled to a uniform
+             step. Lat/lon/altitude/velocity are interpolated linearly,
+             longitude and heading on their unwrapped values so crossing
+             ±180° / 360° does not spin the plane. Stretches without fixes
+             (takeoff → first fix, holes longer than GAP_SECONDS, last fix →
+             destination) are filled with the great-circle path between the
+             surrounding known points.
+synthesized  no recorded data: a great circle from the home base to the
+             airport whose distance best matches velocity × duration, with
+             a climb/cruise/descent altitude profile. Also the fallback when
+             a flight has no positions.
+
+Everything is computed as NumPy arrays; the airport distances from the home
+base are computed once per process, and finished replays are kept in a small
+LRU keyed by flight.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+import airports
+from airports import EARTH_RADIUS_KM
+
+# Buenos Aires Aeroparque, home base for the whole fleet.
+ORIGIN_ICAO = "SABE"
+ORIGIN_LAT, ORIGIN_LON = -34.5592, -58.4156
+# Airports this close to the origin are never picked as destination.
+MIN_DESTINATION_KM = 20
+MAX_CACHED_FLIGHTS = 256
+
+MODES = ("recorded", "synthesized")
+RESAMPLE_STEP_SECONDS = 30
+MAX_STEPS             = 2000   # the step is widened for longer flights
+# Fixes further apart than this are bridged with the great-circle path.
+GAP_SECONDS           = 300
+# Synthesized flights without a recorded cruise altitude.
+DEFAULT_CRUISE_M      = 3048   # 10,000 ft
+
+_FLIGHT_QUERY = """
+    SELECT
+        t.ts         AS takeoff_ts,
+        l.ts         AS landing_ts,
+        t.aircraft_id,
+        t.meta       AS takeoff_meta,
+        l.meta       AS landing_meta,
+        a.icao24,
+        a.tail_number,
+        (t.meta->>'altitude')::float  AS cruise_alt_m,
+        (t.meta->>'velocity')::float  AS velocity_kmh
+    FROM events t
+    JOIN aircraft a ON a.id = t.aircraft_id
+    LEFT JOIN LATERAL (
+        SELECT l2.ts, l2.meta FROM events l2
+        WHERE l2.aircraft_id = t.aircraft_id
+          AND l2.type = 'LANDING'
+          AND l2.ts > t.ts
+          AND l2.ts < t.ts + INTERVAL '12 hours'
+        ORDER BY l2.ts ASC LIMIT 1
+    ) l ON true
+    WHERE t.type = 'TAKEOFF'
+      AND (t.meta->>'velocity')::float > 100
+"""
+
+_replays     = OrderedDict()   # (mode, step, icao24, takeoff_ts, landing_ts) -> response dict
+_replay_lock = threading.Lock()
+_origin_distances = None       # km from the origin to every airport, AIRPORTS order
+
+
+def haversine_np(lat1, lon1, lat2, lon2):
+    """Vectorized airports.haversine (degrees in, km out)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+
+def gc_points(lat1, lon1, lat2, lon2, n=80):
+    """n great-circle waypoints between two coordinates, as (lats, lons) arrays."""
+    φ1, λ1, φ2, λ2 = np.radians([lat1, lon1, lat2, lon2])
+    d = 2 * np.arcsin(np.sqrt(
+        np.sin((φ2 - φ1) / 2) ** 2 + np.cos(φ1) * np.cos(φ2) * np.sin((λ2 - λ1) / 2) ** 2
+    ))
+    if d < 1e-9:
+        return np.full(n, float(lat1)), np.full(n, float(lon1))
+    f = np.arange(n) / (n - 1)
+    A = np.sin((1 - f) * d) / np.sin(d)
+    B = np.sin(f * d) / np.sin(d)
+    x = A * np.cos(φ1) * np.cos(λ1) + B * np.cos(φ2) * np.cos(λ2)
+    y = A * np.cos(φ1) * np.sin(λ1) + B * np.cos(φ2) * np.sin(λ2)
+    z = A * np.sin(φ1) + B * np.sin(φ2)
+    return np.degrees(np.arctan2(z, np.sqrt(x ** 2 + y ** 2))), np.degrees(np.arctan2(y, x))
+
+
+def bearing_np(lat1, lon1, lat2, lon2):
+    """Vectorized initial great-circle bearing, degrees in [0, 360)."""
+    φ1, φ2 = np.radians(lat1), np.radians(lat2)
+    dλ = np.radians(lon2) - np.radians(lon1)
+    x = np.sin(dλ) * np.cos(φ2)
+    y = np.cos(φ1) * np.sin(φ2) - np.sin(φ1) * np.cos(φ2) * np.cos(dλ)
+    return (np.degrees(np.arctan2(x, y)) + 360) % 360
+
+
+def bearings(lats, lons):
+    """Initial bearing from each point to the next; the last point gets the bearing to itself (0)."""
+    return bearing_np(lats, lons, np.append(lats[1:], lats[-1:]), np.append(lons[1:], lons[-1:]))
+
+
+def _unit(lats, lons):
+    φ, λ = np.radians(lats), np.radians(lons)
+    return np.stack([np.cos(φ) * np.cos(λ), np.cos(φ) * np.sin(λ), np.sin(φ)], axis=-1)
+
+
+def _slerp(lat1, lon1, lat2, lon2, f):
+    """Points at fraction f along the great circles between paired coordinates."""
+    p, q = _unit(lat1, lon1), _unit(lat2, lon2)
+    ω  = np.arccos(np.clip((p * q).sum(axis=-1), -1.0, 1.0))
+    sω = np.sin(ω)
+    short = sω < 1e-12
+    A = np.where(short, 1 - f, np.sin((1 - f) * ω) / np.where(short, 1.0, sω))
+    B = np.where(short, f,     np.sin(f * ω)       / np.where(short, 1.0, sω))
+    v = A[:, None] * p + B[:, None] * q
+    return (np.degrees(np.arctan2(v[:, 2], np.hypot(v[:, 0], v[:, 1]))),
+            np.degrees(np.arctan2(v[:, 1], v[:, 0])))
+
+
+def alt_profile(n, cruise_m):
+    """Smooth climb → cruise → descend profile, never below 300 ft (91 m)."""
+    f = np.arange(n) / (n - 1)
+    alts = np.select([f < 0.2, f > 0.8], [cruise_m * (f / 0.2), cruise_m * ((1 - f) / 0.2)], cruise_m)
+    return np.maximum(91, alts)
+
+
+def _distances_from_origin():
+    global _origin_distances
+    table = airports.AIRPORTS
+    if _origin_distances is None or len(_origin_distances) != len(table):
+        lats = np.frombuffer(table.lat, dtype=np.float64)
+        lons = np.frombuffer(table.lon, dtype=np.float64)
+        _origin_distances = haversine_np(ORIGIN_LAT, ORIGIN_LON, lats, lons)
+    return _origin_distances
+
+
+def guess_destination(dist_km):
+    """(lat, lon, code, name) of the airport whose distance from the origin is closest to dist_km."""
+    dists = _distances_from_origin()
+    diff  = np.where(dists > MIN_DESTINATION_KM, np.abs(dists - dist_km), np.inf)
+    _, iata, name, lat, lon = airports.AIRPORTS[int(np.argmin(diff))]
+    return lat, lon, iata, name
+
+
+def _synthesize(ev):
+    takeoff_ts   = ev["takeoff_ts"]
+    landing_ts   = ev["landing_ts"]
+    tail         = ev["tail_number"]
+    icao_str     = ev["icao24"]
+    velocity_kmh = float(ev["velocity_kmh"] or 600)
+    cruise_m     = float(ev["cruise_alt_m"] or DEFAULT_CRUISE_M)
+
+    duration_s = (landing_ts - takeoff_ts).total_seconds() if landing_ts else 3600  # fallback: 1h
+    dist_km    = velocity_kmh * (duration_s / 3600)
+    dest_lat, dest_lon, dest_iata, dest_name = guess_destination(dist_km)
+
+    N     = min(max(int(duration_s / 30), 40), 120)   # ~1 step per 30s, 40-120 steps
+    lats, lons = gc_points(ORIGIN_LAT, ORIGIN_LON, dest_lat, dest_lon, N)
+    hdgs  = bearings(lats, lons).tolist()
+    alts  = alt_profile(N, cruise_m).tolist()
+    lats, lons = lats.tolist(), lons.tolist()
+    dt    = duration_s / (N - 1)
+    velocity = round(velocity_kmh)
+
+    steps = []
+    for i in range(N):
+        ts_iso = (takeoff_ts + timedelta(seconds=i * dt)).isoformat()
+        steps.append({
+            "ts": ts_iso,
+            "fleet_kpis": {"in_air": 1, "on_ground": 4, "seen_last_15m": 1, "events_last_hour": 0},
+            "latest_positions": [{
+                "tail_number": tail,
+                "icao24":      icao_str,
+                "ts":          ts_iso,
+                "lat":         round(lats[i], 6),
+                "lon":         round(lons[i], 6),
+                "altitude":    round(alts[i]),
+                "velocity":    velocity,
+                "heading":     round(hdgs[i], 1),
+                "on_ground":   i == 0 or i == N - 1,
+                "source":      "synthesized",
+            }],
+            "last_50_events": [],
+        })
+
+    return {
+        "tail_number":   tail,
+        "icao24":        icao_str,
+        "mode":          "synthesized",
+        "origin":        ORIGIN_ICAO,
+        "destination":   dest_iata,
+        "destination_name": dest_name,
+        "duration_min":  round(duration_s / 60, 1),
+        "distance_km":   round(dist_km),
+        "steps":         steps,
+    }
+
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _anchors(ev, fixes, t0, t1):
+    """Known points of the flight as parallel arrays: the origin at takeoff,
+    the recorded fixes and, when the landing's airport is known, the
+    destination at landing."""
+    takeoff_meta = ev["takeoff_meta"] or {}
+    landing_meta = ev["landing_meta"] or {}
+
+    origin_lat, origin_lon = _number(takeoff_meta.get("lat")), _number(takeoff_meta.get("lon"))
+    if origin_lat is None or origin_lon is None:
+        origin_lat, origin_lon = ORIGIN_LAT, ORIGIN_LON
+    destination = airports.airport_by_code(landing_meta.get("destination_airport")) if ev["landing_ts"] else None
+
+    n = len(fixes) + 1 + (destination is not None)
+    a = {
+        "t":         np.empty(n), "lat": np.empty(n), "lon": np.empty(n),
+        "alt":       np.zeros(n), "vel": np.zeros(n), "hdg": np.full(n, np.nan),
+        "on_ground": np.zeros(n, dtype=bool), "source": [None] * n,
+        "recorded":  np.zeros(n, dtype=bool),
+    }
+    a["t"][0], a["lat"][0], a["lon"][0], a["on_ground"][0] = t0, origin_lat, origin_lon, True
+    for i, f in enumerate(fixes, start=1):
+        a["t"][i]   = f["ts"].timestamp()
+        a["lat"][i] = f["lat"]
+        a["lon"][i] = f["lon"]
+        a["alt"][i] = f["altitude"] or 0
+        a["vel"][i] = f["velocity"] or 0
+        a["hdg"][i] = np.nan if f["heading"] is None else f["heading"]
+        a["on_ground"][i] = bool(f["on_ground"])
+        a["source"][i]    = f["source"]
+        a["recorded"][i]  = True
+    if destination is not None:
+        a["t"][-1], a["lat"][-1], a["lon"][-1], a["on_ground"][-1] = t1, destination[3], destination[4], True
+
+    # Fixes without a heading point at the next known point.
+    missing = np.isnan(a["hdg"])
+    a["hdg"][missing] = bearings(a["lat"], a["lon"])[missing]
+    return a, takeoff_meta.get("origin_airport") or ORIGIN_ICAO, destination
+
+
+def resample(a, t0, t1, step_s):
+    """Sample anchor arrays every step_s seconds over [t0, t1].
+    Returns per-sample arrays plus the index of the nearest anchor and a gap mask."""
+    n  = int((t1 - t0) // step_s) + 1
+    ts = t0 + np.arange(n) * step_s
+
+    # Bracketing anchors; past the last anchor the position is held.
+    right = np.clip(np.searchsorted(a["t"], ts, side="right"), 1, len(a["t"]) - 1)
+    left  = right - 1
+    span  = a["t"][right] - a["t"][left]
+    f     = np.clip((ts - a["t"][left]) / np.where(span > 0, span, 1.0), 0.0, 1.0)
+    gap   = (span > GAP_SECONDS) | ~a["recorded"][left] | ~a["recorded"][right]
+
+    # Recorded stretches: linear on unwrapped longitude and heading.
+    lon_u = np.unwrap(a["lon"], period=360)
+    hdg_u = np.unwrap(a["hdg"], period=360)
+    lerp  = lambda v: v[left] + f * (v[right] - v[left])
+    lat   = lerp(a["lat"])
+    lon   = (lerp(lon_u) + 180) % 360 - 180
+    hdg   = lerp(hdg_u) % 360
+    alt   = lerp(a["alt"])
+    vel   = lerp(a["vel"])
+
+    # Gaps: the great circle between the surrounding anchors, flown at constant speed.
+    if gap.any():
+        l, r, g = left[gap], right[gap], f[gap]
+        glat, glon = _slerp(a["lat"][l], a["lon"][l], a["lat"][r], a["lon"][r], g)
+        ahead = bearing_np(glat, glon, a["lat"][r], a["lon"][r])
+        final = (bearing_np(a["lat"][r], a["lon"][r], a["lat"][l], a["lon"][l]) + 180) % 360
+        leg_km = haversine_np(a["lat"][l], a["lon"][l], a["lat"][r], a["lon"][r])
+        lat[gap], lon[gap] = glat, glon
+        hdg[gap] = np.where(g < 1, ahead, final)
+        vel[gap] = leg_km / np.maximum(span[gap], 1.0) * 3600
+
+    nearest = np.where(f < 0.5, left, right)
+    return ts, lat, lon, alt, vel, hdg, nearest, gap, f
+
+
+def _resampled(ev, fixes, step_s):
+    takeoff_ts = ev["takeoff_ts"]
+    t0 = takeoff_ts.timestamp()
+    t1 = ev["landing_ts"].timestamp() if ev["landing_ts"] else max(t0 + 3600, fixes[-1]["ts"].timestamp())
+    step_s = max(step_s, (t1 - t0) / (MAX_STEPS - 1))
+
+    a, origin, destination = _anchors(ev, fixes, t0, t1)
+    ts, lat, lon, alt, vel, hdg, nearest, gap, f = resample(a, t0, t1, step_s)
+    # Inside a gap only the origin/destination themselves are on the ground.
+    on_ground = (a["on_ground"][nearest] & (~gap | (f == 0) | (f == 1))).tolist()
+    dist_km = float(haversine_np(lat[:-1], lon[:-1], lat[1:], lon[1:]).sum())
+
+    tail, icao_str = ev["tail_number"], ev["icao24"]
+    lat, lon, alt, vel, hdg = lat.tolist(), lon.tolist(), alt.tolist(), vel.tolist(), hdg.tolist()
+    sources = [("synthesized" if g else a["source"][j]) for g, j in zip(gap.tolist(), nearest.tolist())]
+    steps = []
+    for i in range(len(ts)):
+        ts_iso = (takeoff_ts + timedelta(seconds=i * step_s)).isoformat()
+        steps.append({
+            "ts": ts_iso,
+            "fleet_kpis": {"in_air": 1, "on_ground": 4, "seen_last_15m": 1, "events_last_hour": 0},
+            "latest_positions": [{
+                "tail_number": tail,
+                "icao24":      icao_str,
+                "ts":          ts_iso,
+                "lat":         round(lat[i], 6),
+                "lon":         round(lon[i], 6),
+                "altitude":    round(alt[i]),
+                "velocity":    round(vel[i]),
+                "heading":     round(hdg[i], 1),
+                "on_ground":   on_ground[i],
+                "source":      sources[i],
+            }],
+            "last_50_events": [],
+        })
+
+    return {
+        "tail_number":      tail,
+        "icao24":           icao_str,
+        "mode":             "recorded",
+        "origin":           origin,
+        "destination":      destination[1] if destination else None,
+        "destination_name": destination[2] if destination else None,
+        "duration_min":     round((t1 - t0) / 60, 1),
+        "distance_km":      round(dist_km),
+        "step_seconds":     round(step_s, 1),
+        "recorded_points":  len(fixes),
+        "synthesized_steps": int(gap.sum()),
+        "steps":            steps,
+    }
+
+
+def _load_fixes(conn, ev):
+    end = ev["landing_ts"] or ev["takeoff_ts"] + timedelta(hours=12)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT ts, lat, lon, altitude, velocity, heading, on_ground, source
+            FROM positions
+            WHERE aircraft_id = %s AND ts > %s AND ts < %s
+              AND lat IS NOT NULL AND lon IS NOT NULL
+            ORDER BY ts
+        """, (ev["aircraft_id"], ev["takeoff_ts"], end))
+        return cur.fetchall()
+
+
+def get_flight_replay(conn, icao24=None, mode="recorded", step_s=RESAMPLE_STEP_SECONDS):
+    """Replay of the latest flight (optionally for one aircraft), or None if there is none.
+    mode="recorded" falls back to the synthesized path when the flight has no positions."""
+    q, params = _FLIGHT_QUERY, []
+    if icao24:
+        q += " AND a.icao24 = %s"
+        params.append(icao24)
+    q += " ORDER BY t.ts DESC LIMIT 1"
+    with conn.cursor() as cur:
+        cur.execute(q, params)
+        ev = cur.fetchone()
+    if not ev:
+        return None
+
+    key = (mode, step_s, ev["icao24"], ev["takeoff_ts"], ev["landing_ts"])
+    with _replay_lock:
+        if key in _replays:
+            _replays.move_to_end(key)
+            return _replays[key]
+
+    fixes  = _load_fixes(conn, ev) if mode == "recorded" else []
+    replay = _resampled(ev, fixes, step_s) if fixes else _synthesize(ev)
+    # A flight still in the air keeps getting positions: don't cache it.
+    if ev["landing_ts"] or mode == "synthesized":
+        with _replay_lock:
+            _replays[key] = replay
+            while len(_replays) > MAX_CACHED_FLIGHTS:
+                _replays.popitem(last=False)
+    return replay
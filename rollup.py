@@ -0,0 +1,124 @@
+"""
+Daily per-aircraft rollup of TAKEOFF/LANDING events.
+
+event_daily_rollup holds takeoff/landing counts per (UTC day, aircraft) and
+event_daily_destinations holds landing counts per (UTC day, aircraft, airport).
+The live monitor keeps both up to date through record_event(); imports and
+backfills call rebuild() for the days they touched, which also bumps
+rollup_version (migrations/006_rollup_version.sql) so that web processes
+drop the analytics they cached for those days.
+
+Usage:
+  python rollup.py                          # rebuild everything
+  python rollup.py 2025-10-01 2025-12-31    # rebuild a day range
+"""
+
+import os
+import sys
+from datetime import date, datetime, time, timedelta, timezone
+
+_DELETE_ROLLUP = "DELETE FROM event_daily_rollup{where}"
+_DELETE_DESTINATIONS = "DELETE FROM event_daily_destinations{where}"
+
+_INSERT_ROLLUP = """
+    INSERT INTO event_daily_rollup (day, aircraft_id, takeoffs, landings)
+    SELECT
+        (ts AT TIME ZONE 'UTC')::date             AS day,
+        aircraft_id,
+        COUNT(*) FILTER (WHERE type = 'TAKEOFF')  AS takeoffs,
+        COUNT(*) FILTER (WHERE type = 'LANDING')  AS landings
+    FROM events
+    WHERE type IN ('TAKEOFF', 'LANDING'){where}
+    GROUP BY 1, 2
+"""
+
+_INSERT_DESTINATIONS = """
+    INSERT INTO event_daily_destinations (day, aircraft_id, airport, name, landings)
+    SELECT
+        (ts AT TIME ZONE 'UTC')::date       AS day,
+        aircraft_id,
+        meta->>'destination_airport'        AS airport,
+        MAX(meta->>'destination_name')      AS name,
+        COUNT(*)                            AS landings
+    FROM events
+    WHERE type = 'LANDING'
+      AND meta->>'destination_airport' IS NOT NULL
+      AND meta->>'destination_airport' <> 'UNKNOWN'{where}
+    GROUP BY 1, 2, 3
+"""
+
+
+def utc_day(ts):
+    """UTC calendar day of a timezone-aware timestamp."""
+    return ts.astimezone(timezone.utc).date()
+
+
+def record_event(cur, aircraft_id, event_type, ts, meta=None):
+    """Add one freshly inserted event to the rollup. Non-flight events are ignored."""
+    if event_type not in ("TAKEOFF", "LANDING"):
+        return
+    day = utc_day(ts)
+    cur.execute("""
+        INSERT INTO event_daily_rollup (day, aircraft_id, takeoffs, landings)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (day, aircraft_id) DO UPDATE SET
+            takeoffs = event_daily_rollup.takeoffs + EXCLUDED.takeoffs,
+            landings = event_daily_rollup.landings + EXCLUDED.landings
+    """, (day, aircraft_id, int(event_type == "TAKEOFF"), int(event_type == "LANDING")))
+
+    airport = (meta or {}).get("destination_airport")
+    if event_type == "LANDING" and airport and airport != "UNKNOWN":
+        cur.execute("""
+            INSERT INTO event_daily_destinations (day, aircraft_id, airport, name, landings)
+            VALUES (%s, %s, %s, %s, 1)
+            ON CONFLICT (day, aircraft_id, airport) DO UPDATE SET
+                name     = COALESCE(EXCLUDED.name, event_daily_destinations.name),
+                landings = event_daily_destinations.landings + 1
+        """, (day, aircraft_id, airport, meta.get("destination_name")))
+
+
+def rebuild(conn, start_day=None, end_day=None):
+    """Recompute the rollup from raw events for [start_day, end_day] (inclusive) and
+    bump rollup_version. Either bound may be None to leave that side open; both
+    None rebuilds everything."""
+    day_where, ts_where, params = [], [], {}
+    if start_day:
+        day_where.append("day >= %(start_day)s")
+        ts_where.append("ts >= %(start_ts)s")
+        params["start_day"] = start_day
+        params["start_ts"]  = datetime.combine(start_day, time.min, tzinfo=timezone.utc)
+    if end_day:
+        day_where.append("day <= %(end_day)s")
+        ts_where.append("ts < %(end_ts)s")
+        params["end_day"] = end_day
+        params["end_ts"]  = datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+    delete_where = (" WHERE " + " AND ".join(day_where)) if day_where else ""
+    insert_where = "".join(f"\n      AND {w}" for w in ts_where)
+
+    with conn.cursor() as cur:
+        cur.execute(_DELETE_ROLLUP.format(where=delete_where), params)
+        cur.execute(_DELETE_DESTINATIONS.format(where=delete_where), params)
+        cur.execute(_INSERT_ROLLUP.format(where=insert_where), params)
+        cur.execute(_INSERT_DESTINATIONS.format(where=insert_where), params)
+        cur.execute("UPDATE rollup_version SET version = version + 1, rebuilt_at = now()")
+
+
+def main():
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    start_day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    end_day   = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    with psycopg2.connect(os.getenv("DATABASE_URL")) as conn:
+        rebuild(conn, start_day, end_day)
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*), MIN(day), MAX(day) FROM event_daily_rollup")
+            rows, first, last = cur.fetchone()
+    print(f"Rollup rebuilt: {rows} aircraft-days ({first} → {last})")
+
+
+if __name__ == "__main__":
+    main()
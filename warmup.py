@@ -0,0 +1,79 @@
+"""
+Background warm-up for the web process.
+
+Importing app.py does no I/O, so gunicorn serves as soon as the module is
+loaded and /status (liveness) answers right away. Warmup then connects to
+the database in a thread, retrying with backoff for as long as it takes, and
+runs each phase once on that connection, timing it. /ready (readiness)
+answers 503 until every phase has run. A phase that fails is logged and
+skipped: whatever it would have prefilled is still loaded on first use.
+"""
+
+import threading
+import time
+
+RETRY_MIN = 1
+RETRY_MAX = 30
+
+
+class Warmup:
+    """Runs [(name, fn(conn))] phases once, in order, in a background thread."""
+
+    def __init__(self, connect, phases, started=None):
+        self.connect     = connect
+        self.phases      = phases
+        self.started     = started if started is not None else time.monotonic()
+        self.import_time = None
+        self.ready_after = None
+        self.timings     = {}
+        self.errors      = {}
+        self.done        = threading.Event()
+
+    def start(self):
+        self.import_time = time.monotonic() - self.started
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def _connect(self):
+        delay = RETRY_MIN
+        while True:
+            try:
+                return self.connect()
+            except Exception as e:
+                print(f"Warm-up: database unavailable ({e}), retrying in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+
+    def run(self):
+        t0 = time.monotonic()
+        conn = self._connect()
+        self.timings["database"] = round(time.monotonic() - t0, 3)
+        try:
+            for name, fn in self.phases:
+                t0 = time.monotonic()
+                try:
+                    fn(conn)
+                    conn.commit()
+                except Exception as e:
+                    print(f"Warm-up: {name} failed: {e}")
+                    self.errors[name] = str(e)
+                    conn.rollback()
+                self.timings[name] = round(time.monotonic() - t0, 3)
+        finally:
+            conn.close()
+        self.ready_after = time.monotonic() - self.started
+        self.done.set()
+        print(f"✅ Ready {self.ready_after:.2f}s after start (import {self.import_time:.2f}s; "
+              + ", ".join(f"{name} {secs:.2f}s" for name, secs in self.timings.items()) + ")")
+
+    @property
+    def ready(self):
+        return self.done.is_set()
+
+    def status(self):
+        return {
+            "ready":               self.ready,
+            "import_seconds":      round(self.import_time, 3) if self.import_time is not None else None,
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "phases":              dict(self.timings),
+            "errors":              dict(self.errors),
+        }